@@ -5,11 +5,14 @@ from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.http import HttpResponseRedirect
 from django.contrib import messages
 from django.shortcuts import render
-from .models import Video, Subtitle, Sentence
+from .models import Video, Subtitle, Sentence, Transcript, SubtitleToken
 from .models import UserSession, UserActivity, UserMetrics
 from .feedback_models import Feedback
-from .word_models import WordDefinition, UserWord, WordReference
+from .word_models import WordDefinition, WordInflection, UserWord, WordReference, VocabularyPreference
 from .chat_models import ChatSession, ChatMessage
+from .job_models import ExtractionBatch, ExtractionJob, VideoExtractionState, PronunciationJob
+from .extraction_queue import enqueue_video_extraction
+from .pronunciation_queue import enqueue_pronunciations
 
 # Action to delete all records for all Admin classes
 def delete_all_records(modeladmin, request, queryset):
@@ -81,12 +84,29 @@ class VideoAdmin(AdminWithDeleteAllButton, admin.ModelAdmin):
         return obj.subtitles_count()
     subtitles_count_display.short_description = '字幕数量'
     
+@admin.register(Transcript)
+class TranscriptAdmin(AdminWithDeleteAllButton, admin.ModelAdmin):
+    list_display = ('youtube_id', 'language', 'segment_count', 'videos_count_display', 'created_at')
+    list_filter = ('language',)
+    search_fields = ('youtube_id',)
+    
+    def videos_count_display(self, obj):
+        """Number of user videos sharing the transcript"""
+        return obj.videos.count()
+    videos_count_display.short_description = 'Videos'
+    
 @admin.register(Subtitle)
 class SubtitleAdmin(AdminWithDeleteAllButton, admin.ModelAdmin):
-    list_display = ('text', 'translation', 'start_time', 'end_time', 'video')
-    list_filter = ('video__title',)
+    list_display = ('text', 'translation', 'start_time', 'end_time', 'video', 'transcript', 'indexed')
+    list_filter = ('video__title', 'indexed')
     search_fields = ('text', 'translation')
     
+@admin.register(SubtitleToken)
+class SubtitleTokenAdmin(AdminWithDeleteAllButton, admin.ModelAdmin):
+    list_display = ('term', 'subtitle', 'start', 'end')
+    search_fields = ('term',)
+    raw_id_fields = ('subtitle',)
+    
 @admin.register(Sentence)
 class SentenceAdmin(AdminWithDeleteAllButton, admin.ModelAdmin):
     list_display = ('text', 'translation', 'user', 'video', 'start_time', 'end_time', 'created_at')
@@ -221,6 +241,17 @@ class WordDefinitionAdmin(AdminWithDeleteAllButton, admin.ModelAdmin):
     search_fields = ('text', 'translation')
     fields = ('text', 'language', 'translation', 'uk_phonetic', 'us_phonetic', 'phonetic', 'web_translation', 'has_audio')
 
+@admin.register(WordInflection)
+class WordInflectionAdmin(AdminWithDeleteAllButton, admin.ModelAdmin):
+    list_display = ('form', 'lemma', 'inflection', 'language', 'created_at')
+    list_filter = ('inflection', 'language')
+    search_fields = ('form', 'lemma')
+
+@admin.register(VocabularyPreference)
+class VocabularyPreferenceAdmin(AdminWithDeleteAllButton, admin.ModelAdmin):
+    list_display = ('user', 'skip_common_words', 'updated_at')
+    search_fields = ('user__username',)
+
 @admin.register(UserWord)
 class UserWordAdmin(AdminWithDeleteAllButton, admin.ModelAdmin):
     list_display = ('user', 'word_text', 'notes', 'is_favorite', 'created_at')
@@ -235,10 +266,10 @@ class UserWordAdmin(AdminWithDeleteAllButton, admin.ModelAdmin):
 
 @admin.register(WordReference)
 class WordReferenceAdmin(AdminWithDeleteAllButton, admin.ModelAdmin):
-    list_display = ('user_word_text', 'subtitle_preview', 'video_title', 'created_at')
+    list_display = ('user_word_text', 'surface_form', 'subtitle_preview', 'video_title', 'created_at')
     list_filter = ('created_at',)
     search_fields = ('user_word__word_definition__text', 'subtitle__text')
-    raw_id_fields = ('user_word', 'subtitle')
+    raw_id_fields = ('user_word', 'subtitle', 'video')
     
     def user_word_text(self, obj):
         # Return the associated word text
@@ -254,11 +285,59 @@ class WordReferenceAdmin(AdminWithDeleteAllButton, admin.ModelAdmin):
     
     def video_title(self, obj):
         # Display the associated video title
-        if not obj.subtitle or not obj.subtitle.video:
+        if not obj.video:
             return ""
-        return obj.subtitle.video.title
+        return obj.video.title
     video_title.short_description = "Video Title"
 
+@admin.register(ExtractionJob)
+class ExtractionJobAdmin(AdminWithDeleteAllButton, admin.ModelAdmin):
+    list_display = ('video', 'user', 'status', 'attempts', 'force', 'created_at', 'wait_seconds', 'run_seconds')
+    list_filter = ('status', 'created_at')
+    search_fields = ('video__title', 'user__username')
+    raw_id_fields = ('user', 'video', 'batch')
+    readonly_fields = ('created_at', 'started_at', 'finished_at', 'locked_until', 'result', 'last_error')
+    actions = ['requeue_jobs']
+    
+    def requeue_jobs(self, request, queryset):
+        """Queue a new extraction job for the videos of the selected jobs"""
+        for job in queryset.select_related('video'):
+            enqueue_video_extraction(job.video)
+    requeue_jobs.short_description = 'Requeue extraction'
+
+@admin.register(PronunciationJob)
+class PronunciationJobAdmin(AdminWithDeleteAllButton, admin.ModelAdmin):
+    list_display = ('word', 'priority', 'status', 'attempts', 'created_at', 'finished_at')
+    list_filter = ('status', 'priority')
+    search_fields = ('word',)
+    readonly_fields = ('created_at', 'finished_at', 'locked_until', 'last_error')
+    actions = ['requeue_jobs']
+    
+    def requeue_jobs(self, request, queryset):
+        """Download the pronunciations of the selected jobs again, ahead of the extracted words"""
+        enqueue_pronunciations(queryset.values_list('word', flat=True), PronunciationJob.PRIORITY_HOVERED)
+    requeue_jobs.short_description = 'Requeue download'
+
+@admin.register(ExtractionBatch)
+class ExtractionBatchAdmin(AdminWithDeleteAllButton, admin.ModelAdmin):
+    list_display = ('user', 'job_count', 'force', 'progress_display', 'created_at')
+    list_filter = ('force', 'created_at')
+    search_fields = ('user__username',)
+    raw_id_fields = ('user',)
+    
+    def progress_display(self, obj):
+        """Finished jobs of the batch"""
+        progress = obj.get_progress()
+        return f"{progress['finished']}/{progress['total']} ({progress['percent']}%)"
+    progress_display.short_description = 'Progress'
+
+@admin.register(VideoExtractionState)
+class VideoExtractionStateAdmin(AdminWithDeleteAllButton, admin.ModelAdmin):
+    list_display = ('video', 'last_subtitle_id', 'dictionary_version', 'processed_subtitle_count', 'updated_at')
+    list_filter = ('dictionary_version',)
+    search_fields = ('video__title',)
+    raw_id_fields = ('video',)
+
 # Chat message inline view
 class ChatMessageInline(admin.TabularInline):
     model = ChatMessage
@@ -375,9 +454,9 @@ class DejaVocabAdminSite(admin.AdminSite):
                     custom_groups['Chat Management']['models'].append(model)
                 elif model_name in ['UserActivity', 'Feedback', 'UserMetrics', 'UserSession']:
                     custom_groups['User Management']['models'].append(model)
-                elif model_name in ['UserWord', 'WordReference', 'Sentence', 'Subtitle', 'Video']:
+                elif model_name in ['UserWord', 'WordReference', 'VocabularyPreference', 'Sentence', 'Subtitle', 'SubtitleToken', 'Transcript', 'Video', 'ExtractionBatch', 'ExtractionJob', 'VideoExtractionState', 'PronunciationJob']:
                     custom_groups['Content Management']['models'].append(model)
-                elif model_name in ['WordDefinition']:
+                elif model_name in ['WordDefinition', 'WordInflection']:
                     custom_groups['Word Management']['models'].append(model)
                 else:
                     # 其他模型保留在原应用中
@@ -403,7 +482,8 @@ class DejaVocabAdminSite(admin.AdminSite):
                 model_name = model['object_name']
                 if model_name not in ['ChatMessage', 'ChatSession', 'UserActivity', 'Feedback', 
                                       'UserMetrics', 'UserSession', 'UserWord', 'WordReference', 
-                                      'Sentence', 'Subtitle', 'Video', 'WordDefinition']:
+                                      'Sentence', 'Subtitle', 'SubtitleToken', 'Transcript', 'Video', 'VocabularyPreference', 'WordDefinition', 'WordInflection',
+                                      'ExtractionBatch', 'ExtractionJob', 'VideoExtractionState', 'PronunciationJob']:
                     has_models = True
                     break
             
@@ -413,7 +493,8 @@ class DejaVocabAdminSite(admin.AdminSite):
                     model_name = model['object_name']
                     if model_name not in ['ChatMessage', 'ChatSession', 'UserActivity', 'Feedback', 
                                          'UserMetrics', 'UserSession', 'UserWord', 'WordReference', 
-                                         'Sentence', 'Subtitle', 'Video', 'WordDefinition']:
+                                         'Sentence', 'Subtitle', 'SubtitleToken', 'Transcript', 'Video', 'VocabularyPreference', 'WordDefinition', 'WordInflection',
+                                         'ExtractionBatch', 'ExtractionJob', 'VideoExtractionState', 'PronunciationJob']:
                         cleaned_models.append(model)
                 
                 app_copy = app.copy()
@@ -428,14 +509,22 @@ deja_vocab_admin = DejaVocabAdminSite(name='deja_vocab_admin')
 # 注册所有模型到自定义AdminSite
 deja_vocab_admin.register(Video, VideoAdmin)
 deja_vocab_admin.register(Subtitle, SubtitleAdmin)
+deja_vocab_admin.register(Transcript, TranscriptAdmin)
+deja_vocab_admin.register(SubtitleToken, SubtitleTokenAdmin)
 deja_vocab_admin.register(Sentence, SentenceAdmin)
 deja_vocab_admin.register(Feedback, FeedbackAdmin)
 deja_vocab_admin.register(UserSession, UserSessionAdmin)
 deja_vocab_admin.register(UserActivity, UserActivityAdmin)
 deja_vocab_admin.register(UserMetrics, UserMetricsAdmin)
 deja_vocab_admin.register(WordDefinition, WordDefinitionAdmin)
+deja_vocab_admin.register(WordInflection, WordInflectionAdmin)
+deja_vocab_admin.register(VocabularyPreference, VocabularyPreferenceAdmin)
 deja_vocab_admin.register(UserWord, UserWordAdmin)
 deja_vocab_admin.register(WordReference, WordReferenceAdmin)
+deja_vocab_admin.register(ExtractionJob, ExtractionJobAdmin)
+deja_vocab_admin.register(ExtractionBatch, ExtractionBatchAdmin)
+deja_vocab_admin.register(VideoExtractionState, VideoExtractionStateAdmin)
+deja_vocab_admin.register(PronunciationJob, PronunciationJobAdmin)
 deja_vocab_admin.register(ChatSession, ChatSessionAdmin)
 deja_vocab_admin.register(ChatMessage, ChatMessageAdmin)
 deja_vocab_admin.register(User, CustomUserAdmin)
@@ -0,0 +1,301 @@
+import logging
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .job_models import ExtractionBatch, ExtractionJob, VideoExtractionState
+
+logger = logging.getLogger(__name__)
+
+# Defaults, can be overridden in settings.py
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_RETRY_DELAY = 30  # Seconds before the first retry, doubled on every further retry
+DEFAULT_LEASE_SECONDS = 600  # A running job whose lease expires is considered abandoned and reclaimed
+DEFAULT_DEBOUNCE_SECONDS = 5
+DEFAULT_DEBOUNCE_MAX_SECONDS = 60
+DEFAULT_DICTIONARY_VERSION = 1
+
+
+def get_dictionary_version():
+    """Current extraction version, watermarks stored with another version are stale"""
+    return getattr(settings, 'EXTRACTION_DICTIONARY_VERSION', DEFAULT_DICTIONARY_VERSION)
+
+
+def get_lease_seconds():
+    """Seconds a claimed job stays locked to its worker without a renewal"""
+    return getattr(settings, 'EXTRACTION_JOB_LEASE_SECONDS', DEFAULT_LEASE_SECONDS)
+
+
+def needs_extraction(video):
+    """Check whether a video has subtitles above its extraction watermark"""
+    state = VideoExtractionState.objects.filter(video=video).first()
+    if state is None or state.dictionary_version != get_dictionary_version():
+        return video.has_subtitles()
+    return video.get_subtitles().filter(id__gt=state.last_subtitle_id).exists()
+
+
+def enqueue_video_extraction(video, debounce=False, batch=None, force=False):
+    """Queue word extraction for a video, returns the pending job
+
+    If the video already has a pending job, that job is returned instead of queueing
+    a second one (it joins the given batch and is forced if asked to). A video whose
+    job is currently running gets one new pending job so that subtitles saved during
+    the run are picked up afterwards.
+
+    With debounce the job waits EXTRACTION_DEBOUNCE_SECONDS and every further debounced
+    call postpones it again, so a burst of subtitle saves ends up as one job. A job is
+    never postponed past EXTRACTION_DEBOUNCE_MAX_SECONDS after it was queued.
+    """
+    delay = getattr(settings, 'EXTRACTION_DEBOUNCE_SECONDS', DEFAULT_DEBOUNCE_SECONDS) if debounce else 0
+    run_after = timezone.now() + timedelta(seconds=delay)
+
+    existing = ExtractionJob.objects.filter(video=video, status=ExtractionJob.STATUS_PENDING).first()
+    if existing:
+        updates = {}
+        if batch is not None:
+            updates['batch'] = batch
+        if force:
+            updates['force'] = True
+        if updates:
+            ExtractionJob.objects.filter(id=existing.id, status=ExtractionJob.STATUS_PENDING).update(**updates)
+        if debounce:
+            max_delay = getattr(settings, 'EXTRACTION_DEBOUNCE_MAX_SECONDS', DEFAULT_DEBOUNCE_MAX_SECONDS)
+            run_after = min(run_after, existing.created_at + timedelta(seconds=max_delay))
+            ExtractionJob.objects.filter(
+                id=existing.id, status=ExtractionJob.STATUS_PENDING, run_after__lt=run_after
+            ).update(run_after=run_after)
+        return existing
+
+    try:
+        with transaction.atomic():
+            job = ExtractionJob.objects.create(
+                user_id=video.user_id,
+                video=video,
+                batch=batch,
+                force=force,
+                run_after=run_after,
+                max_attempts=getattr(settings, 'EXTRACTION_JOB_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS)
+            )
+        logger.info(f"Queued word extraction job {job.id} for video {video.id}")
+        return job
+    except IntegrityError:
+        # Another request queued the same video at the same time
+        return ExtractionJob.objects.filter(video=video, status=ExtractionJob.STATUS_PENDING).first()
+
+
+def enqueue_all_videos(user, force=False):
+    """Queue extraction of every video of a user that has something to extract
+
+    :param force: Reprocess all subtitles instead of only those above the watermarks
+    :return: ExtractionBatch to follow the progress with
+    """
+    from .models import Video
+
+    batch = ExtractionBatch.objects.create(user=user, force=force)
+    for video in Video.objects.filter(user=user):
+        if video.has_subtitles() if force else needs_extraction(video):
+            enqueue_video_extraction(video, batch=batch, force=force)
+            batch.job_count += 1
+    batch.save(update_fields=['job_count'])
+    logger.info(f"Queued {batch.job_count} extraction jobs for all videos of user {user.id} (batch {batch.id})")
+    return batch
+
+
+def claim_next_job():
+    """Atomically claim the next runnable job for this worker, returns None if there is none
+
+    Runnable jobs are pending jobs whose backoff has elapsed and running jobs whose lease
+    expired (their worker died). Videos that are being processed right now are skipped,
+    so one video is never extracted by two workers at once.
+    """
+    now = timezone.now()
+    lease_seconds = get_lease_seconds()
+
+    busy_videos = ExtractionJob.objects.filter(
+        status=ExtractionJob.STATUS_RUNNING, locked_until__gt=now
+    ).values('video_id')
+
+    candidates = ExtractionJob.objects.filter(
+        Q(status=ExtractionJob.STATUS_PENDING, run_after__lte=now) |
+        Q(status=ExtractionJob.STATUS_RUNNING, locked_until__lte=now)
+    ).exclude(video_id__in=busy_videos).order_by('run_after', 'id')[:10]
+
+    for candidate in candidates:
+        # Conditional update, only one worker can win the row
+        claimed = ExtractionJob.objects.filter(
+            id=candidate.id, status=candidate.status, locked_until=candidate.locked_until
+        ).update(
+            status=ExtractionJob.STATUS_RUNNING,
+            locked_until=now + timedelta(seconds=lease_seconds),
+            started_at=now,
+            attempts=F('attempts') + 1
+        )
+        if claimed:
+            return ExtractionJob.objects.select_related('user', 'video').get(id=candidate.id)
+
+    return None
+
+
+def renew_lease(job):
+    """Extend the lease of a running job, returns False if the worker no longer holds it
+
+    The update only matches the lease this worker holds, once it expired and another
+    worker reclaimed the job the row carries that worker's lease.
+    """
+    locked_until = timezone.now() + timedelta(seconds=get_lease_seconds())
+    renewed = ExtractionJob.objects.filter(
+        id=job.id, status=ExtractionJob.STATUS_RUNNING, locked_until=job.locked_until
+    ).update(locked_until=locked_until)
+    if not renewed:
+        logger.warning(f"Extraction job {job.id} lost its lease, another worker may have reclaimed it")
+        return False
+    job.locked_until = locked_until
+    return True
+
+
+class LeaseHeartbeat:
+    """Renew a job's lease from a background thread while it runs
+
+    Used as a context manager around the run, the lease is renewed every third of
+    EXTRACTION_JOB_LEASE_SECONDS so a long job is never reclaimed while its worker is alive.
+    """
+
+    def __init__(self, job):
+        self.job = job
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.beat, name=f'extraction-lease-{job.id}', daemon=True)
+
+    def beat(self):
+        try:
+            while not self.stopped.wait(get_lease_seconds() / 3):
+                try:
+                    if not renew_lease(self.job):
+                        return
+                except Exception as e:
+                    # Usually "database is locked" under write contention, the next beat retries
+                    logger.error(f"Error renewing lease of extraction job {self.job.id}: {str(e)}")
+        finally:
+            connection.close()
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.thread.join()
+
+
+def run_job(job):
+    """Run a claimed job and record its outcome, returns True on success"""
+    from .word_extractor import WordExtractor
+
+    try:
+        with LeaseHeartbeat(job):
+            extractor = WordExtractor(job.user)
+            # Only subtitles above the video's watermark are processed, unless the job is forced
+            result = extractor.process_new_subtitles(job.video, force=job.force)
+    except Exception as e:
+        logger.error(f"Extraction job {job.id} failed (attempt {job.attempts}/{job.max_attempts}): {str(e)}")
+        fail_job(job, traceback.format_exc())
+        return False
+
+    return complete_job(job, result)
+
+
+def _held(job):
+    """The job's row as long as this worker still holds the lease it claimed or renewed"""
+    return ExtractionJob.objects.filter(id=job.id, status=ExtractionJob.STATUS_RUNNING, locked_until=job.locked_until)
+
+
+def complete_job(job, result):
+    """Mark a job as done with the result of its run, returns False if the lease was lost
+
+    A worker whose lease expired and was reclaimed drops its result, the job's row belongs
+    to the worker that reclaimed it.
+    """
+    completed = _held(job).update(
+        status=ExtractionJob.STATUS_DONE,
+        result=result,
+        last_error='',
+        locked_until=None,
+        finished_at=timezone.now()
+    )
+    if not completed:
+        logger.warning(f"Extraction job {job.id} lost its lease, result dropped")
+        return False
+    logger.info(f"Extraction job {job.id} done: video '{job.video.title}' processed "
+                f"{result.get('processed_count', 0)} words (new: {result.get('new_count', 0)}, "
+                f"updated: {result.get('updated_count', 0)})")
+    return True
+
+
+def fail_job(job, error):
+    """Schedule a retry with exponential backoff, or mark the job failed once attempts are used up
+
+    Like complete_job, nothing is recorded once the worker lost the job's lease.
+    """
+    now = timezone.now()
+    if job.attempts >= job.max_attempts:
+        failed = _held(job).update(
+            status=ExtractionJob.STATUS_FAILED,
+            last_error=error,
+            locked_until=None,
+            finished_at=now
+        )
+    else:
+        retry_delay = getattr(settings, 'EXTRACTION_JOB_RETRY_DELAY', DEFAULT_RETRY_DELAY)
+        run_after = now + timedelta(seconds=retry_delay * 2 ** (job.attempts - 1))
+        try:
+            with transaction.atomic():
+                failed = _held(job).update(
+                    status=ExtractionJob.STATUS_PENDING,
+                    run_after=run_after,
+                    last_error=error,
+                    locked_until=None,
+                    finished_at=now
+                )
+        except IntegrityError:
+            # A newer pending job for this video already exists and will redo the work
+            failed = _held(job).update(
+                status=ExtractionJob.STATUS_FAILED,
+                last_error=error + '\nSuperseded by a newer pending job, not retried',
+                locked_until=None,
+                finished_at=now
+            )
+    if not failed:
+        logger.warning(f"Extraction job {job.id} lost its lease, failure not recorded")
+
+
+def get_queue_stats(recent=200):
+    """Queue depth per status and latency of recently finished jobs"""
+    now = timezone.now()
+    stats = {
+        status: ExtractionJob.objects.filter(status=status).count()
+        for status, _ in ExtractionJob.STATUS_CHOICES
+    }
+    stats['ready'] = ExtractionJob.objects.filter(
+        status=ExtractionJob.STATUS_PENDING, run_after__lte=now
+    ).count()
+
+    oldest_pending = ExtractionJob.objects.filter(
+        status=ExtractionJob.STATUS_PENDING
+    ).order_by('created_at').values_list('created_at', flat=True).first()
+    stats['oldest_pending_seconds'] = round((now - oldest_pending).total_seconds(), 1) if oldest_pending else 0
+
+    finished = ExtractionJob.objects.filter(
+        status=ExtractionJob.STATUS_DONE
+    ).order_by('-finished_at')[:recent]
+    wait_times = [job.wait_seconds() for job in finished if job.wait_seconds() is not None]
+    run_times = [job.run_seconds() for job in finished if job.run_seconds() is not None]
+    stats['avg_wait_seconds'] = round(sum(wait_times) / len(wait_times), 1) if wait_times else 0
+    stats['max_wait_seconds'] = max(wait_times) if wait_times else 0
+    stats['avg_run_seconds'] = round(sum(run_times) / len(run_times), 1) if run_times else 0
+    stats['max_run_seconds'] = max(run_times) if run_times else 0
+    stats['sample_size'] = len(finished)
+    return stats
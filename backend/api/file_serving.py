@@ -0,0 +1,93 @@
+"""Serving files from disk with HTTP caching and Range support
+
+serve_file streams a file with FileResponse, or hands it to nginx with X-Accel-Redirect
+when an internal location prefix is given. Either way the response carries ETag and
+Last-Modified, conditional requests get a 304 and single "bytes=" ranges a 206.
+"""
+import os
+import re
+
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified
+from django.utils.http import http_date, parse_http_date_safe
+
+RANGE_PATTERN = re.compile(r'^bytes=(\d*)-(\d*)$')
+# A file never changes once stored under its name, browsers may keep it for a year
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def file_etag(stat):
+    """Weak-free ETag from size and modification time, the file is replaced as a whole on change"""
+    return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+
+def is_not_modified(request, etag, mtime):
+    """Whether the client's cached copy is current (If-None-Match wins over If-Modified-Since)"""
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match is not None:
+        return etag in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*'
+    if_modified_since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+    return if_modified_since is not None and int(mtime) <= if_modified_since
+
+
+def parse_range(header, size):
+    """(start, end) inclusive of a single "bytes=" range, None when absent or not satisfiable"""
+    match = RANGE_PATTERN.match(header.strip()) if header else None
+    if not match or not any(match.groups()):
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    else:
+        # bytes=-N is the last N bytes
+        start = max(size - int(last), 0)
+        end = size - 1
+    if start > end or start >= size:
+        return None
+    return start, end
+
+
+def serve_file(request, path, content_type, filename=None, accel_prefix='', accel_path='',
+               cache_control=IMMUTABLE_CACHE_CONTROL):
+    """Response for a file on disk
+
+    :param accel_prefix: nginx internal location, the file is then sent by nginx as
+                         accel_prefix + accel_path and Range is left to nginx
+    """
+    stat = os.stat(path)
+    etag = file_etag(stat)
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(stat.st_mtime),
+        'Cache-Control': cache_control,
+        'Accept-Ranges': 'bytes',
+    }
+    if filename:
+        headers['Content-Disposition'] = f'inline; filename="{filename}"'
+
+    if is_not_modified(request, etag, stat.st_mtime):
+        response = HttpResponseNotModified()
+    elif accel_prefix:
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = accel_prefix.rstrip('/') + '/' + accel_path.lstrip('/')
+    else:
+        byte_range = None
+        if 'Range' in request.headers and request.headers.get('If-Range', etag) == etag:
+            byte_range = parse_range(request.headers['Range'], stat.st_size)
+            if byte_range is None and RANGE_PATTERN.match(request.headers['Range'].strip()):
+                response = HttpResponse(status=416)
+                response['Content-Range'] = f'bytes */{stat.st_size}'
+                return response
+
+        if byte_range:
+            start, end = byte_range
+            with open(path, 'rb') as f:
+                f.seek(start)
+                response = HttpResponse(f.read(end - start + 1), content_type=content_type, status=206)
+            response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+        else:
+            response = FileResponse(open(path, 'rb'), content_type=content_type)
+
+    for name, value in headers.items():
+        response[name] = value
+    return response
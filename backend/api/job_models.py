@@ -0,0 +1,161 @@
+from django.db import models
+from django.db.models import Q, SET_NULL
+from django.utils import timezone
+from django.contrib.auth.models import User
+
+
+class ExtractionBatch(models.Model):
+    """Handle of an extract-all-words request, groups the per-video jobs it queued
+
+    The request returns immediately, its progress is read from the status of the jobs.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='extraction_batches')
+    force = models.BooleanField(default=False)  # Reprocess every subtitle instead of only new ones
+    job_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Extraction of all videos of {self.user} ({self.job_count} jobs)"
+
+    def get_progress(self):
+        """Number of jobs per status and the overall state of the batch
+
+        A pending job that a later batch picked up counts for the later batch only.
+        """
+        counts = {
+            row['status']: row['count']
+            for row in self.jobs.values('status').annotate(count=models.Count('id'))
+        }
+        progress = {status: counts.get(status, 0) for status, _ in ExtractionJob.STATUS_CHOICES}
+        total = sum(progress.values())
+        finished = progress[ExtractionJob.STATUS_DONE] + progress[ExtractionJob.STATUS_FAILED]
+        progress['total'] = total
+        progress['finished'] = finished
+        progress['percent'] = round(100 * finished / total) if total else 100
+        progress['state'] = 'done' if finished >= total else 'running'
+        return progress
+
+
+class ExtractionJob(models.Model):
+    """Durable queue entry for background word extraction of one video
+
+    Jobs are created by enqueue_video_extraction and executed by
+    `python manage.py run_extraction_worker`.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = (
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    )
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='extraction_jobs')
+    video = models.ForeignKey('api.Video', on_delete=models.CASCADE, related_name='extraction_jobs')
+    batch = models.ForeignKey(ExtractionBatch, on_delete=SET_NULL, related_name='jobs', null=True, blank=True)
+    force = models.BooleanField(default=False)  # Ignore the video's watermark and reprocess every subtitle
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING, db_index=True)
+    attempts = models.PositiveIntegerField(default=0)  # Number of times a worker has started this job
+    max_attempts = models.PositiveIntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now, db_index=True)  # Earliest time the job may run (retry backoff)
+    locked_until = models.DateTimeField(null=True, blank=True)  # Lease of the worker running the job, expired leases are reclaimed
+    last_error = models.TextField(blank=True)
+    result = models.JSONField(null=True, blank=True)  # process_video result of the last successful run
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        constraints = [
+            # A video is never queued twice, a new job can only be queued once the pending one has started
+            models.UniqueConstraint(
+                fields=['video'],
+                condition=Q(status='pending'),
+                name='unique_pending_extraction_job'
+            ),
+        ]
+
+    def __str__(self):
+        return f"Extraction of video {self.video_id} ({self.status})"
+
+    def wait_seconds(self):
+        """Seconds between queueing and the latest start"""
+        if self.started_at and self.created_at:
+            return round((self.started_at - self.created_at).total_seconds(), 1)
+        return None
+
+    def run_seconds(self):
+        """Seconds the latest run took"""
+        if self.finished_at and self.started_at:
+            return round((self.finished_at - self.started_at).total_seconds(), 1)
+        return None
+
+
+class VideoExtractionState(models.Model):
+    """Extraction watermark of a video
+
+    Subtitle IDs only grow, so every subtitle with an ID up to last_subtitle_id
+    has been extracted with dictionary_version. Incremental runs only process
+    subtitles above the watermark, a version change makes the next run start over.
+    """
+    video = models.OneToOneField('api.Video', on_delete=models.CASCADE, related_name='extraction_state')
+    last_subtitle_id = models.BigIntegerField(default=0)
+    dictionary_version = models.PositiveIntegerField(default=0)
+    processed_subtitle_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Video {self.video_id} extracted up to subtitle {self.last_subtitle_id} (v{self.dictionary_version})"
+
+
+class PronunciationJob(models.Model):
+    """Queue entry for downloading the pronunciation file of one word
+
+    There is one row per word, queueing a word again only raises its priority, so a
+    word is never downloaded twice. Jobs are created by enqueue_pronunciations and
+    downloaded by `python manage.py run_pronunciation_worker`, which sets has_audio
+    on the word's definitions once the file is stored.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = (
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    )
+
+    # Higher priorities are downloaded first
+    PRIORITY_EXTRACTED = 0  # Word found in a subtitle
+    PRIORITY_HOVERED = 10  # The user looked the word up
+    PRIORITY_FAVORITED = 20  # The user favorited the word
+
+    word = models.CharField(max_length=100, unique=True)
+    priority = models.SmallIntegerField(default=PRIORITY_EXTRACTED)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)  # Number of download attempts since the word was last queued
+    max_attempts = models.PositiveIntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now)  # Earliest time of the next attempt (retry backoff)
+    locked_until = models.DateTimeField(null=True, blank=True)  # Lease of the worker downloading the word
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-priority', 'run_after']
+        indexes = [
+            # Claim order of the worker
+            models.Index(fields=['status', '-priority', 'run_after'], name='pronunciation_job_claim'),
+        ]
+
+    def __str__(self):
+        return f"Pronunciation of '{self.word}' ({self.status})"
@@ -0,0 +1,178 @@
+"""Per-user known-word set
+
+The WordDefinition IDs a user has saved, kept in the 'known_words' cache so "does this
+user have this word?" is answered without a query. Dense IDs are stored as a bitmap
+(O(1) membership), sparse ones as a sorted array (binary search), whichever is smaller.
+A user whose set would exceed KNOWN_WORDS_MAX_BYTES has no set, callers then fall back
+to the database.
+
+Every process keeps a copy of the sets it loaded, tagged with the version of the set.
+A lookup only reads the user's version key from the cache (a few bytes) and uses the
+copy while the version matches, the set itself is read and unpickled once per version.
+Callers that check many words (WordExtractor, lookup_many) take the set once with
+get_known_words, their membership checks then don't touch the cache at all.
+
+The version moves on whenever the user's words change: UserWord signals cover saves
+and deletes (see api/signals.py), bulk inserts call invalidate_known_words themselves.
+"""
+import logging
+import threading
+import time
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .word_models import UserWord
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 256 * 1024
+DEFAULT_LOCAL_USERS = 256  # Sets kept in this process, the least recently used one is dropped first
+CACHE_ALIAS = 'known_words'
+CACHE_KEY = 'known_words:{user_id}:{version}'
+VERSION_KEY = 'known_words_version:{user_id}'
+OVER_BUDGET = 'over_budget'  # Cached instead of the set so oversized users aren't reloaded on every call
+
+# Process-wide counters, see get_known_word_stats
+_stats = {
+    'local_hits': 0,  # Set found in this process's copy
+    'hits': 0,  # Set found in the cache
+    'misses': 0,  # Set loaded from the database
+    'over_budget': 0,  # Calls answered by the database because the set is too large
+    'known': 0,  # Membership checks answered with yes
+    'unknown': 0,  # Membership checks answered with no, each one a skipped query
+    'invalidations': 0,
+}
+_stats_lock = threading.Lock()
+
+# user_id -> (version, set or OVER_BUDGET), most recently used last
+_local = {}
+_local_lock = threading.Lock()
+
+
+def _count(name, amount=1):
+    with _stats_lock:
+        _stats[name] += amount
+
+
+class KnownWordSet:
+    """Immutable set of WordDefinition IDs, a bitmap when the IDs are dense, otherwise a sorted array"""
+
+    def __init__(self, definition_ids):
+        definition_ids = sorted(set(definition_ids))
+        self.count = len(definition_ids)
+        self.bitmap = None
+        self.ids = None
+
+        array_bytes = len(definition_ids) * array('q').itemsize
+        bitmap_bytes = (definition_ids[-1] >> 3) + 1 if definition_ids else 0
+        if bitmap_bytes <= array_bytes:
+            self.bitmap = bytearray(bitmap_bytes)
+            for definition_id in definition_ids:
+                self.bitmap[definition_id >> 3] |= 1 << (definition_id & 7)
+        else:
+            self.ids = array('q', definition_ids)
+
+    def __contains__(self, definition_id):
+        if self.bitmap is not None:
+            index = definition_id >> 3
+            return index < len(self.bitmap) and bool(self.bitmap[index] & (1 << (definition_id & 7)))
+        position = bisect_left(self.ids, definition_id)
+        return position < len(self.ids) and self.ids[position] == definition_id
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def nbytes(self):
+        """Memory used by the IDs"""
+        if self.bitmap is not None:
+            return len(self.bitmap)
+        return len(self.ids) * self.ids.itemsize
+
+
+def _version(user_id):
+    """Current version of a user's set, a lost version is replaced by a new one, never by an old one"""
+    cache = caches[CACHE_ALIAS]
+    key = VERSION_KEY.format(user_id=user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def _keep_local(user_id, version, known):
+    with _local_lock:
+        _local.pop(user_id, None)
+        _local[user_id] = (version, known)
+        while len(_local) > getattr(settings, 'KNOWN_WORDS_LOCAL_USERS', DEFAULT_LOCAL_USERS):
+            del _local[next(iter(_local))]
+
+
+def get_known_words(user_id):
+    """The user's known-word set, None if it is over the memory budget"""
+    version = _version(user_id)
+    with _local_lock:
+        local = _local.pop(user_id, None)
+        if local is not None and local[0] == version:
+            _local[user_id] = local  # Most recently used last
+        else:
+            local = None
+
+    if local is not None:
+        _count('local_hits')
+        known = local[1]
+    else:
+        cache = caches[CACHE_ALIAS]
+        key = CACHE_KEY.format(user_id=user_id, version=version)
+        known = cache.get(key)
+        if known is not None:
+            _count('hits')
+        else:
+            _count('misses')
+            known = KnownWordSet(
+                UserWord.objects.filter(user_id=user_id).values_list('word_definition_id', flat=True)
+            )
+            if known.nbytes > getattr(settings, 'KNOWN_WORDS_MAX_BYTES', DEFAULT_MAX_BYTES):
+                logger.info(f"Known-word set of user {user_id} needs {known.nbytes} bytes, over budget")
+                known = OVER_BUDGET
+            # Stored under the version read before the query, a change made meanwhile has
+            # moved the version on and this set is never read
+            cache.set(key, known)
+        _keep_local(user_id, version, known)
+
+    if known == OVER_BUDGET:
+        _count('over_budget')
+        return None
+    return known
+
+
+def is_known_word(user_id, definition_id):
+    """Whether the user has saved the definition, None if there is no set to tell (ask the database)"""
+    known = get_known_words(user_id)
+    if known is None:
+        return None
+    is_known = definition_id in known
+    _count('known' if is_known else 'unknown')
+    return is_known
+
+
+def invalidate_known_words(user_id):
+    """Drop the user's set by moving to a new version, the next call loads it again"""
+    caches[CACHE_ALIAS].set(VERSION_KEY.format(user_id=user_id), time.time_ns(), None)
+    with _local_lock:
+        _local.pop(user_id, None)
+    _count('invalidations')
+
+
+def get_known_word_stats():
+    """Counters of this process and the cache hit rate"""
+    with _stats_lock:
+        stats = dict(_stats)
+    loads = stats['local_hits'] + stats['hits'] + stats['misses']
+    stats['hit_rate'] = round((stats['local_hits'] + stats['hits']) / loads, 3) if loads else 0
+    stats['local_sets'] = len(_local)
+    return stats
@@ -0,0 +1,123 @@
+"""Inflection -> lemma normalization of vocabulary keys
+
+Definitions are stored under the lemma, so "run", "runs", "running" and "ran" share
+one WordDefinition, one dictionary lookup and one audio file. The surface form stays
+on the WordReference.
+
+The WordInflection table is built from the dictionary data itself: Youdao marks
+inflected forms in their explanations, e.g. "ran" -> "v. 跑；运行（run的过去式）".
+Extraction records the forms it learns while looking words up, and
+`python manage.py merge_inflected_words` builds the table from stored definitions and
+merges the definitions of forms that were saved before.
+"""
+import re
+
+from .word_models import WordDefinition, WordInflection
+
+# Youdao inflection markers and the inflection type they stand for
+INFLECTION_TYPES = {
+    '过去式和过去分词': 'past',
+    '过去式': 'past',
+    '过去分词': 'past_participle',
+    '现在分词': 'present_participle',
+    'ing形式': 'present_participle',
+    '复数形式': 'plural',
+    '复数': 'plural',
+    '第三人称单数': 'third_person',
+    '三单形式': 'third_person',
+    '比较级': 'comparative',
+    '最高级': 'superlative',
+}
+
+# "run的过去式", longer markers first so "过去式和过去分词" is not cut at "过去式"
+INFLECTION_PATTERN = re.compile(
+    r"([A-Za-z][A-Za-z'\-]*)\s*的\s*(" +
+    '|'.join(sorted(map(re.escape, INFLECTION_TYPES), key=len, reverse=True)) +
+    ')'
+)
+
+
+def parse_inflection(form, explains):
+    """Find the lemma of an inflected form in its dictionary explanations
+
+    Only forms whose every explanation line refers to the same lemma are treated as
+    inflections. Forms with senses of their own ("left" as a direction, "running" as an
+    adjective) or that point to several lemmas ("better") keep their own definition.
+
+    :param form: Lowercase word
+    :param explains: List of explanation lines, or the newline-joined translation
+    :return: (lemma, inflection type) or None
+    """
+    if isinstance(explains, str):
+        explains = explains.split('\n')
+    lines = [line for line in explains if line and line.strip()]
+    if not lines:
+        return None
+
+    lemmas = set()
+    inflection = None
+    for line in lines:
+        matches = INFLECTION_PATTERN.findall(line)
+        if not matches:
+            return None
+        for lemma, marker in matches:
+            lemmas.add(lemma.lower())
+            inflection = inflection or INFLECTION_TYPES[marker]
+
+    if len(lemmas) != 1:
+        return None
+    lemma = lemmas.pop()
+    if lemma == form:
+        return None
+    return lemma, inflection
+
+
+def get_lemmas(words, language='en'):
+    """Map words to their lemma with one query, words without an inflection entry are left out"""
+    words = set(words)
+    if not words:
+        return {}
+    return dict(
+        WordInflection.objects.filter(form__in=words, language=language)
+        .values_list('form', 'lemma')
+    )
+
+
+def get_lemma(word, language='en'):
+    """Lemma of a single word, the word itself if it is not a known inflected form"""
+    return get_lemmas([word], language).get(word, word)
+
+
+def record_inflections(inflections, language='en'):
+    """Store (form, lemma, inflection type) entries, forms that already have an entry are kept"""
+    WordInflection.objects.bulk_create([
+        WordInflection(form=form, lemma=lemma, language=language, inflection=inflection)
+        for form, lemma, inflection in inflections
+    ], ignore_conflicts=True)
+
+
+def find_definition(word, language='en'):
+    """WordDefinition of a word, stored under its lemma or, if not merged yet, under the word itself"""
+    word = word.strip().lower()
+    lemma = get_lemma(word, language)
+    definitions = {
+        word_def.text: word_def
+        for word_def in WordDefinition.objects.filter(text__in={word, lemma}, language=language)
+    }
+    return definitions.get(lemma) or definitions.get(word)
+
+
+def find_definitions(words, language='en'):
+    """find_definition for many words with two queries, returns {word: WordDefinition} of the words that have one"""
+    words = {word.strip().lower() for word in words}
+    lemmas = get_lemmas(words, language)
+    definitions = {
+        word_def.text: word_def
+        for word_def in WordDefinition.objects.filter(text__in=words | set(lemmas.values()), language=language)
+    }
+    found = {}
+    for word in words:
+        word_def = definitions.get(lemmas.get(word, word)) or definitions.get(word)
+        if word_def:
+            found[word] = word_def
+    return found
@@ -0,0 +1,687 @@
+"""Cached word lookup behind the lookup-word endpoint
+
+A lookup response has two parts, cached separately in the 'word_lookup' cache:
+
+- the shared payload: the definition of a word, the same for every user. Words with a
+  WordDefinition map to the payload of that definition (keyed on its text, so editing
+  the definition invalidates it for every form that resolves to it, and it expires
+  after LOOKUP_DEFINITION_TIMEOUT should an invalidation be missed), words found in
+  the Youdao cache, the StarDict dictionaries or by the spider are cached as is for
+  LOOKUP_FALLBACK_TIMEOUT, as are words nobody has a definition for (with spelling
+  suggestions, see api/spelling_index.py).
+- the per-user overlay: the user's notes, reference count and favorite flag for a
+  definition. Overlays are keyed on a per-user version, any change to the user's words
+  bumps the version (see invalidate_user_lookups) instead of deleting keys one by one.
+
+Concurrent misses for the same word in this process are coalesced: the first request
+runs the lookup tiers, the others wait for its payload (single flight). Every tier
+records its calls, hits and latency, see get_lookup_stats.
+
+lookup_many answers the lookup-words endpoint (a subtitle line or a list of words) with
+the same payloads and overlays, read with get_many/set_many and set-based queries
+instead of one lookup per word.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import Count
+from django.core.cache import caches
+
+from youdao import cache as youdao_cache
+from youdao import stardict as local_dictionaries
+from youdao import voice_store
+from youdao.spider import YoudaoSpider
+
+from .job_models import PronunciationJob
+from .known_words import is_known_word
+from .lemmatizer import find_definition, find_definitions, get_lemma, get_lemmas
+from .pronunciation_queue import enqueue_pronunciations
+from .spelling_index import suggest
+from .word_models import UserWord, WordReference
+
+CACHE_ALIAS = 'word_lookup'
+WORD_KEY = 'lookup:word:{word}'  # Queried form -> {'definition': text} or a complete payload
+DEFINITION_KEY = 'lookup:definition:{text}'  # WordDefinition text -> payload
+OVERLAY_KEY = 'lookup:overlay:{user_id}:{version}:{definition_id}'
+OVERLAY_VERSION_KEY = 'lookup:overlay_version:{user_id}'
+
+# Defaults, can be overridden in settings.py
+DEFAULT_DEFINITION_TIMEOUT = 900  # WordDefinition payloads, a backstop should an invalidation not reach this cache
+DEFAULT_FALLBACK_TIMEOUT = 300  # Payloads not backed by a WordDefinition, and not found words
+DEFAULT_OVERLAY_TIMEOUT = 120  # Also bounds how long a reference count can lag after a video is deleted
+DEFAULT_SINGLE_FLIGHT_WAIT = 15  # Seconds a coalesced request waits before running the tiers itself
+
+TIERS = ('shared_cache', 'django_db', 'youdao_db', 'stardict', 'negative_cache', 'youdao_spider', 'overlay')
+
+# Process-wide counters, see get_lookup_stats
+_stats = {
+    'requests': 0,
+    'request_seconds': 0.0,
+    'coalesced': 0,  # Requests that waited for the lookup of a concurrent request
+    'batch_requests': 0,  # lookup_many calls, their words are counted in the tiers too
+    'batch_words': 0,
+    'batch_request_seconds': 0.0,
+    'tiers': {tier: {'calls': 0, 'hits': 0, 'seconds': 0.0, 'max_seconds': 0.0} for tier in TIERS},
+}
+_stats_lock = threading.Lock()
+
+
+def _record(tier, hits, seconds, calls=1):
+    """Count calls of a tier, a batch counts one call per word and its time spread over them"""
+    with _stats_lock:
+        counters = _stats['tiers'][tier]
+        counters['calls'] += calls
+        counters['hits'] += hits
+        counters['seconds'] += seconds
+        counters['max_seconds'] = max(counters['max_seconds'], seconds / calls)
+
+
+class _Tier:
+    """Times one lookup tier, set hit to True when the tier answered"""
+
+    def __init__(self, name):
+        self.name = name
+        self.hit = False
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        _record(self.name, self.hit, time.perf_counter() - self.start)
+        return False
+
+
+class SingleFlight:
+    """Runs one call per key at a time, concurrent callers with the same key share its result"""
+
+    class _Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, function, wait=None):
+        """
+        :return: (result, coalesced), coalesced is True when another caller's result was used
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = self._Call()
+
+        if not leader:
+            if call.done.wait(wait) and call.error is None:
+                return call.result, True
+            # The leader failed or is stuck, don't fail with it
+            return function(), False
+
+        try:
+            call.result = function()
+            return call.result, False
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def do_many(self, keys, function, wait=None):
+        """do for many keys, with one call of function for all keys no other caller is running
+
+        :param function: Called with the list of keys to run, returns {key: result}
+        :return: ({key: result}, number of keys whose result came from another caller)
+        """
+        with self._lock:
+            led, followed = {}, {}
+            for key in dict.fromkeys(keys):
+                call = self._calls.get(key)
+                if call is None:
+                    led[key] = self._calls[key] = self._Call()
+                else:
+                    followed[key] = call
+
+        results = {}
+        try:
+            if led:
+                results.update(function(list(led)))
+                for key, call in led.items():
+                    call.result = results.get(key)
+        except Exception as e:
+            for call in led.values():
+                call.error = e
+            raise
+        finally:
+            with self._lock:
+                for key in led:
+                    del self._calls[key]
+            for call in led.values():
+                call.done.set()
+
+        retry = []
+        for key, call in followed.items():
+            if call.done.wait(wait) and call.error is None and call.result is not None:
+                results[key] = call.result
+            else:
+                # The leader failed or is stuck, don't fail with it
+                retry.append(key)
+        if retry:
+            results.update(function(retry))
+        return results, len(followed) - len(retry)
+
+
+_single_flight = SingleFlight()
+
+
+def _payload(status, response, definition_id=None):
+    return {'status': status, 'response': response, 'definition_id': definition_id}
+
+
+def definition_payload(word_def):
+    """Shared payload of a WordDefinition, surface_form is filled in per request"""
+    return _payload(200, {
+        'source': 'django_db',
+        'word': word_def.text,
+        'surface_form': '',
+        'translation': word_def.translation or '',
+        'phonetic': word_def.phonetic or '',
+        'uk_phonetic': word_def.uk_phonetic or '',
+        'us_phonetic': word_def.us_phonetic or '',
+        'web_translation': word_def.web_translation or '',
+        'has_audio': word_def.has_audio
+    }, word_def.id)
+
+
+def build_youdao_response(youdao_data, source, word_text, surface_form):
+    """Build the lookup-word response from a result shaped like the Youdao API json"""
+    result = {
+        'source': source,
+        'word': word_text,
+        'surface_form': surface_form,
+        'translation': '',
+        'phonetic': '',
+        'uk_phonetic': '',
+        'us_phonetic': '',
+        'web_translation': ''
+    }
+
+    # Extract Youdao data
+    if 'basic' in youdao_data:
+        basic = youdao_data['basic']
+
+        # Phonetic
+        if 'phonetic' in basic:
+            result['phonetic'] = basic['phonetic']
+        if 'uk-phonetic' in basic:
+            result['uk_phonetic'] = basic['uk-phonetic']
+        if 'us-phonetic' in basic:
+            result['us_phonetic'] = basic['us-phonetic']
+
+        # Translation
+        if 'explains' in basic and basic['explains']:
+            result['translation'] = '; '.join(basic['explains'])
+
+    # Web translation
+    if 'web' in youdao_data and youdao_data['web']:
+        web_trans = []
+        for item in youdao_data['web']:
+            if 'key' in item and 'value' in item:
+                web_trans.append(f"{item['key']}: {', '.join(item['value'])}")
+        result['web_translation'] = '; '.join(web_trans)
+
+    return result
+
+
+def resolve_word(surface_form):
+    """Run the lookup tiers for a word, returns its shared payload
+
+    First the Django database, then the Youdao cache (in-process LRU, then youdao.db),
+    then the local StarDict dictionaries, and finally the spider. Inflected forms are
+    looked up by their lemma ("ran" -> "run").
+    """
+    word_text = surface_form
+    try:
+        word_text = get_lemma(surface_form)
+    except Exception as e:
+        print(f"Failed to normalize word to its lemma: {str(e)}")
+
+    # 1. Django database, inflected forms are stored under their lemma
+    with _Tier('django_db') as tier:
+        try:
+            word_def = find_definition(surface_form)
+            if word_def:
+                tier.hit = True
+                # A hovered word is likely played next, move its pronunciation up the prefetch queue
+                if not word_def.has_audio:
+                    try:
+                        enqueue_pronunciations([word_def.text], PronunciationJob.PRIORITY_HOVERED)
+                    except Exception as e:
+                        print(f"Failed to queue the pronunciation of '{word_def.text}': {str(e)}")
+                return definition_payload(word_def)
+        except Exception as e:
+            print(f"Failed to query word from Django database: {str(e)}")
+
+    return _resolve_fallback(surface_form, word_text)
+
+
+def _resolve_fallback(surface_form, word_text):
+    """The lookup tiers after the Django database, for a word without a WordDefinition
+
+    :param word_text: Lemma of surface_form, the word looked up in the dictionaries
+    """
+    payload = _resolve_local(surface_form, word_text)
+    if payload is not None:
+        return payload
+
+    # 5. Spider
+    with _Tier('youdao_spider') as tier:
+        try:
+            youdao_result = YoudaoSpider(word_text).get_result(use_cache=False)
+        except Exception as e:
+            print(f"Failed to use spider to query word: {str(e)}")
+            youdao_result = None
+        payload = _spider_payload(surface_form, word_text, youdao_result)
+        tier.hit = payload['status'] == 200
+    return payload
+
+
+def _resolve_local(surface_form, word_text):
+    """The tiers before the spider, returns None when the spider has to be asked"""
+    # 2. Youdao cache (in-process LRU, then youdao.db)
+    with _Tier('youdao_db') as tier:
+        try:
+            youdao_data = youdao_cache.get(word_text)
+            if youdao_data:
+                tier.hit = True
+                return _payload(200, build_youdao_response(youdao_data, 'youdao_db', word_text, surface_form))
+        except Exception as e:
+            print(f"Failed to query word from the Youdao cache: {str(e)}")
+
+    # 3. Local StarDict dictionaries, no network request
+    with _Tier('stardict') as tier:
+        try:
+            found = local_dictionaries.lookup(word_text)
+            if found:
+                tier.hit = True
+                dictionary_name, stardict_data = found
+                response = build_youdao_response(stardict_data, 'stardict', word_text, surface_form)
+                response['dictionary'] = dictionary_name
+                return _payload(200, response)
+        except Exception as e:
+            print(f"Failed to query word from StarDict dictionaries: {str(e)}")
+
+    # 4. Not found, if the dictionary recently had no entry for the word (negative cache)
+    with _Tier('negative_cache') as tier:
+        try:
+            tier.hit = youdao_cache.get_miss(word_text) is not None
+        except Exception as e:
+            print(f"Failed to query the Youdao negative cache: {str(e)}")
+    if tier.hit:
+        return _not_found_payload(surface_form, word_text)
+    return None
+
+
+def _spider_payload(surface_form, word_text, youdao_result):
+    """Payload of a spider result, not found unless the spider got a definition"""
+    if youdao_result and youdao_result['errorCode'] == 0:
+        return _payload(200, build_youdao_response(youdao_result, 'youdao_spider', word_text, surface_form))
+    return _not_found_payload(surface_form, word_text)
+
+
+def _not_found_payload(surface_form, word_text):
+    return _not_found(_payload(404, {
+        'error': 'Failed to find word definition',
+        'word': word_text
+    }), surface_form)
+
+
+def _not_found(payload, surface_form):
+    """Add spelling suggestions to a not found payload, the user likely mistyped the word"""
+    try:
+        payload['response']['suggestions'] = suggest(surface_form)
+    except Exception as e:
+        print(f"Failed to suggest spellings: {str(e)}")
+        payload['response']['suggestions'] = []
+    return payload
+
+
+def _store(surface_form, payload):
+    """Store the shared payload of a word in the cache, returns the payload"""
+    cache = caches[CACHE_ALIAS]
+    if payload['definition_id'] is not None:
+        text = payload['response']['word']
+        timeout = getattr(settings, 'LOOKUP_DEFINITION_TIMEOUT', DEFAULT_DEFINITION_TIMEOUT)
+        cache.set(DEFINITION_KEY.format(text=text), payload, timeout)
+        cache.set(WORD_KEY.format(word=surface_form), {'definition': text}, timeout)
+    elif payload['response'].get('source') == 'youdao_spider' and not (
+            payload['response']['translation'] or payload['response']['web_translation']):
+        # The spider returns an empty result on network errors, the next request retries it
+        pass
+    else:
+        cache.set(WORD_KEY.format(word=surface_form), payload,
+                  getattr(settings, 'LOOKUP_FALLBACK_TIMEOUT', DEFAULT_FALLBACK_TIMEOUT))
+    return payload
+
+
+def _coalesced(surface_form, resolve):
+    """Resolve and store a word once per process however many requests miss it at the same time"""
+    payload, coalesced = _single_flight.do(
+        surface_form, lambda: _store(surface_form, resolve()),
+        getattr(settings, 'LOOKUP_SINGLE_FLIGHT_WAIT', DEFAULT_SINGLE_FLIGHT_WAIT)
+    )
+    if coalesced:
+        with _stats_lock:
+            _stats['coalesced'] += 1
+    return payload
+
+
+def get_shared_payload(surface_form):
+    """Shared payload of a word, from the cache or from the lookup tiers"""
+    cache = caches[CACHE_ALIAS]
+    with _Tier('shared_cache') as tier:
+        payload = cache.get(WORD_KEY.format(word=surface_form))
+        if payload is not None and 'definition' in payload:
+            # Dropped when the definition changes, the tiers run again
+            payload = cache.get(DEFINITION_KEY.format(text=payload['definition']))
+        tier.hit = payload is not None
+    if payload is not None:
+        return payload
+
+    return _coalesced(surface_form, lambda: resolve_word(surface_form))
+
+
+def get_shared_payloads(surface_forms):
+    """get_shared_payload for many words, returns {surface_form: payload}
+
+    Cached payloads are read with two get_many calls, the WordDefinitions of the misses
+    with two queries (see find_definitions). The words without a WordDefinition go
+    through the local tiers one by one, the spider gets what is left in one batch (see
+    _resolve_fallbacks), coalesced per word with concurrent lookups.
+    """
+    cache = caches[CACHE_ALIAS]
+    forms = list(dict.fromkeys(surface_forms))
+    payloads = {}
+
+    start = time.perf_counter()
+    cached = cache.get_many([WORD_KEY.format(word=form) for form in forms])
+    aliases = {}
+    for form in forms:
+        payload = cached.get(WORD_KEY.format(word=form))
+        if payload is not None and 'definition' in payload:
+            aliases[form] = payload['definition']
+        elif payload is not None:
+            payloads[form] = payload
+    if aliases:
+        definitions = cache.get_many([DEFINITION_KEY.format(text=text) for text in set(aliases.values())])
+        for form, text in aliases.items():
+            payload = definitions.get(DEFINITION_KEY.format(text=text))
+            if payload is not None:
+                payloads[form] = payload
+    if forms:
+        _record('shared_cache', len(payloads), time.perf_counter() - start, len(forms))
+
+    missing = [form for form in forms if form not in payloads]
+    if not missing:
+        return payloads
+
+    # 1. Django database, one query for the lemmas and one for the definitions
+    start = time.perf_counter()
+    try:
+        definitions = find_definitions(missing)
+    except Exception as e:
+        print(f"Failed to query words from Django database: {str(e)}")
+        definitions = {}
+    _record('django_db', len(definitions), time.perf_counter() - start, len(missing))
+
+    entries = {}
+    for form, word_def in definitions.items():
+        payloads[form] = definition_payload(word_def)
+        entries[DEFINITION_KEY.format(text=word_def.text)] = payloads[form]
+        entries[WORD_KEY.format(word=form)] = {'definition': word_def.text}
+    if entries:
+        cache.set_many(entries, getattr(settings, 'LOOKUP_DEFINITION_TIMEOUT', DEFAULT_DEFINITION_TIMEOUT))
+    # The words of a line are likely played next, prefetch their pronunciations
+    without_audio = {word_def.text for word_def in definitions.values() if not word_def.has_audio}
+    if without_audio:
+        try:
+            enqueue_pronunciations(without_audio)
+        except Exception as e:
+            print(f"Failed to queue pronunciations: {str(e)}")
+
+    # 2.-5. The other tiers, for the words nobody has a definition for
+    rest = [form for form in missing if form not in definitions]
+    if rest:
+        try:
+            lemmas = get_lemmas(rest)
+        except Exception as e:
+            print(f"Failed to normalize words to their lemma: {str(e)}")
+            lemmas = {}
+        resolved, coalesced = _single_flight.do_many(
+            rest, lambda forms: _resolve_fallbacks(forms, lemmas),
+            getattr(settings, 'LOOKUP_SINGLE_FLIGHT_WAIT', DEFAULT_SINGLE_FLIGHT_WAIT)
+        )
+        if coalesced:
+            with _stats_lock:
+                _stats['coalesced'] += coalesced
+        payloads.update(resolved)
+    return payloads
+
+
+def _resolve_fallbacks(forms, lemmas):
+    """_resolve_fallback for many words, returns {surface_form: payload}
+
+    The local tiers run word by word, the words they don't answer are sent to the spider
+    together with one YoudaoSpider.get_results_many call instead of one request at a time.
+    """
+    payloads = {}
+    spider_words = {}  # surface form -> lemma
+    for form in forms:
+        word_text = lemmas.get(form, form)
+        payload = _resolve_local(form, word_text)
+        if payload is None:
+            spider_words[form] = word_text
+        else:
+            payloads[form] = _store(form, payload)
+
+    if spider_words:
+        start = time.perf_counter()
+        results = {}
+        try:
+            results = dict(YoudaoSpider.get_results_many(spider_words.values(), use_cache=False))
+        except Exception as e:
+            print(f"Failed to use spider to query words: {str(e)}")
+        for form, word_text in spider_words.items():
+            payloads[form] = _store(form, _spider_payload(form, word_text, results.get(word_text)))
+        hits = sum(1 for form in spider_words if payloads[form]['status'] == 200)
+        _record('youdao_spider', hits, time.perf_counter() - start, len(spider_words))
+    return payloads
+
+
+def _overlay_version(user_id):
+    """Current overlay version of a user, a lost version is replaced by a new one, never by an old one"""
+    cache = caches[CACHE_ALIAS]
+    key = OVERLAY_VERSION_KEY.format(user_id=user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def get_user_overlay(user_id, definition_id):
+    """The user's notes, reference count and favorite flag for a definition, empty if the user doesn't have it"""
+    cache = caches[CACHE_ALIAS]
+    with _Tier('overlay') as tier:
+        key = OVERLAY_KEY.format(user_id=user_id, version=_overlay_version(user_id), definition_id=definition_id)
+        overlay = cache.get(key)
+        tier.hit = overlay is not None
+    if overlay is not None:
+        return overlay
+
+    overlay = {}
+    # The known-word set tells without a query when the user doesn't have the word
+    if is_known_word(user_id, definition_id) is not False:
+        user_word = UserWord.objects.filter(user_id=user_id, word_definition_id=definition_id).first()
+        if user_word:
+            overlay = {
+                'notes': user_word.notes or '',
+                # Calculate word frequency in references
+                'frequency': WordReference.objects.filter(user_word=user_word).count(),
+                'is_favorite': user_word.is_favorite
+            }
+    cache.set(key, overlay, getattr(settings, 'LOOKUP_OVERLAY_TIMEOUT', DEFAULT_OVERLAY_TIMEOUT))
+    return overlay
+
+
+def get_user_overlays(user_id, definition_ids):
+    """get_user_overlay for many definitions, the misses with one query for the user's words
+    and one for their reference counts, returns {definition_id: overlay}"""
+    cache = caches[CACHE_ALIAS]
+    definition_ids = set(definition_ids)
+    if not definition_ids:
+        return {}
+
+    start = time.perf_counter()
+    version = _overlay_version(user_id)
+    keys = {
+        definition_id: OVERLAY_KEY.format(user_id=user_id, version=version, definition_id=definition_id)
+        for definition_id in definition_ids
+    }
+    cached = cache.get_many(keys.values())
+    overlays = {
+        definition_id: cached[key] for definition_id, key in keys.items() if key in cached
+    }
+    _record('overlay', len(overlays), time.perf_counter() - start, len(definition_ids))
+
+    missing = definition_ids - overlays.keys()
+    if not missing:
+        return overlays
+
+    user_words = {
+        user_word.word_definition_id: user_word
+        for user_word in UserWord.objects.filter(user_id=user_id, word_definition_id__in=missing)
+    }
+    frequencies = dict(
+        WordReference.objects.filter(user_word_id__in=[user_word.id for user_word in user_words.values()])
+        .values('user_word_id').annotate(count=Count('id')).values_list('user_word_id', 'count')
+    ) if user_words else {}
+
+    entries = {}
+    for definition_id in missing:
+        user_word = user_words.get(definition_id)
+        overlay = {}
+        if user_word:
+            overlay = {
+                'notes': user_word.notes or '',
+                'frequency': frequencies.get(user_word.id, 0),
+                'is_favorite': user_word.is_favorite
+            }
+        overlays[definition_id] = entries[keys[definition_id]] = overlay
+    cache.set_many(entries, getattr(settings, 'LOOKUP_OVERLAY_TIMEOUT', DEFAULT_OVERLAY_TIMEOUT))
+    return overlays
+
+
+def lookup(surface_form, user=None):
+    """Look up a normalized (lowercase) word for the lookup-word endpoint
+
+    :return: (HTTP status, response dict)
+    """
+    start = time.perf_counter()
+    payload = get_shared_payload(surface_form)
+    response = dict(payload['response'])
+    if payload['definition_id'] is not None:
+        response['surface_form'] = surface_form
+        if user is not None:
+            response.update(get_user_overlay(user.id, payload['definition_id']))
+
+    with _stats_lock:
+        _stats['requests'] += 1
+        _stats['request_seconds'] += time.perf_counter() - start
+    return payload['status'], response
+
+
+def lookup_many(surface_forms, user=None):
+    """Look up normalized (lowercase) words for the lookup-words endpoint
+
+    Each response is the one lookup-word returns plus 'status', 'saved' (the user has the
+    word) and 'has_audio' for every word, not only the ones with a WordDefinition.
+
+    :return: {surface_form: response dict}, in the order of surface_forms
+    """
+    start = time.perf_counter()
+    payloads = get_shared_payloads(surface_forms)
+    overlays = {}
+    if user is not None:
+        overlays = get_user_overlays(user.id, {
+            payload['definition_id'] for payload in payloads.values() if payload['definition_id'] is not None
+        })
+
+    results = {}
+    for form, payload in payloads.items():
+        response = dict(payload['response'])
+        response['status'] = payload['status']
+        if payload['definition_id'] is not None:
+            response['surface_form'] = form
+            overlay = overlays.get(payload['definition_id'], {})
+            response.update(overlay)
+            response['saved'] = bool(overlay)
+        else:
+            response['saved'] = False
+            if payload['status'] == 200:
+                # No WordDefinition to tell, ask the pronunciation store
+                response['has_audio'] = voice_store.find(response['word']) is not None
+        results[form] = response
+
+    with _stats_lock:
+        _stats['batch_requests'] += 1
+        _stats['batch_words'] += len(results)
+        _stats['batch_request_seconds'] += time.perf_counter() - start
+    return results
+
+
+def invalidate_definitions(texts):
+    """Drop the cached payloads of words whose WordDefinition was created, changed or deleted"""
+    keys = []
+    for text in texts:
+        keys.append(DEFINITION_KEY.format(text=text))
+        keys.append(WORD_KEY.format(word=text))
+    if keys:
+        caches[CACHE_ALIAS].delete_many(keys)
+
+
+def invalidate_user_lookups(user_id):
+    """Drop every overlay of a user by moving to a new version"""
+    caches[CACHE_ALIAS].set(OVERLAY_VERSION_KEY.format(user_id=user_id), time.time_ns(), None)
+
+
+def get_lookup_stats():
+    """Counters of this process: request latency, coalesced requests and per-tier hit rate and latency"""
+    with _stats_lock:
+        stats = {
+            'requests': _stats['requests'],
+            'avg_request_ms': round(_stats['request_seconds'] / _stats['requests'] * 1000, 3) if _stats['requests'] else 0,
+            'coalesced': _stats['coalesced'],
+            'batch_requests': _stats['batch_requests'],
+            'batch_words': _stats['batch_words'],
+            'avg_batch_request_ms': round(
+                _stats['batch_request_seconds'] / _stats['batch_requests'] * 1000, 3
+            ) if _stats['batch_requests'] else 0,
+            'tiers': {},
+        }
+        for tier, counters in _stats['tiers'].items():
+            calls = counters['calls']
+            stats['tiers'][tier] = {
+                'calls': calls,
+                'hits': counters['hits'],
+                'hit_rate': round(counters['hits'] / calls, 3) if calls else 0,
+                'avg_ms': round(counters['seconds'] / calls * 1000, 3) if calls else 0,
+                'max_ms': round(counters['max_seconds'] * 1000, 3),
+            }
+    return stats
@@ -0,0 +1,101 @@
+import json
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+
+from api.lookup_service import CACHE_ALIAS
+from api.models import Subtitle
+from api.word_lookup import WORD_PATTERN
+
+SAMPLE_LINE = (
+    "I never thought we'd actually make it this far, but here we are standing on the edge "
+    "of something completely different, and honestly nobody knows what happens next"
+)
+
+
+class Command(BaseCommand):
+    help = ('Compare looking up the words of a subtitle line with one lookup-word request per word '
+            'against one lookup-words request, through the full middleware and authentication stack')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=str, default='',
+                            help='Username the requests are made as (default: the first superuser)')
+        parser.add_argument('--subtitle', type=int, default=0,
+                            help='ID of a subtitle of the user to take the words from (default: a sample line)')
+        parser.add_argument('--words', type=str, default='',
+                            help='Comma separated words instead of a subtitle')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Runs per mode (default: 5)')
+        parser.add_argument('--cold', action='store_true',
+                            help='Clear the word_lookup cache before every run (affects a running server)')
+
+    def handle(self, *args, **options):
+        if options['user']:
+            user = User.objects.filter(username=options['user']).first()
+        else:
+            user = User.objects.filter(is_superuser=True).order_by('id').first()
+        if user is None:
+            raise CommandError('No such user, pass --user')
+
+        if options['words']:
+            text = options['words'].replace(',', ' ')
+        elif options['subtitle']:
+            subtitle = Subtitle.objects.filter(id=options['subtitle']).first()
+            if subtitle is None:
+                raise CommandError(f"No subtitle {options['subtitle']}")
+            text = subtitle.text
+        else:
+            text = SAMPLE_LINE
+        words = list(dict.fromkeys(word.lower() for word in WORD_PATTERN.findall(text)))
+        if not words:
+            raise CommandError('No words to look up')
+
+        # Session login for lookup-word, the token for lookup-words, as the extension sends it
+        token, _ = Token.objects.get_or_create(user=user)
+        client = Client(SERVER_NAME='localhost', HTTP_AUTHORIZATION=f'Token {token.key}')
+        client.force_login(user)
+
+        def single():
+            for word in words:
+                response = client.get('/api/lookup-word/', {'word': word})
+                if response.status_code not in (200, 404):
+                    raise CommandError(f"lookup-word returned {response.status_code} for '{word}'")
+
+        def batch():
+            response = client.post('/api/lookup-words/', json.dumps({'words': words}), content_type='application/json')
+            if response.status_code != 200:
+                raise CommandError(f"lookup-words returned {response.status_code}: {response.content[:200]}")
+
+        # One run first so dictionary lookups and pronunciation queueing don't end up in the timings
+        batch()
+        self.stdout.write(f"{len(words)} distinct words as '{user.username}', {'cold' if options['cold'] else 'warm'} "
+                          f"cache, {max(1, options['repeat'])} runs per mode")
+        self.stdout.write(f"{'mode':<26} {'requests':>8} {'queries':>8} {'median ms':>10} {'ms/word':>9}")
+        results = {}
+        for name, requests, run in (('lookup-word x N', len(words), single), ('lookup-words', 1, batch)):
+            timings = []
+            queries = 0
+            for _ in range(max(1, options['repeat'])):
+                if options['cold']:
+                    caches[CACHE_ALIAS].clear()
+                with CaptureQueriesContext(connection) as context:
+                    start = time.perf_counter()
+                    run()
+                    timings.append(time.perf_counter() - start)
+                queries = len(context.captured_queries)
+            median = statistics.median(timings)
+            results[name] = median
+            self.stdout.write(f"{name:<26} {requests:>8} {queries:>8} {median * 1000:>10.2f} "
+                              f"{median / len(words) * 1000:>9.3f}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"lookup-words is {results['lookup-word x N'] / results['lookup-words']:.1f}x faster than "
+            f"{len(words)} lookup-word requests (in process, no network round trips counted)"
+        ))
@@ -0,0 +1,92 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.models import Video
+from api.word_extractor import WordExtractor
+from api.word_frequency import get_frequency_ranks, skip_common_words
+from api.management.commands.benchmark_extraction import build_sample_transcript
+
+
+class Command(BaseCommand):
+    help = 'Measure how many word references and lookups skipping the top-N common words saves on a transcript'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--thresholds', type=str, default='0,50,100,200,500',
+                            help='Comma separated top-N values to compare (default: 0,50,100,200,500)')
+        parser.add_argument('--video', type=int, default=0,
+                            help='Use the subtitles of a stored video (by ID)')
+        parser.add_argument('--file', type=str, default='',
+                            help='Use a real transcript instead, one subtitle per line')
+        parser.add_argument('--minutes', type=int, default=120,
+                            help='Length of the synthetic transcript in minutes when no video or file is given')
+        parser.add_argument('--extract', action='store_true',
+                            help='With --video, also run extraction stages 1 and 2 (tokenize and resolve) per '
+                                 'threshold. Lookups go to the dictionary, nothing is saved')
+
+    def handle(self, *args, **options):
+        try:
+            thresholds = [int(value) for value in options['thresholds'].split(',') if value.strip()]
+        except ValueError:
+            raise CommandError('--thresholds must be comma separated integers')
+        if options['extract'] and not options['video']:
+            raise CommandError('--extract needs --video')
+
+        video = None
+        if options['video']:
+            video = Video.objects.filter(id=options['video']).first()
+            if video is None:
+                raise CommandError(f"Video {options['video']} does not exist")
+            texts = [subtitle.text or '' for subtitle in video.get_subtitles().order_by('id')]
+        elif options['file']:
+            with open(options['file'], encoding='utf-8') as f:
+                texts = [line.strip() for line in f if line.strip()]
+        else:
+            texts = build_sample_transcript(options['minutes'])
+
+        start = time.perf_counter()
+        get_frequency_ranks()
+        load_time = time.perf_counter() - start
+
+        # Same occurrence tuples as the token index, so the filter runs on what extraction sees
+        extractor = WordExtractor(user=None)
+        occurrences = []
+        for index, tokens in enumerate(extractor.tokenizer.pipe(texts)):
+            for word_text, start, end in extractor.find_word_positions(tokens):
+                occurrences.append((word_text.lower(), index, start, end, word_text))
+
+        self.stdout.write(f"Transcript: {len(texts)} subtitles, {len(occurrences)} word occurrences, "
+                          f"{len({occurrence[0] for occurrence in occurrences})} distinct words")
+        self.stdout.write(f"Frequency list: {len(get_frequency_ranks())} words, loaded in {load_time * 1000:.1f}ms")
+
+        for top_n in thresholds:
+            start = time.perf_counter()
+            kept, skipped = skip_common_words(occurrences, top_n)
+            elapsed = time.perf_counter() - start
+            distinct = len({occurrence[0] for occurrence in kept})
+            share = skipped / len(occurrences) * 100 if occurrences else 0
+            self.stdout.write(
+                f"top {top_n:>5}: {len(kept):>7} references ({share:5.1f}% fewer), "
+                f"{distinct:>6} distinct words to resolve, filter {elapsed * 1000:.1f}ms"
+            )
+
+        if options['extract']:
+            self.run_extraction(video, thresholds)
+
+    def run_extraction(self, video, thresholds):
+        """Time extraction stages 1 and 2 on the stored video for each threshold"""
+        self.stdout.write(self.style.WARNING(
+            'Lookups of one run are cached for the next ones, run a single threshold for cold timings'
+        ))
+        subtitles = list(video.get_subtitles())
+        for top_n in thresholds:
+            extractor = WordExtractor(user=video.user)
+            extractor.skip_common_words = top_n
+            start = time.perf_counter()
+            stats = extractor.extract_video_words(video, subtitles)['stats']
+            elapsed = time.perf_counter() - start
+            self.stdout.write(
+                f"top {top_n:>5}: {elapsed:.2f}s (tokenize {stats['tokenize_seconds']}s, "
+                f"resolve {stats['resolve_seconds']}s), {stats['occurrence_count'] - stats['skipped_common_count']} "
+                f"references, {stats['lookup_count']} lookups"
+            )
@@ -0,0 +1,108 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.word_extractor import WordExtractor
+from api.tokenizers import NLP_BATCH_SIZE, SpacyTokenizer, load_english_model
+
+
+# Sentence bank used to build a synthetic lecture-style transcript
+SAMPLE_SENTENCES = [
+    "So today we're going to talk about how memory actually works in the brain.",
+    "It's not as simple as you'd think, and there's a lot we still don't know.",
+    "Let's start with a quick example that I think you'll find interesting.",
+    "When you learn a new word, your brain doesn't store it in just one place.",
+    "Researchers have shown that repetition over several days is far more effective.",
+    "I can't stress this enough: spaced practice beats cramming every single time.",
+    "Now, what happens if we look at the data from the second experiment?",
+    "The participants who slept after studying remembered about twenty percent more.",
+    "You've probably noticed this yourself when you're preparing for an exam.",
+    "Here's the thing, though. Context matters a lot more than people assume.",
+    "If you study in the same room where you'll be tested, recall improves.",
+    "We'll come back to that idea later, because it's going to be important.",
+    "Okay, let me put the next slide up so everyone can see the graph.",
+    "As you can see, the curve drops quickly at first and then flattens out.",
+    "That's what Ebbinghaus called the forgetting curve, back in the 1880s.",
+    "Isn't it remarkable that his findings still hold up more than a century later?",
+]
+
+# Average subtitle length on YouTube after merging, in seconds
+SECONDS_PER_SUBTITLE = 5
+
+
+def build_sample_transcript(minutes, seed=42, count=None):
+    """Build a deterministic synthetic transcript covering the given number of minutes, or count subtitles"""
+    rng = random.Random(seed)
+    if count is None:
+        count = int(minutes * 60 / SECONDS_PER_SUBTITLE)
+    return [
+        ' '.join(rng.sample(SAMPLE_SENTENCES, 2))
+        for _ in range(count)
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark word extraction tokenization: per-subtitle nlp() with a fresh model vs shared model with nlp.pipe'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--minutes', type=int, default=120,
+                            help='Length of the synthetic transcript in minutes (default: 120)')
+        parser.add_argument('--file', type=str, default='',
+                            help='Use a real transcript instead, one subtitle per line')
+        parser.add_argument('--batch-size', type=int, default=NLP_BATCH_SIZE,
+                            help='Batch size for nlp.pipe')
+
+    def handle(self, *args, **options):
+        if options['file']:
+            with open(options['file'], encoding='utf-8') as f:
+                texts = [line.strip() for line in f if line.strip()]
+        else:
+            texts = build_sample_transcript(options['minutes'])
+
+        self.stdout.write(f"Transcript: {len(texts)} subtitles, {sum(len(t.split()) for t in texts)} whitespace-separated words")
+
+        # Tokenization only, lookups are excluded because they depend on network latency
+        extractor = WordExtractor(user=None)
+
+        # Before: every extractor loads its own model and runs the full pipeline per subtitle
+        start = time.perf_counter()
+        nlp = load_english_model()
+        load_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        before_words = 0
+        for text in texts:
+            doc = nlp(text)
+            before_words += len(extractor.find_word_positions(
+                [(token.text, token.idx) for token in doc if not token.is_space]
+            ))
+        before_time = time.perf_counter() - start
+        del nlp
+
+        # After: shared model, whole video batched through nlp.pipe with only the tokenizer
+        tokenizer = SpacyTokenizer(batch_size=options['batch_size'])
+        start = time.perf_counter()
+        tokenizer.tokenize('')
+        shared_load_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        after_words = 0
+        for tokens in tokenizer.pipe(texts):
+            after_words += len(extractor.find_word_positions(tokens))
+        after_time = time.perf_counter() - start
+
+        if before_words != after_words:
+            self.stdout.write(self.style.WARNING(
+                f"Word counts differ: before={before_words}, after={after_words}"
+            ))
+
+        before_rate = before_words / before_time if before_time else 0
+        after_rate = after_words / after_time if after_time else 0
+
+        self.stdout.write(f"Before: model load {load_time:.2f}s per extractor, "
+                          f"{before_time:.2f}s for {before_words} words ({before_rate:,.0f} words/sec)")
+        self.stdout.write(f"After:  model load {shared_load_time:.2f}s once per process, "
+                          f"{after_time:.2f}s for {after_words} words ({after_rate:,.0f} words/sec)")
+        if before_rate:
+            self.stdout.write(self.style.SUCCESS(f"Speedup: {after_rate / before_rate:.1f}x"))
@@ -0,0 +1,172 @@
+import gzip
+import os
+import random
+import struct
+import tempfile
+import time
+import zlib
+
+from django.core.management.base import BaseCommand, CommandError
+
+from youdao.lib.cpystardict import Dictionary
+from youdao.lib.stardict_index import SIDECAR_SUFFIX
+
+
+def write_sample_dictionary(prefix, word_count, seed=42):
+    """Write a synthetic StarDict dictionary (.ifo, .idx, .dict) with word_count entries, returns its words"""
+    rng = random.Random(seed)
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    words = set()
+    while len(words) < word_count:
+        words.add(''.join(rng.choice(letters) for _ in range(rng.randint(3, 12))).encode('utf-8'))
+    words = sorted(words, key=lambda word: (word.lower(), word))
+
+    idx = bytearray()
+    offset = 0
+    with open(prefix + '.dict', 'wb') as dict_file:
+        for word in words:
+            definition = b'n. definition of ' + word
+            dict_file.write(definition)
+            idx += word + b'\0' + struct.pack('>LL', offset, len(definition))
+            offset += len(definition)
+    with open(prefix + '.idx', 'wb') as idx_file:
+        idx_file.write(idx)
+    with open(prefix + '.ifo', 'w') as ifo_file:
+        ifo_file.write("StarDict's dict ifo file\nversion=2.4.2\nbookname=benchmark\n"
+                       f"wordcount={len(words)}\nidxfilesize={len(idx)}\nsametypesequence=m\n")
+    return words
+
+
+def write_dictzip(source, target, chunk_length=58315):
+    """Compress a file to dictzip: deflate chunks flushed independently, their sizes in the RA header field"""
+    with open(source, 'rb') as f:
+        data = f.read()
+    compressor = zlib.compressobj(9, zlib.DEFLATED, -zlib.MAX_WBITS)
+    chunks = []
+    for start in range(0, len(data), chunk_length):
+        chunks.append(compressor.compress(data[start:start + chunk_length]) + compressor.flush(zlib.Z_FULL_FLUSH))
+    chunks[-1] += compressor.flush(zlib.Z_FINISH)
+    ra = struct.pack('<HHH', 1, chunk_length, len(chunks)) + struct.pack('<%dH' % len(chunks), *map(len, chunks))
+    extra = b'RA' + struct.pack('<H', len(ra)) + ra
+    with open(target, 'wb') as f:
+        f.write(b'\x1f\x8b\x08\x04' + b'\0' * 4 + b'\x02\x03' + struct.pack('<H', len(extra)) + extra)
+        f.writelines(chunks)
+        f.write(struct.pack('<LL', zlib.crc32(data) & 0xffffffff, len(data) & 0xffffffff))
+
+
+def linear_scan(idx_filename, word):
+    """What the old CPyStarDictIndex did per lookup: read the .idx from the start until the word"""
+    with open(idx_filename, 'rb') as f:
+        data = f.read()
+    position = 0
+    while position < len(data):
+        end = data.index(b'\0', position)
+        if data[position:end] == word:
+            return struct.unpack('>LL', data[end + 1:end + 9])
+        position = end + 9
+    raise KeyError(word)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark cold start and lookups/sec of the memory-mapped StarDict index'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dict', type=str, default='',
+                            help='Path prefix of a real dictionary (without extension), default: a synthetic one')
+        parser.add_argument('--words', type=int, default=200000,
+                            help='Entries of the synthetic dictionary (default: 200000)')
+        parser.add_argument('--lookups', type=int, default=100000,
+                            help='Random lookups (default: 100000)')
+        parser.add_argument('--scan-lookups', type=int, default=20,
+                            help='Lookups timed with the old linear scan for comparison (default: 20)')
+        parser.add_argument('--dictzip', action='store_true',
+                            help='Also compare reading definitions from a .dict.dz through gzip and the dictzip reader '
+                                 '(the synthetic .dict is compressed, a real dictionary needs its .dict.dz)')
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as tmp:
+            if options['dict']:
+                prefix = options['dict']
+                if not os.path.exists(prefix + '.idx'):
+                    raise CommandError(f"{prefix}.idx does not exist")
+                words = None
+            else:
+                prefix = os.path.join(tmp, 'benchmark')
+                words = write_sample_dictionary(prefix, options['words'])
+
+            sidecar = prefix + '.idx' + SIDECAR_SUFFIX
+            if os.path.exists(sidecar):
+                os.remove(sidecar)
+
+            start = time.perf_counter()
+            dictionary = Dictionary(prefix)
+            cold_start = time.perf_counter() - start
+            start = time.perf_counter()
+            dictionary = Dictionary(prefix)
+            warm_start = time.perf_counter() - start
+            if not dictionary.idx._idx.loaded_from_sidecar:
+                self.stdout.write(self.style.WARNING('The offsets sidecar could not be written next to the .idx file'))
+
+            if words is None:
+                words = list(dictionary.idx.iterkeys())
+            rng = random.Random(7)
+            sample = [rng.choice(words) for _ in range(options['lookups'])]
+
+            start = time.perf_counter()
+            for word in sample:
+                dictionary.idx[word]
+            lookup_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for word in sample:
+                (word + b'#') in dictionary
+            miss_time = time.perf_counter() - start
+
+            scan_sample = sample[:options['scan_lookups']]
+            start = time.perf_counter()
+            for word in scan_sample:
+                assert linear_scan(prefix + '.idx', word) == tuple(dictionary.idx[word])
+            scan_time = time.perf_counter() - start
+            dictionary.idx._idx.close()
+
+            self.stdout.write(f"{len(words)} entries")
+            self.stdout.write(f"Cold start (builds the offsets sidecar): {cold_start * 1000:.0f}ms, "
+                              f"warm start: {warm_start * 1000:.1f}ms")
+            self.stdout.write(f"Binary search: {len(sample) / lookup_time:,.0f} lookups/sec, "
+                              f"{len(sample) / miss_time:,.0f} misses/sec")
+            if scan_sample:
+                self.stdout.write(f"Linear scan:   {len(scan_sample) / scan_time:,.1f} lookups/sec")
+
+            if options['dictzip']:
+                self.benchmark_dictzip(prefix, sample)
+
+    def benchmark_dictzip(self, prefix, sample):
+        """Definition reads from the .dict.dz: seeking a gzip file against inflating only the covering chunks"""
+        from youdao.lib.dictzip import open_dictzip
+
+        dz_filename = prefix + '.dict.dz'
+        if not os.path.exists(dz_filename):
+            write_dictzip(prefix + '.dict', dz_filename)
+        dictionary = Dictionary(prefix)
+        coordinates = [dictionary.idx[word] for word in sample]
+        dictionary.idx._idx.close()
+
+        gzip_file = gzip.open(dz_filename, 'rb')
+        gzip_sample = coordinates[:50]
+        start = time.perf_counter()
+        for offset, size in gzip_sample:
+            gzip_file.seek(offset)
+            gzip_file.read(size)
+        gzip_time = time.perf_counter() - start
+        gzip_file.close()
+
+        dictzip_file = open_dictzip(dz_filename)
+        start = time.perf_counter()
+        for offset, size in coordinates:
+            dictzip_file.read_range(offset, size)
+        dictzip_time = time.perf_counter() - start
+        dictzip_file.close()
+
+        self.stdout.write(f"gzip seek:  {gzip_time / len(gzip_sample) * 1000:.2f}ms per definition")
+        self.stdout.write(f"dictzip:    {dictzip_time / len(coordinates) * 1000:.3f}ms per definition "
+                          f"({dictzip_file.hits} chunk cache hits, {dictzip_file.misses} chunks inflated)")
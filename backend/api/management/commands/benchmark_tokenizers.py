@@ -0,0 +1,80 @@
+import resource
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.tokenizers import TOKENIZER_ENGINES
+from api.management.commands.benchmark_extraction import build_sample_transcript
+
+
+def get_peak_rss_mb():
+    """Peak resident memory of this process in MB (ru_maxrss is KB on Linux, bytes on macOS)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+class Command(BaseCommand):
+    help = 'Benchmark throughput and memory of the word extraction tokenizer engines'
+    # System checks import every view and its dependencies, which would hide the engine's own memory
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--engine', type=str, default='', choices=[''] + list(TOKENIZER_ENGINES),
+                            help='Benchmark a single engine in this process (default: every engine, '
+                                 'each in its own process so memory numbers are not mixed)')
+        parser.add_argument('--subtitles', type=int, default=10000,
+                            help='Number of synthetic subtitles (default: 10000)')
+        parser.add_argument('--file', type=str, default='',
+                            help='Use a real transcript instead, one subtitle per line')
+
+    def handle(self, *args, **options):
+        if not options['engine']:
+            for engine in TOKENIZER_ENGINES:
+                self.run_in_subprocess(engine, options)
+            return
+
+        if options['file']:
+            with open(options['file'], encoding='utf-8') as f:
+                texts = [line.strip() for line in f if line.strip()]
+        else:
+            texts = build_sample_transcript(minutes=0, count=options['subtitles'])
+
+        # Imported here so the baseline does not include the extractor's dependencies
+        from api.tokenizers import get_tokenizer
+        from api.word_extractor import WordExtractor
+
+        baseline_rss = get_peak_rss_mb()
+
+        start = time.perf_counter()
+        tokenizer = get_tokenizer(options['engine'])
+        tokenizer.tokenize('')
+        load_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        token_lists = list(tokenizer.pipe(texts))
+        elapsed = time.perf_counter() - start
+
+        extractor = WordExtractor(user=None)
+        word_count = sum(len(extractor.find_word_positions(tokens)) for tokens in token_lists)
+
+        peak_rss = get_peak_rss_mb()
+        self.stdout.write(
+            f"{options['engine']:>6}: load {load_time:.2f}s, "
+            f"{len(texts) / elapsed:,.0f} subtitles/sec, {word_count / elapsed:,.0f} words/sec "
+            f"({word_count} words in {elapsed:.2f}s), "
+            f"peak RSS {peak_rss:.0f} MB (+{peak_rss - baseline_rss:.0f} MB over baseline)"
+        )
+
+    def run_in_subprocess(self, engine, options):
+        command = [sys.executable, str(settings.BASE_DIR / 'manage.py'), 'benchmark_tokenizers', '--engine', engine,
+                   '--subtitles', str(options['subtitles'])]
+        if options['file']:
+            command += ['--file', options['file']]
+
+        result = subprocess.run(command, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise CommandError(f"Benchmark of engine '{engine}' failed:\n{result.stderr}")
+        self.stdout.write(result.stdout.rstrip())
@@ -0,0 +1,99 @@
+import os
+import pickle
+import random
+import sqlite3
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+from youdao import cache as youdao_cache
+
+
+def build_sample_result(rng, index):
+    """A synthetic result shaped like what YoudaoSpider caches"""
+    word = f"word{index}"
+    result = {
+        'query': word,
+        'errorCode': 0,
+        'basic': {
+            'uk-phonetic': f"wɜːd{index % 97}",
+            'us-phonetic': f"wɝd{index % 89}",
+            'explains': [f"n. 释义{index}-{i}；词语；消息" for i in range(rng.randint(1, 4))],
+        },
+    }
+    if rng.random() < 0.8:
+        result['web'] = [
+            {'key': f"{word} phrase{i}", 'value': [f"短语{i}", f"词组{i}"]}
+            for i in range(rng.randint(1, 4))
+        ]
+    return word, result
+
+
+class Command(BaseCommand):
+    help = 'Benchmark decoding the structured youdao.db entries table against the legacy pickle rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--entries', type=int, default=100000,
+                            help='Number of synthetic entries (default: 100000)')
+        parser.add_argument('--lookups', type=int, default=20000,
+                            help='Random point lookups per format (default: 20000)')
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+        samples = [build_sample_result(rng, i) for i in range(options['entries'])]
+        columns = youdao_cache.ENTRY_COLUMNS
+        placeholders = ', '.join('?' * len(columns.split(',')))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'benchmark.db')
+            conn = sqlite3.connect(path)
+            conn.execute('CREATE TABLE words (word TEXT PRIMARY KEY, data BLOB)')
+            conn.execute(youdao_cache.CREATE_ENTRIES)
+
+            start = time.perf_counter()
+            pickled = [(word, pickle.dumps(result, protocol=4)) for word, result in samples]
+            pickle_encode = time.perf_counter() - start
+            start = time.perf_counter()
+            entries = [youdao_cache.encode_entry(word, result) for word, result in samples]
+            entry_encode = time.perf_counter() - start
+
+            conn.executemany('INSERT INTO words VALUES (?, ?)', pickled)
+            conn.executemany(f'INSERT INTO entries ({columns}) VALUES ({placeholders})', entries)
+            conn.commit()
+
+            pickle_bytes = sum(len(data) for _, data in pickled)
+            entry_bytes = sum(len(value.encode('utf-8')) if isinstance(value, str) else 8
+                              for entry in entries for value in entry[1:] if value is not None)
+
+            # Full scan: read and decode every row
+            start = time.perf_counter()
+            for (data,) in conn.execute('SELECT data FROM words'):
+                pickle.loads(data)
+            pickle_scan = time.perf_counter() - start
+            start = time.perf_counter()
+            for row in conn.execute(f'SELECT {columns} FROM entries'):
+                youdao_cache.decode_entry(row)
+            entry_scan = time.perf_counter() - start
+
+            # Point lookups by word, as the cache does on an LRU miss
+            words = [rng.choice(samples)[0] for _ in range(options['lookups'])]
+            start = time.perf_counter()
+            for word in words:
+                pickle.loads(conn.execute('SELECT data FROM words WHERE word = ?', (word,)).fetchone()[0])
+            pickle_lookup = time.perf_counter() - start
+            start = time.perf_counter()
+            for word in words:
+                youdao_cache.decode_entry(
+                    conn.execute(f'SELECT {columns} FROM entries WHERE word = ?', (word,)).fetchone()
+                )
+            entry_lookup = time.perf_counter() - start
+            conn.close()
+
+        count = len(samples)
+        lookups = len(words)
+        self.stdout.write(f"{count} entries, {lookups} point lookups")
+        self.stdout.write(f"Pickle:  encode {pickle_encode / count * 1e6:.1f}µs, scan+decode {pickle_scan / count * 1e6:.1f}µs, "
+                          f"lookup {pickle_lookup / lookups * 1e6:.1f}µs per entry, {pickle_bytes / count:.0f} bytes/entry")
+        self.stdout.write(f"Entries: encode {entry_encode / count * 1e6:.1f}µs, scan+decode {entry_scan / count * 1e6:.1f}µs, "
+                          f"lookup {entry_lookup / lookups * 1e6:.1f}µs per entry, {entry_bytes / count:.0f} bytes/entry")
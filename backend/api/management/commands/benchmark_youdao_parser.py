@@ -0,0 +1,92 @@
+import glob
+import os
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+
+from youdao import html_parser
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(html_parser.__file__), 'fixtures', 'pages')
+
+
+def run_parser(parser, html, word):
+    """Parse a page like YoudaoSpider.parse_html, returns (result, exception class name or None)"""
+    result = {'query': '', 'errorCode': 0}
+    try:
+        parser(html, result, word)
+    except Exception as e:
+        return result, type(e).__name__
+    return result, None
+
+
+def measure(parser, html, word, repeat):
+    """(mean seconds per parse, peak traced bytes of one parse)"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        run_parser(parser, html, word)
+    elapsed = (time.perf_counter() - start) / repeat
+
+    tracemalloc.start()
+    try:
+        run_parser(parser, html, word)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return elapsed, peak
+
+
+class Command(BaseCommand):
+    help = 'Compare the XPath parser of Youdao result pages with the BeautifulSoup one on saved pages'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--corpus', type=str, default=DEFAULT_CORPUS,
+                            help='Directory of saved dict.youdao.com/w/eng/ pages, named <word>.html')
+        parser.add_argument('--repeat', type=int, default=50,
+                            help='Parses per page and parser for the timings (default: 50)')
+
+    def handle(self, *args, **options):
+        paths = sorted(glob.glob(os.path.join(options['corpus'], '*.html')))
+        if not paths:
+            raise CommandError(f"No .html pages in {options['corpus']}")
+        repeat = max(1, options['repeat'])
+
+        totals = {'soup': [0.0, 0], 'xpath': [0.0, 0]}
+        mismatches = 0
+        self.stdout.write(f"{'page':<20} {'KB':>6} {'soup ms':>9} {'xpath ms':>9} {'speedup':>8} "
+                          f"{'soup peak KB':>13} {'xpath peak KB':>14}  result")
+        for path in paths:
+            with open(path, encoding='utf-8') as f:
+                html = f.read()
+            word = os.path.splitext(os.path.basename(path))[0]
+
+            # The results must match exactly, including what was written before an exception
+            expected = run_parser(html_parser.parse_soup, html, word)
+            actual = run_parser(html_parser.parse, html, word)
+            identical = repr(expected) == repr(actual)
+            mismatches += not identical
+
+            soup_time, soup_peak = measure(html_parser.parse_soup, html, word, repeat)
+            xpath_time, xpath_peak = measure(html_parser.parse, html, word, repeat)
+            totals['soup'][0] += soup_time
+            totals['soup'][1] += soup_peak
+            totals['xpath'][0] += xpath_time
+            totals['xpath'][1] += xpath_peak
+            self.stdout.write(
+                f"{word:<20} {len(html.encode('utf-8')) / 1024:>6.1f} {soup_time * 1000:>9.3f} "
+                f"{xpath_time * 1000:>9.3f} {soup_time / xpath_time:>7.1f}x {soup_peak / 1024:>13.1f} "
+                f"{xpath_peak / 1024:>14.1f}  {'identical' if identical else 'MISMATCH'}"
+            )
+            if not identical:
+                self.stdout.write(f"  soup:  {expected!r}\n  xpath: {actual!r}")
+
+        count = len(paths)
+        self.stdout.write(
+            f"Mean per page: soup {totals['soup'][0] / count * 1000:.3f}ms, {totals['soup'][1] / count / 1024:.1f}KB peak; "
+            f"xpath {totals['xpath'][0] / count * 1000:.3f}ms, {totals['xpath'][1] / count / 1024:.1f}KB peak "
+            f"({totals['soup'][0] / totals['xpath'][0]:.1f}x faster)"
+        )
+        self.stdout.write('Peaks are Python allocations (tracemalloc), the libxml2 tree of both parsers is not included')
+        if mismatches:
+            raise CommandError(f"{mismatches} of {count} pages parsed differently")
+        self.stdout.write(self.style.SUCCESS(f"All {count} pages parsed identically"))
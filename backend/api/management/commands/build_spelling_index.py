@@ -0,0 +1,105 @@
+import os
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.spelling_index import DEFAULT_SUGGESTIONS, build_index, edit_distance, get_index_path
+
+LETTERS = 'abcdefghijklmnopqrstuvwxyz'
+
+
+def misspell(word, rng):
+    """The word with one or two random deletions, insertions, substitutions or transpositions"""
+    for _ in range(rng.randint(1, 2)):
+        i = rng.randrange(len(word))
+        operation = rng.choice(('delete', 'insert', 'replace', 'transpose') if len(word) > 1 else ('insert',))
+        if operation == 'delete':
+            word = word[:i] + word[i + 1:]
+        elif operation == 'insert':
+            word = word[:i] + rng.choice(LETTERS) + word[i:]
+        elif operation == 'replace':
+            word = word[:i] + rng.choice(LETTERS) + word[i + 1:]
+        else:
+            i = min(i, len(word) - 2)
+            word = word[:i] + word[i + 1] + word[i] + word[i + 2:]
+    return word
+
+
+def scan(index, word, limit):
+    """What the index answers, found by comparing the word with every vocabulary word"""
+    found = []
+    for position, candidate in enumerate(index.words):
+        if candidate != word:
+            distance = edit_distance(word, candidate, index.max_distance)
+            if distance <= index.max_distance:
+                found.append((distance, index.ranks[position], candidate))
+    found.sort()
+    return [(candidate, distance) for distance, _, candidate in found[:limit]]
+
+
+class Command(BaseCommand):
+    help = ('Build the spelling suggestion index from WordDefinition texts and the StarDict headwords, '
+            'or add the definitions created since the last build')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help='Rebuild from scratch instead of adding new definitions to the existing file')
+        parser.add_argument('--path', type=str, default='',
+                            help='Index file (default: SPELLING_INDEX_PATH)')
+        parser.add_argument('--samples', type=int, default=1000,
+                            help='Misspelled vocabulary words to time suggestions with, 0 to skip (default: 1000)')
+        parser.add_argument('--scan-samples', type=int, default=20,
+                            help='Samples also answered by a full scan, to check the index finds the same words '
+                                 '(default: 20)')
+
+    def handle(self, *args, **options):
+        path = options['path'] or get_index_path()
+        start = time.perf_counter()
+        index, rebuilt = build_index(full=options['full'], path=path)
+        elapsed = time.perf_counter() - start
+
+        memory = index.memory_usage()
+        self.stdout.write(
+            f"{'Built' if rebuilt else 'Updated'} {path} in {elapsed:.2f}s: {len(index)} words, {len(index.keys)} deletes "
+            f"(max edit distance {index.max_distance}, prefix length {index.prefix_length}), "
+            f"{os.path.getsize(path) / 1024 / 1024:.1f}MB on disk"
+        )
+        self.stdout.write('Memory: ' + ', '.join(
+            f"{part} {size / 1024 / 1024:.1f}MB" for part, size in memory.items()
+        ))
+
+        samples = min(options['samples'], len(index))
+        if samples <= 0:
+            return
+        rng = random.Random(42)
+        queries = [misspell(word, rng) for word in rng.sample(index.words, samples)]
+        queries = [query for query in queries if query]
+
+        timings = []
+        for query in queries:
+            query_start = time.perf_counter()
+            index.suggest(query, DEFAULT_SUGGESTIONS)
+            timings.append(time.perf_counter() - query_start)
+        timings.sort()
+        self.stdout.write(
+            f"Suggestions for {len(queries)} misspelled words: mean {statistics.mean(timings) * 1000:.3f}ms, "
+            f"p99 {timings[int(len(timings) * 0.99) - 1 if len(timings) >= 100 else -1] * 1000:.3f}ms, "
+            f"max {timings[-1] * 1000:.3f}ms"
+        )
+
+        scan_queries = queries[:options['scan_samples']]
+        if not scan_queries:
+            return
+        mismatches = 0
+        scan_start = time.perf_counter()
+        for query in scan_queries:
+            if scan(index, query, DEFAULT_SUGGESTIONS) != index.suggest(query, DEFAULT_SUGGESTIONS):
+                mismatches += 1
+                self.stdout.write(f"  '{query}': the index and the scan suggest different words")
+        scan_time = (time.perf_counter() - scan_start) / len(scan_queries)
+        self.stdout.write(f"Full scan: {scan_time * 1000:.1f}ms per word")
+        if mismatches:
+            raise CommandError(f"{mismatches} of {len(scan_queries)} suggestions differ from a full scan")
+        self.stdout.write(self.style.SUCCESS(f"The index matches a full scan on {len(scan_queries)} words"))
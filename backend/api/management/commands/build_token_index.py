@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.models import Subtitle, SubtitleToken
+from api.token_index import index_subtitles
+
+
+class Command(BaseCommand):
+    help = 'Fill the per-subtitle token index for subtitles that are not indexed yet'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Re-index every subtitle, e.g. after changing the tokenizer engine')
+        parser.add_argument('--batch-size', type=int, default=2000,
+                            help='Subtitles tokenized per batch (default: 2000)')
+
+    def handle(self, *args, **options):
+        subtitles = Subtitle.objects.all()
+        if not options['rebuild']:
+            subtitles = subtitles.filter(indexed=False)
+
+        total = subtitles.count()
+        self.stdout.write(f"Indexing {total} subtitles")
+
+        start = time.perf_counter()
+        indexed = 0
+        token_count = 0
+        last_id = 0
+        while True:
+            batch = list(subtitles.filter(id__gt=last_id).order_by('id')[:options['batch_size']])
+            if not batch:
+                break
+            token_count += index_subtitles(batch)
+            indexed += len(batch)
+            last_id = batch[-1].id
+            self.stdout.write(f"  {indexed}/{total} subtitles, {token_count} tokens")
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {indexed} subtitles ({token_count} tokens) in {elapsed:.1f}s, "
+            f"the index holds {SubtitleToken.objects.count()} tokens"
+        ))
@@ -0,0 +1,71 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.models import Subtitle
+from api.tokenizers import get_tokenizer
+from api.word_extractor import WordExtractor
+from api.management.commands.benchmark_extraction import build_sample_transcript
+
+
+# Inputs where tokenizers usually disagree: contractions, abbreviations, emoticons,
+# URLs, numbers with units, hyphenation and punctuation runs
+TRICKY_CASES = [
+    "I can't, won't and shouldn't've done it.",
+    "Y'all'd better ask Dr. Smith and Mrs. Jones at 5 p.m. on Jan. 3rd.",
+    "It's 5km away, costs $3.50 (or €4) and takes 10-15 min...",
+    "Visit https://www.example.com/path?q=1 or mail me at someone@example.com!",
+    "\"Well,\" she said -- 'that's it' -- and left :) ;-) <3",
+    "state-of-the-art, e-mail, rock'n'roll and o'clock",
+    "He said:\"no\"...(really?)[sic]{ok}",
+    "U.S. vs. U.K.: 1,000,000 people; 3.14% of them.",
+    "gonna, gotta, wanna, lemme, 'cause, ma'am, o.O, 0_o, :-P, (:",
+    "What?!?! No way!!! Hmm... ok:)",
+    "  Leading and trailing whitespace\tand\ttabs  ",
+    "",
+]
+
+
+class Command(BaseCommand):
+    help = 'Compare the words found by the spacy and regex tokenizer engines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', type=str, default='',
+                            help='Check a transcript file instead, one subtitle per line')
+        parser.add_argument('--limit', type=int, default=10000,
+                            help='Number of stored subtitles to check (default: 10000, 0 skips the database)')
+        parser.add_argument('--tokens', action='store_true',
+                            help='Compare all tokens and offsets instead of only the extracted words')
+        parser.add_argument('--show', type=int, default=20,
+                            help='Number of mismatches to print')
+
+    def handle(self, *args, **options):
+        if options['file']:
+            with open(options['file'], encoding='utf-8') as f:
+                texts = [line.rstrip('\n') for line in f]
+        else:
+            texts = TRICKY_CASES + build_sample_transcript(minutes=0, count=1000)
+            if options['limit']:
+                texts += list(
+                    Subtitle.objects.order_by('id').values_list('text', flat=True)[:options['limit']]
+                )
+
+        extractor = WordExtractor(user=None)
+        expected_tokenizer = get_tokenizer('spacy')
+        actual_tokenizer = get_tokenizer('regex')
+
+        mismatches = 0
+        for text, expected, actual in zip(texts, expected_tokenizer.pipe(texts), actual_tokenizer.pipe(texts)):
+            if not options['tokens']:
+                expected = extractor.find_word_positions(expected)
+                actual = extractor.find_word_positions(actual)
+            if expected == actual:
+                continue
+
+            mismatches += 1
+            if mismatches <= options['show']:
+                self.stdout.write(f"Text:  {text!r}")
+                self.stdout.write(f"spacy: {[item[0] for item in expected]}")
+                self.stdout.write(f"regex: {[item[0] for item in actual]}")
+
+        if mismatches:
+            raise CommandError(f"{mismatches} of {len(texts)} subtitles tokenized differently")
+        self.stdout.write(self.style.SUCCESS(f"All {len(texts)} subtitles tokenized identically"))
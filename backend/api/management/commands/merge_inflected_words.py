@@ -0,0 +1,135 @@
+import os
+import sqlite3
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.lemmatizer import parse_inflection, record_inflections
+from api.word_models import WordDefinition, WordInflection, UserWord
+from youdao import cache as youdao_cache
+from youdao.config import DB_DIR
+
+
+class Command(BaseCommand):
+    help = ('Build the inflection -> lemma table from stored dictionary data and merge the '
+            'definitions of inflected forms into the definition of their lemma')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--language', type=str, default='en')
+        parser.add_argument('--skip-build', action='store_true',
+                            help='Only merge, using the inflection table as it is')
+        parser.add_argument('--lookup-missing', action='store_true',
+                            help='Look up lemmas that have no definition yet instead of leaving their forms unmerged')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report what would be merged without changing anything')
+
+    def handle(self, *args, **options):
+        language = options['language']
+        dry_run = options['dry_run']
+
+        if not options['skip_build']:
+            found = self.collect_inflections(language)
+            self.stdout.write(f"Found {len(found)} inflected forms in the dictionary data")
+            if not dry_run:
+                record_inflections(
+                    [(form, lemma, inflection) for form, (lemma, inflection) in found.items()], language
+                )
+
+        inflections = dict(
+            WordInflection.objects.filter(language=language).values_list('form', 'lemma')
+        )
+        if dry_run and not options['skip_build']:
+            inflections.update({form: lemma for form, (lemma, _) in found.items() if form not in inflections})
+
+        form_defs = WordDefinition.objects.filter(text__in=inflections, language=language)
+        lemma_defs = {
+            word_def.text: word_def
+            for word_def in WordDefinition.objects.filter(text__in=set(inflections.values()), language=language)
+        }
+
+        if options['lookup_missing'] and not dry_run:
+            lemma_defs.update(self.create_definitions(
+                {inflections[form_def.text] for form_def in form_defs} - set(lemma_defs), language
+            ))
+
+        merged = 0
+        missing_lemmas = set()
+        for form_def in form_defs:
+            lemma = inflections[form_def.text]
+            lemma_def = lemma_defs.get(lemma)
+            if lemma_def is None:
+                missing_lemmas.add(lemma)
+                continue
+
+            if dry_run:
+                self.stdout.write(f"Would merge '{form_def.text}' into '{lemma}'")
+            else:
+                self.merge_definition(form_def, lemma_def)
+            merged += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{'Would merge' if dry_run else 'Merged'} {merged} definitions into their lemma"
+        ))
+        if missing_lemmas:
+            self.stdout.write(self.style.WARNING(
+                f"{len(missing_lemmas)} lemmas have no definition yet, their forms were left as they are "
+                f"(run with --lookup-missing to look them up)"
+            ))
+
+    def collect_inflections(self, language):
+        """Parse the inflection markers of stored definitions and of the Youdao cache"""
+        found = {}
+        for text, translation in WordDefinition.objects.filter(language=language).values_list('text', 'translation'):
+            inflection = parse_inflection(text, translation)
+            if inflection:
+                found[text] = inflection
+
+        if language == 'en' and os.path.exists(DB_DIR):
+            try:
+                for word, result in youdao_cache.iter_entries():
+                    explains = result.get('basic', {}).get('explains', [])
+                    word = word.lower()
+                    inflection = parse_inflection(word, explains)
+                    if inflection and word not in found:
+                        found[word] = inflection
+            except sqlite3.Error as e:
+                self.stderr.write(f"Failed to read the Youdao cache: {str(e)}")
+        return found
+
+    def create_definitions(self, lemmas, language):
+        """Look up lemmas concurrently and store their definitions, lemmas whose lookup fails are left out"""
+        from api.pronunciation_queue import enqueue_pronunciations
+        from api.word_extractor import WordExtractor
+
+        if not lemmas:
+            return {}
+        self.stdout.write(f"Looking up {len(lemmas)} lemmas")
+        created = {}
+        for lemma, word_data in WordExtractor(user=None).get_words_data(lemmas):
+            if word_data is not None:
+                created[lemma], _ = WordDefinition.objects.get_or_create(text=lemma, language=language, defaults=word_data)
+        # Pronunciations are downloaded by run_pronunciation_worker
+        enqueue_pronunciations(lemma for lemma, definition in created.items() if not definition.has_audio)
+        return created
+
+    @transaction.atomic
+    def merge_definition(self, form_def, lemma_def):
+        """Move the user words and references of a form's definition to the lemma's definition"""
+        for user_word in UserWord.objects.filter(word_definition=form_def):
+            target = UserWord.objects.filter(user_id=user_word.user_id, word_definition=lemma_def).first()
+            if target is None:
+                user_word.word_definition = lemma_def
+                user_word.save(update_fields=['word_definition'])
+                continue
+
+            # A subtitle keeps one reference per user word, the lemma's reference wins
+            referenced_subtitles = target.references.values_list('subtitle_id', flat=True)
+            user_word.references.exclude(subtitle_id__in=referenced_subtitles).update(user_word=target)
+
+            if user_word.notes:
+                target.notes = f"{target.notes}\n{user_word.notes}" if target.notes else user_word.notes
+            target.is_favorite = target.is_favorite or user_word.is_favorite
+            target.save(update_fields=['notes', 'is_favorite'])
+            user_word.delete()
+
+        form_def.delete()
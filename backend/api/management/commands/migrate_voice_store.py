@@ -0,0 +1,49 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.word_models import WordDefinition
+from youdao import voice_store
+from youdao.config import VOICE_DIR
+
+
+class Command(BaseCommand):
+    help = 'Move pronunciation files from the flat voice directory into the hash-sharded store'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--update-has-audio', action='store_true',
+                            help='Also set has_audio on definitions whose file exists')
+
+    def handle(self, *args, **options):
+        if not os.path.isdir(VOICE_DIR):
+            self.stdout.write(f"{VOICE_DIR} does not exist, nothing to migrate")
+            return
+
+        start = time.perf_counter()
+        moved = 0
+        words = []
+        with os.scandir(VOICE_DIR) as entries:
+            for entry in entries:
+                if not entry.is_file() or not entry.name.endswith(voice_store.SUFFIX):
+                    continue
+                word = entry.name[:-len(voice_store.SUFFIX)]
+                if entry.stat().st_size == 0:
+                    # Failed downloads were stored as empty files, drop them so they are fetched again
+                    os.remove(entry.path)
+                    continue
+                if voice_store.migrate_legacy(word):
+                    moved += 1
+                    words.append(word)
+                if moved and moved % 5000 == 0:
+                    self.stdout.write(f"  {moved} files moved")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Moved {moved} pronunciation files in {time.perf_counter() - start:.1f}s"
+        ))
+
+        if options['update_has_audio'] and words:
+            updated = 0
+            for i in range(0, len(words), 500):
+                updated += WordDefinition.objects.filter(text__in=words[i:i + 500], has_audio=False).update(has_audio=True)
+            self.stdout.write(f"Set has_audio on {updated} definitions")
@@ -0,0 +1,71 @@
+import pickle
+import time
+
+from django.core.management.base import BaseCommand
+
+from youdao import cache as youdao_cache
+from youdao.config import DB_DIR
+
+
+class Command(BaseCommand):
+    help = ('Convert the pickled rows of the legacy youdao.db words table into the structured '
+            'entries table, in batches')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Rows converted per transaction (default: 5000)')
+        parser.add_argument('--drop-legacy', action='store_true',
+                            help='Drop the words table and vacuum the database once every row is converted')
+
+    def handle(self, *args, **options):
+        conn = youdao_cache.get_connection()
+        if not youdao_cache.has_legacy_table(conn):
+            self.stdout.write(f"{DB_DIR} has no legacy words table, nothing to migrate")
+            return
+
+        total = conn.execute('SELECT COUNT(*) FROM words').fetchone()[0]
+        self.stdout.write(f"Converting {total} rows of {DB_DIR}")
+
+        columns = youdao_cache.ENTRY_COLUMNS
+        placeholders = ', '.join('?' * len(columns.split(',')))
+        start = time.perf_counter()
+        converted = 0
+        failed = 0
+        last_rowid = 0
+        while True:
+            rows = conn.execute(
+                'SELECT rowid, word, data FROM words WHERE rowid > ? ORDER BY rowid LIMIT ?',
+                (last_rowid, options['batch_size'])
+            ).fetchall()
+            if not rows:
+                break
+
+            entries = []
+            for _, word, data in rows:
+                try:
+                    entries.append(youdao_cache.encode_entry(word, pickle.loads(data)))
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(f"Skipped '{word}': {str(e)}")
+            # Rows already in entries were saved after the lookup was cached, they are kept
+            conn.executemany(f'INSERT OR IGNORE INTO entries ({columns}) VALUES ({placeholders})', entries)
+            conn.commit()
+
+            converted += len(entries)
+            last_rowid = rows[-1][0]
+            self.stdout.write(f"  {converted + failed}/{total} rows")
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"Converted {converted} rows in {elapsed:.1f}s, {failed} could not be decoded"
+        ))
+
+        if options['drop_legacy']:
+            if failed:
+                self.stdout.write(self.style.WARNING('Kept the words table because some rows could not be converted'))
+                return
+            conn.execute('DROP TABLE words')
+            conn.commit()
+            conn.execute('VACUUM')
+            self.stdout.write(self.style.SUCCESS('Dropped the words table'))
+        youdao_cache.clear()
@@ -0,0 +1,78 @@
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from api.extraction_queue import claim_next_job, run_job
+from api.parallel_extraction import run_pool
+
+
+class Command(BaseCommand):
+    help = 'Run queued word extraction jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int,
+                            default=getattr(settings, 'EXTRACTION_WORKER_CONCURRENCY', 2),
+                            help='Number of jobs processed in parallel')
+        parser.add_argument('--processes', type=int,
+                            default=getattr(settings, 'EXTRACTION_WORKER_PROCESSES', 0),
+                            help='Extract on a pool of this many processes, each with its own model, '
+                                 'with this process as the only database writer (default: threads)')
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help='Seconds to wait before polling again when the queue is empty')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit once the queue is empty instead of polling forever')
+
+    def handle(self, *args, **options):
+        concurrency = max(1, options['concurrency'])
+        self.stop_event = threading.Event()
+
+        # Finish the current jobs and exit on SIGTERM/SIGINT (gunicorn/docker restarts)
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, lambda *_: self.stop_event.set())
+
+        if options['processes'] > 0:
+            self.stdout.write(f"Extraction worker started with {options['processes']} processes")
+            run_pool(options['processes'], self.stop_event, options['poll_interval'], options['once'])
+            self.stdout.write("Extraction worker stopped")
+            return
+
+        self.stdout.write(f"Extraction worker started with concurrency {concurrency}")
+
+        threads = [
+            threading.Thread(target=self.work_loop, args=(options['poll_interval'], options['once']),
+                             name=f'extraction-worker-{i}')
+            for i in range(concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            # Join with a timeout so the main thread keeps receiving signals
+            while thread.is_alive():
+                thread.join(timeout=1)
+
+        self.stdout.write("Extraction worker stopped")
+
+    def work_loop(self, poll_interval, once):
+        """Claim and run jobs until stopped"""
+        while not self.stop_event.is_set():
+            close_old_connections()
+            try:
+                job = claim_next_job()
+            except Exception as e:
+                # Usually "database is locked" under write contention, try again later
+                self.stderr.write(f"Error claiming extraction job: {str(e)}")
+                job = None
+
+            if job is None:
+                if once:
+                    break
+                self.stop_event.wait(poll_interval)
+                continue
+
+            self.stdout.write(f"Running extraction job {job.id} for video {job.video_id} (attempt {job.attempts})")
+            run_job(job)
+
+        close_old_connections()
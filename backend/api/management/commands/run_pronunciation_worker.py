@@ -0,0 +1,53 @@
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from api.pronunciation_queue import run_batch, DEFAULT_BATCH_SIZE, DEFAULT_CONCURRENCY
+
+
+class Command(BaseCommand):
+    help = 'Download queued pronunciation files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int,
+                            default=getattr(settings, 'PRONUNCIATION_WORKER_CONCURRENCY', DEFAULT_CONCURRENCY),
+                            help='Number of downloads running in parallel')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                            help='Jobs claimed at once, has_audio is updated once per batch')
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help='Seconds to wait before polling again when the queue is empty')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit once the queue is empty instead of polling forever')
+
+    def handle(self, *args, **options):
+        concurrency = max(1, options['concurrency'])
+        stop_event = threading.Event()
+
+        # Finish the current batch and exit on SIGTERM/SIGINT (docker restarts)
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, lambda *_: stop_event.set())
+
+        self.stdout.write(f"Pronunciation worker started with concurrency {concurrency}")
+        while not stop_event.is_set():
+            close_old_connections()
+            try:
+                stats = run_batch(max(1, options['batch_size']), concurrency)
+            except Exception as e:
+                # Usually "database is locked" under write contention, try again later
+                self.stderr.write(f"Error running pronunciation downloads: {str(e)}")
+                stats = {'claimed': 0}
+
+            if not stats['claimed']:
+                if options['once']:
+                    break
+                stop_event.wait(options['poll_interval'])
+                continue
+
+            self.stdout.write(f"Pronunciations: {stats['downloaded']} downloaded, {stats['unavailable']} unavailable, "
+                              f"{stats['failed']} failed of {stats['claimed']}")
+
+        close_old_connections()
+        self.stdout.write("Pronunciation worker stopped")
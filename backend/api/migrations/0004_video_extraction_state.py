@@ -0,0 +1,54 @@
+# Generated by Django 5.1.15 on 2026-10-17 15:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_extraction_state(apps, schema_editor):
+    """Mark videos that already have word references as extracted up to their latest subtitle
+
+    Without this every existing video would be extracted again on its next job.
+    """
+    Subtitle = apps.get_model('api', 'Subtitle')
+    WordReference = apps.get_model('api', 'WordReference')
+    VideoExtractionState = apps.get_model('api', 'VideoExtractionState')
+
+    extracted_video_ids = set(
+        WordReference.objects.values_list('subtitle__video_id', flat=True).distinct()
+    )
+    states = []
+    for video_id, last_subtitle_id, subtitle_count in (
+        Subtitle.objects.filter(video_id__in=extracted_video_ids)
+        .values('video_id')
+        .annotate(last_id=models.Max('id'), count=models.Count('id'))
+        .values_list('video_id', 'last_id', 'count')
+    ):
+        states.append(VideoExtractionState(
+            video_id=video_id,
+            last_subtitle_id=last_subtitle_id,
+            dictionary_version=1,
+            processed_subtitle_count=subtitle_count
+        ))
+    VideoExtractionState.objects.bulk_create(states, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_extraction_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VideoExtractionState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_subtitle_id', models.BigIntegerField(default=0)),
+                ('dictionary_version', models.PositiveIntegerField(default=0)),
+                ('processed_subtitle_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('video', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='extraction_state', to='api.video')),
+            ],
+        ),
+        migrations.RunPython(backfill_extraction_state, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.1.15 on 2026-10-17 16:04
+
+from django.db import migrations, models
+
+
+def backfill_surface_form(apps, schema_editor):
+    """Copy the word as written in the subtitle onto existing references"""
+    WordReference = apps.get_model('api', 'WordReference')
+
+    batch = []
+    for word_ref in WordReference.objects.select_related('subtitle').iterator(chunk_size=2000):
+        surface_form = word_ref.subtitle.text[word_ref.context_start:word_ref.context_end][:100]
+        if surface_form:
+            word_ref.surface_form = surface_form
+            batch.append(word_ref)
+        if len(batch) >= 2000:
+            WordReference.objects.bulk_update(batch, ['surface_form'])
+            batch = []
+    if batch:
+        WordReference.objects.bulk_update(batch, ['surface_form'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_video_extraction_state'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wordreference',
+            name='surface_form',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.CreateModel(
+            name='WordInflection',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('form', models.CharField(max_length=100)),
+                ('lemma', models.CharField(max_length=100)),
+                ('language', models.CharField(default='en', max_length=20)),
+                ('inflection', models.CharField(blank=True, max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'unique_together': {('form', 'language')},
+            },
+        ),
+        migrations.RunPython(backfill_surface_form, migrations.RunPython.noop),
+    ]
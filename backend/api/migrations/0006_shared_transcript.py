@@ -0,0 +1,147 @@
+# Generated by Django 5.1.15 on 2026-10-17 16:10
+
+import re
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Case, Value, When
+
+YOUTUBE_ID_PATTERN = re.compile(r'(?:v=|youtu\.be/)([0-9A-Za-z_-]{11})')
+CHUNK_SIZE = 400
+
+
+def _chunks(items, size=CHUNK_SIZE):
+    """Split a list into lists of at most size items, stays below SQLite's variable limit"""
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def set_reference_videos(apps, schema_editor):
+    """References so far got their video through the subtitle"""
+    Subtitle = apps.get_model('api', 'Subtitle')
+    WordReference = apps.get_model('api', 'WordReference')
+
+    for video_id in Subtitle.objects.values_list('video_id', flat=True).distinct():
+        WordReference.objects.filter(subtitle__video_id=video_id).update(video_id=video_id)
+
+
+def share_transcripts(apps, schema_editor):
+    """Move the subtitles of videos with the same YouTube ID into one shared transcript
+
+    Only subtitles fetched from YouTube by the server are shared. Subtitles carry no record
+    of where they came from, so videos of users who ever posted to save-subtitles (logged
+    as a 'save_subtitle' activity) keep their own subtitles, they may have been uploaded.
+
+    Only videos whose subtitles are identical (same texts and start times) are merged, the
+    first video's subtitles become the transcript and the others' references are moved to
+    them. Videos whose subtitles differ, e.g. saved from another subtitle track, keep
+    their own subtitles, as do videos with translated subtitles (see 0011, translations
+    are per user).
+    """
+    Video = apps.get_model('api', 'Video')
+    Subtitle = apps.get_model('api', 'Subtitle')
+    Transcript = apps.get_model('api', 'Transcript')
+    WordReference = apps.get_model('api', 'WordReference')
+    VideoExtractionState = apps.get_model('api', 'VideoExtractionState')
+    UserActivity = apps.get_model('api', 'UserActivity')
+
+    uploaders = set(UserActivity.objects.filter(action_type='save_subtitle').values_list('user_id', flat=True))
+    videos_by_youtube_id = defaultdict(list)
+    for video in Video.objects.filter(transcript__isnull=True).exclude(user_id__in=uploaders).order_by('id'):
+        match = YOUTUBE_ID_PATTERN.search(video.url or '')
+        if match:
+            videos_by_youtube_id[match.group(1)].append(video)
+
+    for youtube_id, videos in videos_by_youtube_id.items():
+        if Transcript.objects.filter(youtube_id=youtube_id, language='en').exists():
+            continue
+
+        canonical = None
+        canonical_ids = []
+        canonical_key = None
+        for video in videos:
+            rows = list(Subtitle.objects.filter(video=video).order_by('id').values_list('id', 'text', 'start_time'))
+            if not rows:
+                continue
+            key = [(text, start_time) for _, text, start_time in rows]
+
+            if canonical is None:
+                transcript = Transcript.objects.create(youtube_id=youtube_id, language='en', segment_count=len(rows))
+                Subtitle.objects.filter(video=video).update(transcript=transcript, video=None)
+                video.transcript = transcript
+                video.save(update_fields=['transcript'])
+                canonical, canonical_key = video, key
+                canonical_ids = [subtitle_id for subtitle_id, _, _ in rows]
+                continue
+
+            if key != canonical_key or Subtitle.objects.filter(video=video).exclude(translation='').exists():
+                continue
+
+            # Point the references at the canonical subtitles, a user word keeps one reference per subtitle
+            subtitle_map = dict(zip((subtitle_id for subtitle_id, _, _ in rows), canonical_ids))
+            references = list(WordReference.objects.filter(subtitle_id__in=subtitle_map).values_list(
+                'id', 'user_word_id', 'subtitle_id'))
+            existing = set(WordReference.objects.filter(
+                user_word_id__in={user_word_id for _, user_word_id, _ in references}, subtitle_id__in=canonical_ids
+            ).values_list('user_word_id', 'subtitle_id'))
+            duplicates = [
+                reference_id for reference_id, user_word_id, subtitle_id in references
+                if (user_word_id, subtitle_map[subtitle_id]) in existing
+            ]
+            for batch in _chunks(duplicates):
+                WordReference.objects.filter(id__in=batch).delete()
+            for batch in _chunks(list(subtitle_map.items())):
+                WordReference.objects.filter(subtitle_id__in=[old_id for old_id, _ in batch]).update(
+                    subtitle_id=Case(*(When(subtitle_id=old_id, then=Value(new_id)) for old_id, new_id in batch))
+                )
+
+            Subtitle.objects.filter(video=video).delete()
+            video.transcript = canonical.transcript
+            video.save(update_fields=['transcript'])
+            VideoExtractionState.objects.filter(video=video).update(last_subtitle_id=max(canonical_ids))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_word_inflection'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wordreference',
+            name='video',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='word_references', to='api.video'),
+        ),
+        migrations.AlterField(
+            model_name='subtitle',
+            name='video',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='subtitles', to='api.video'),
+        ),
+        migrations.CreateModel(
+            name='Transcript',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('youtube_id', models.CharField(max_length=20)),
+                ('language', models.CharField(default='en', max_length=20)),
+                ('segment_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'unique_together': {('youtube_id', 'language')},
+            },
+        ),
+        migrations.AddField(
+            model_name='subtitle',
+            name='transcript',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='subtitles', to='api.transcript'),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='transcript',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='videos', to='api.transcript'),
+        ),
+        migrations.RunPython(set_reference_videos, migrations.RunPython.noop),
+        migrations.RunPython(share_transcripts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.1.15 on 2026-10-17 16:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_shared_transcript'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='subtitle',
+            name='indexed',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='SubtitleToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=100)),
+                ('start', models.PositiveIntegerField()),
+                ('end', models.PositiveIntegerField()),
+                ('subtitle', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='index_tokens', to='api.subtitle')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['term', 'subtitle'], name='api_subtitl_term_f94532_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.1.15 on 2026-10-17 21:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+BATCH_SIZE = 500
+
+
+def copy_translations(apps, schema_editor):
+    """Copy the translations saved on subtitles to the user they belong to
+
+    A video's own subtitles belong to its user, a shared transcript's subtitles to the user
+    of the first video that got it (0006 only moves that video's subtitles into the transcript).
+    """
+    Video = apps.get_model('api', 'Video')
+    Subtitle = apps.get_model('api', 'Subtitle')
+    SubtitleTranslation = apps.get_model('api', 'SubtitleTranslation')
+
+    transcript_users = {}
+    for transcript_id, user_id in Video.objects.filter(transcript__isnull=False).order_by('-id').values_list(
+            'transcript_id', 'user_id'):
+        transcript_users[transcript_id] = user_id
+
+    translations = []
+    rows = Subtitle.objects.exclude(translation='').exclude(translation__isnull=True).values_list(
+        'id', 'translation', 'video__user_id', 'transcript_id')
+    for subtitle_id, translation, video_user_id, transcript_id in rows.iterator():
+        user_id = video_user_id or transcript_users.get(transcript_id)
+        if user_id:
+            translations.append(SubtitleTranslation(user_id=user_id, subtitle_id=subtitle_id, translation=translation))
+    SubtitleTranslation.objects.bulk_create(translations, batch_size=BATCH_SIZE, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_pronunciation_job'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubtitleTranslation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('translation', models.TextField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('subtitle', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='user_translations', to='api.subtitle')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='subtitle_translations', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'subtitle')},
+            },
+        ),
+        migrations.RunPython(copy_translations, migrations.RunPython.noop),
+    ]
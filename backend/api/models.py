@@ -4,6 +4,23 @@ from django.contrib.auth.models import User
 # Delayed import to avoid circular reference
 from django.db.models import SET_NULL
 
+class Transcript(models.Model):
+    """Subtitles of one YouTube video in one language, shared by every user's Video of it
+
+    The transcript is fetched, merged and tokenized once, its Subtitle rows (the shared
+    segments) belong to the transcript instead of a single user's video.
+    """
+    youtube_id = models.CharField(max_length=20)
+    language = models.CharField(max_length=20, default='en')
+    segment_count = models.PositiveIntegerField(default=0)  # 0 until the subtitles are stored
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        unique_together = ['youtube_id', 'language']
+    
+    def __str__(self):
+        return f"{self.youtube_id} ({self.language})"
+
 class Video(models.Model):
     """Model to store video information"""
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='videos')
@@ -15,6 +32,8 @@ class Video(models.Model):
     # Use string reference to avoid circular import
     chat_session = models.ForeignKey('api.ChatSession', on_delete=SET_NULL, 
                                     related_name='session_videos', null=True, blank=True)
+    # Shared transcript holding the subtitles, videos without one own their subtitles directly
+    transcript = models.ForeignKey(Transcript, on_delete=SET_NULL, related_name='videos', null=True, blank=True)
     
     class Meta:
         # Ensure that the same user does not have multiple video records with the same URL
@@ -25,6 +44,14 @@ class Video(models.Model):
     def __str__(self):
         return self.title or self.url
     
+    def get_subtitles(self):
+        """
+        返回视频的字幕，来自共享字幕（transcript）或视频自己的字幕
+        """
+        if self.transcript_id:
+            return Subtitle.objects.filter(transcript_id=self.transcript_id)
+        return Subtitle.objects.filter(video=self)
+    
     def has_subtitles(self):
         """
         检查视频是否有字幕
@@ -32,24 +59,72 @@ class Video(models.Model):
         - True: 如果有至少一条字幕
         - False: 如果没有字幕
         """
-        return self.subtitles.exists()
+        return self.get_subtitles().exists()
     
     def subtitles_count(self):
         """
         返回视频的字幕数量
         """
-        return self.subtitles.count()
+        return self.get_subtitles().count()
 
 class Subtitle(models.Model):
-    """Model to store subtitle segments with timestamps"""
-    video = models.ForeignKey(Video, on_delete=models.CASCADE, related_name='subtitles')
+    """Model to store subtitle segments with timestamps
+    
+    A subtitle belongs either to a shared Transcript (video is empty) or directly to a video.
+    """
+    video = models.ForeignKey(Video, on_delete=models.CASCADE, related_name='subtitles', null=True, blank=True)
+    transcript = models.ForeignKey(Transcript, on_delete=models.CASCADE, related_name='subtitles', null=True, blank=True)
     text = models.TextField()
     start_time = models.FloatField()  # Time in seconds
     end_time = models.FloatField()    # Time in seconds
     translation = models.TextField(blank=True)  # 字幕翻译，可以为空
+    indexed = models.BooleanField(default=False)  # Whether the words of the text are in SubtitleToken
     
     def __str__(self):
         return f"{self.text[:50]}..."
+    
+    def get_video_for(self, user):
+        """The user's video this subtitle is shown in, None if the user has no such video"""
+        if self.transcript_id:
+            return Video.objects.filter(user=user, transcript_id=self.transcript_id).first()
+        return self.video if self.video and self.video.user_id == user.id else None
+
+class SubtitleTranslation(models.Model):
+    """A user's translation of a subtitle
+
+    Every user of a shared Transcript sees the same Subtitle rows, so translations are
+    stored per user. Subtitle.translation only holds translations saved before this model,
+    migration 0011 copied them here.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='subtitle_translations')
+    subtitle = models.ForeignKey(Subtitle, on_delete=models.CASCADE, related_name='user_translations')
+    translation = models.TextField()
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ['user', 'subtitle']
+    
+    def __str__(self):
+        return f"{self.user.username}: {self.translation[:50]}"
+
+class SubtitleToken(models.Model):
+    """A word of a subtitle with its character offsets, see api/token_index.py
+
+    Filled once when subtitles are stored, so extraction and reference creation look
+    words up with an indexed join instead of tokenizing or scanning subtitle texts.
+    """
+    subtitle = models.ForeignKey(Subtitle, on_delete=models.CASCADE, related_name='index_tokens')
+    term = models.CharField(max_length=100)  # Lowercase word as written, not the lemma
+    start = models.PositiveIntegerField()
+    end = models.PositiveIntegerField()
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['term', 'subtitle']),
+        ]
+    
+    def __str__(self):
+        return f"{self.term} ({self.subtitle_id}:{self.start})"
 
 class Sentence(models.Model):
     """Model to store important sentences marked by users from video subtitles"""
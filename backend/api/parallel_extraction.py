@@ -0,0 +1,137 @@
+"""Parallel word extraction across a process pool
+
+Tokenizing and resolving a video is CPU bound, so extraction threads mostly wait on the
+GIL. With `python manage.py run_extraction_worker --processes N` the claimed jobs are
+spread over N processes, each loading its own tokenizer model, which run the read-only
+stages of WordExtractor.process_video (extract_video_words). Their results come back to
+the worker's main process, which writes them one job at a time with save_video_words,
+so SQLite only ever sees a single writer.
+"""
+import logging
+import multiprocessing
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import timedelta
+
+from django.db import close_old_connections, connections
+from django.utils import timezone
+
+from .extraction_queue import claim_next_job, complete_job, fail_job, get_lease_seconds, renew_lease
+from .job_models import ExtractionJob
+
+logger = logging.getLogger(__name__)
+
+
+def init_process():
+    """Pool initializer, sets up Django and loads the tokenizer model of this process"""
+    import django
+    django.setup()
+
+    from .tokenizers import get_tokenizer
+    get_tokenizer().tokenize('')
+
+
+def extract_job(job_id):
+    """Run the read-only part of a claimed job, called in a pool process
+
+    :return: Everything save_job needs to finish the job in the writer process
+    """
+    from .word_extractor import WordExtractor
+
+    close_old_connections()
+    job = ExtractionJob.objects.select_related('user', 'video').get(id=job_id)
+    extractor = WordExtractor(job.user)
+    subtitles, since_subtitle_id, full_run = extractor.get_new_subtitles(job.video, force=job.force)
+    return {
+        'subtitle_ids': [subtitle.id for subtitle in subtitles],
+        'since_subtitle_id': since_subtitle_id,
+        'full_run': full_run,
+        'extraction': extractor.extract_video_words(job.video, subtitles) if subtitles else None
+    }
+
+
+def save_job(job, payload):
+    """Write the result of extract_job and mark the job as done, called in the writer process
+
+    Nothing is written once the job's lease was lost, the worker that reclaimed it redoes the work.
+    """
+    from .word_extractor import WordExtractor
+
+    if not renew_lease(job):
+        return None
+
+    extractor = WordExtractor(job.user)
+    if payload['extraction']:
+        result = extractor.save_video_words(payload['extraction'])
+    else:
+        result = {'processed_count': 0, 'new_count': 0, 'updated_count': 0, 'stats': {}}
+
+    state = extractor.advance_watermark(job.video, payload['subtitle_ids'], payload['full_run'],
+                                        result.get('failed_subtitle_ids'))
+    result['since_subtitle_id'] = payload['since_subtitle_id']
+    result['last_subtitle_id'] = state.last_subtitle_id
+    complete_job(job, result)
+    return result
+
+
+def renew_leases(jobs):
+    """Renew the leases of running jobs once a third of the lease has passed"""
+    renew_before = timezone.now() + timedelta(seconds=get_lease_seconds() * 2 / 3)
+    for job in jobs:
+        if job.locked_until and job.locked_until < renew_before:
+            try:
+                renew_lease(job)
+            except Exception as e:
+                # Usually "database is locked" under write contention, the next poll retries
+                logger.error(f"Error renewing lease of extraction job {job.id}: {str(e)}")
+
+
+def run_pool(processes, stop_event, poll_interval=2.0, once=False):
+    """Claim jobs and run them on a pool of processes until stopped
+
+    At most one job per process is claimed at a time, so jobs that are still queued
+    stay available to other workers. On stop, the running jobs are finished first.
+    The leases of the jobs in the pool are renewed from this loop while they run.
+    """
+    # Spawned processes start clean instead of inheriting this process's database connections
+    connections.close_all()
+    pool = ProcessPoolExecutor(
+        max_workers=processes,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=init_process
+    )
+    running = {}  # future -> job
+
+    try:
+        while True:
+            while not stop_event.is_set() and len(running) < processes:
+                close_old_connections()
+                try:
+                    job = claim_next_job()
+                except Exception as e:
+                    # Usually "database is locked" under write contention, try again later
+                    logger.error(f"Error claiming extraction job: {str(e)}")
+                    job = None
+                if job is None:
+                    break
+                logger.info(f"Running extraction job {job.id} for video {job.video_id} (attempt {job.attempts})")
+                running[pool.submit(extract_job, job.id)] = job
+
+            if not running:
+                if once or stop_event.is_set():
+                    break
+                stop_event.wait(poll_interval)
+                continue
+
+            done, _ = wait(running, timeout=poll_interval, return_when=FIRST_COMPLETED)
+            renew_leases(job for future, job in running.items() if future not in done)
+            for future in done:
+                job = running.pop(future)
+                try:
+                    save_job(job, future.result())
+                except Exception as e:
+                    logger.error(f"Extraction job {job.id} failed (attempt {job.attempts}/{job.max_attempts}): {str(e)}")
+                    fail_job(job, traceback.format_exc())
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+        close_old_connections()
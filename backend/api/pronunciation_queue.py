@@ -0,0 +1,207 @@
+"""Prefetch queue for pronunciation files
+
+Extraction only checks whether a word's pronunciation file is already stored, the words
+without one are queued here and downloaded by `python manage.py run_pronunciation_worker`,
+so saving a video's words never waits on an MP3 download. Words the user looked up or
+favorited are queued with a higher priority and downloaded before the extracted ones.
+"""
+import logging
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from youdao import voice_store
+from youdao.spider import YoudaoSpider
+
+from .job_models import PronunciationJob
+from .word_models import WordDefinition
+
+logger = logging.getLogger(__name__)
+
+# Defaults, can be overridden in settings.py
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_RETRY_DELAY = 60  # Seconds before the first retry, doubled on every further retry
+DEFAULT_LEASE_SECONDS = 300  # A claimed download whose lease expires is claimed again
+DEFAULT_CONCURRENCY = 4
+DEFAULT_BATCH_SIZE = 50
+# Words per query, keeps IN (...) lists under SQLite's variable limit
+CHUNK_SIZE = 500
+NO_PRONUNCIATION = 'No pronunciation available'
+
+
+def _chunks(items):
+    items = list(items)
+    for start in range(0, len(items), CHUNK_SIZE):
+        yield items[start:start + CHUNK_SIZE]
+
+
+def enqueue_pronunciations(words, priority=PronunciationJob.PRIORITY_EXTRACTED):
+    """Queue the pronunciation download of words, returns the number of distinct words
+
+    A word has a single job. Queueing it again raises the priority of a waiting job and
+    requeues a finished one: done jobs always (their file was deleted since), failed
+    jobs only for a priority above PRIORITY_EXTRACTED, so words without a pronunciation
+    aren't retried on every extraction but are when the user asks for them.
+    """
+    words = {word for word in words if word and len(word) <= 100}
+    if not words:
+        return 0
+
+    now = timezone.now()
+    max_attempts = getattr(settings, 'PRONUNCIATION_JOB_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS)
+    requeue = Q(status=PronunciationJob.STATUS_DONE)
+    if priority > PronunciationJob.PRIORITY_EXTRACTED:
+        requeue |= Q(status=PronunciationJob.STATUS_FAILED)
+
+    for chunk in _chunks(words):
+        PronunciationJob.objects.bulk_create(
+            [PronunciationJob(word=word, priority=priority, run_after=now, max_attempts=max_attempts) for word in chunk],
+            ignore_conflicts=True
+        )
+        PronunciationJob.objects.filter(
+            word__in=chunk,
+            status__in=[PronunciationJob.STATUS_PENDING, PronunciationJob.STATUS_RUNNING],
+            priority__lt=priority
+        ).update(priority=priority)
+        PronunciationJob.objects.filter(requeue, word__in=chunk).update(
+            status=PronunciationJob.STATUS_PENDING,
+            priority=priority,
+            attempts=0,
+            max_attempts=max_attempts,
+            run_after=now,
+            locked_until=None,
+            last_error='',
+            finished_at=None
+        )
+    return len(words)
+
+
+def claim_jobs(limit):
+    """Atomically claim up to limit runnable jobs, highest priority first
+
+    Runnable jobs are pending jobs whose backoff has elapsed and running jobs whose lease
+    expired (their worker died).
+    """
+    now = timezone.now()
+    lease_seconds = getattr(settings, 'PRONUNCIATION_JOB_LEASE_SECONDS', DEFAULT_LEASE_SECONDS)
+
+    candidates = PronunciationJob.objects.filter(
+        Q(status=PronunciationJob.STATUS_PENDING, run_after__lte=now) |
+        Q(status=PronunciationJob.STATUS_RUNNING, locked_until__lte=now)
+    ).order_by('-priority', 'run_after', 'id').values_list('id', 'status', 'locked_until')[:limit]
+
+    claimed = []
+    with transaction.atomic():
+        for job_id, status, locked_until in candidates:
+            # Conditional update, only one worker can win the row
+            if PronunciationJob.objects.filter(id=job_id, status=status, locked_until=locked_until).update(
+                status=PronunciationJob.STATUS_RUNNING,
+                locked_until=now + timedelta(seconds=lease_seconds),
+                attempts=F('attempts') + 1
+            ):
+                claimed.append(job_id)
+    return list(PronunciationJob.objects.filter(id__in=claimed).order_by('-priority', 'run_after'))
+
+
+def download(job):
+    """Fetch the pronunciation of a claimed job, returns (job, file path or None, error)
+
+    A file stored in the meantime (e.g. played through the pronunciation endpoint) is used
+    as is. The path is None without an error when Youdao has no pronunciation for the word.
+    """
+    try:
+        return job, voice_store.find(job.word) or YoudaoSpider.download_voice(job.word), ''
+    except Exception:
+        return job, None, traceback.format_exc()
+
+
+def record_results(results):
+    """Store the outcome of downloaded jobs, has_audio is set with one update per chunk of words"""
+    from .lookup_service import invalidate_definitions
+
+    now = timezone.now()
+    downloaded = [job for job, path, error in results if path]
+    unavailable = [job for job, path, error in results if not path and not error]
+
+    with transaction.atomic():
+        for chunk in _chunks(downloaded):
+            PronunciationJob.objects.filter(id__in=[job.id for job in chunk]).update(
+                status=PronunciationJob.STATUS_DONE, locked_until=None, last_error='', finished_at=now
+            )
+            WordDefinition.objects.filter(
+                text__in=[job.word for job in chunk], has_audio=False
+            ).update(has_audio=True)
+        for chunk in _chunks(unavailable):
+            PronunciationJob.objects.filter(id__in=[job.id for job in chunk]).update(
+                status=PronunciationJob.STATUS_FAILED, locked_until=None, last_error=NO_PRONUNCIATION, finished_at=now
+            )
+
+    # The update doesn't send signals, cached lookup-word responses still say there is no audio
+    invalidate_definitions(job.word for job in downloaded)
+
+    for job, path, error in results:
+        if error:
+            fail_job(job, error)
+
+
+def fail_job(job, error):
+    """Schedule a retry with exponential backoff, or mark the job failed once attempts are used up"""
+    now = timezone.now()
+    logger.warning(f"Pronunciation download of '{job.word}' failed (attempt {job.attempts}/{job.max_attempts})")
+    if job.attempts >= job.max_attempts:
+        PronunciationJob.objects.filter(id=job.id).update(
+            status=PronunciationJob.STATUS_FAILED, locked_until=None, last_error=error, finished_at=now
+        )
+        return
+
+    retry_delay = getattr(settings, 'PRONUNCIATION_JOB_RETRY_DELAY', DEFAULT_RETRY_DELAY)
+    PronunciationJob.objects.filter(id=job.id).update(
+        status=PronunciationJob.STATUS_PENDING,
+        run_after=now + timedelta(seconds=retry_delay * 2 ** (job.attempts - 1)),
+        locked_until=None,
+        last_error=error
+    )
+
+
+def run_batch(batch_size=DEFAULT_BATCH_SIZE, concurrency=DEFAULT_CONCURRENCY):
+    """Claim one batch of jobs and download it on concurrency threads
+
+    :return: Number of jobs per outcome, claimed is 0 when the queue had nothing to run
+    """
+    jobs = claim_jobs(batch_size)
+    stats = {'claimed': len(jobs), 'downloaded': 0, 'unavailable': 0, 'failed': 0}
+    if not jobs:
+        return stats
+
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(jobs)))) as executor:
+        results = list(executor.map(download, jobs))
+    record_results(results)
+
+    for job, path, error in results:
+        stats['downloaded' if path else 'failed' if error else 'unavailable'] += 1
+    return stats
+
+
+def get_queue_stats():
+    """Queue depth per status, and the waiting jobs per priority"""
+    now = timezone.now()
+    stats = {
+        status: PronunciationJob.objects.filter(status=status).count()
+        for status, _ in PronunciationJob.STATUS_CHOICES
+    }
+    stats['ready'] = PronunciationJob.objects.filter(
+        status=PronunciationJob.STATUS_PENDING, run_after__lte=now
+    ).count()
+    pending = PronunciationJob.objects.filter(status=PronunciationJob.STATUS_PENDING)
+    stats['pending_by_priority'] = {
+        'favorited': pending.filter(priority__gte=PronunciationJob.PRIORITY_FAVORITED).count(),
+        'hovered': pending.filter(priority__gte=PronunciationJob.PRIORITY_HOVERED,
+                                  priority__lt=PronunciationJob.PRIORITY_FAVORITED).count(),
+        'extracted': pending.filter(priority__lt=PronunciationJob.PRIORITY_HOVERED).count(),
+    }
+    return stats
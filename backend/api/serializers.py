@@ -8,12 +8,16 @@ class SubtitleSerializer(serializers.ModelSerializer):
         fields = ['id', 'text', 'start_time', 'end_time']
 
 class VideoSerializer(serializers.ModelSerializer):
-    subtitles = SubtitleSerializer(many=True, read_only=True)
+    subtitles = serializers.SerializerMethodField()
     
     class Meta:
         model = Video
         fields = ['id', 'url', 'title', 'platform', 'created_at', 'subtitles']
         read_only_fields = ['created_at']
+    
+    def get_subtitles(self, obj):
+        # Subtitles may come from a shared transcript
+        return SubtitleSerializer(obj.get_subtitles().order_by('id'), many=True).data
 
 # SentenceSerializer has replaced SentenceReferenceSerializer, because Sentence is now directly associated with video and timestamp
 
@@ -47,7 +51,7 @@ class WordReferenceSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = WordReference
-        fields = ['id', 'user_word', 'subtitle', 'context_start', 'context_end', 
+        fields = ['id', 'user_word', 'subtitle', 'context_start', 'context_end', 'surface_form',
                  'created_at', 'word_text', 'video_title', 'video_url', 
                  'context', 'highlighted_context', 'timestamp_url']
         read_only_fields = ['created_at', 'word_text', 'video_title', 'video_url', 
@@ -57,11 +61,11 @@ class WordReferenceSerializer(serializers.ModelSerializer):
         return obj.user_word.word_definition.text if obj.user_word and obj.user_word.word_definition else ''
     
     def get_video_title(self, obj):
-        return obj.subtitle.video.title if obj.subtitle and obj.subtitle.video else ''
+        return obj.video.title if obj.video else ''
     
     def get_video_url(self, obj):
-        if obj.subtitle and obj.subtitle.video:
-            video = obj.subtitle.video
+        if obj.video:
+            video = obj.video
             if video.platform == 'youtube' and video.url:
                 return video.url
         return ''
@@ -73,8 +77,8 @@ class WordReferenceSerializer(serializers.ModelSerializer):
         return obj.get_highlighted_context()
     
     def get_timestamp_url(self, obj):
-        if obj.subtitle and obj.subtitle.video:
-            video = obj.subtitle.video
+        if obj.subtitle and obj.video:
+            video = obj.video
             if video.platform == 'youtube' and video.url:
                 time_seconds = int(obj.subtitle.start_time)
                 return f"{video.url}&t={time_seconds}s"
@@ -1,77 +1,99 @@
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
-from .models import Video, Subtitle, UserActivity
-from .word_models import UserWord
-from .word_extractor import WordExtractor
-import threading
-
-def process_video_in_background(video_id, user_id):
-    """Process video and extract words in the background"""
-    from .models import Video
-    
-    try:
-        video = Video.objects.get(id=video_id)
-        user = User.objects.get(id=user_id)
-        
-        # Initialize word extractor
-        extractor = WordExtractor(user)
-        # Process video
-        extractor.process_video(video)
-        print(f"Background processing complete: Words extracted from video {video.title}")
-    except Exception as e:
-        print(f"Error processing video: {str(e)}")
+from .models import Video, Subtitle, SubtitleToken, UserActivity
+from .word_models import UserWord, WordDefinition
+from .extraction_queue import enqueue_video_extraction
+from .known_words import invalidate_known_words
+from .lookup_service import invalidate_definitions, invalidate_user_lookups
 
 @receiver(post_save, sender=Video)
 def extract_words_after_video_save(sender, instance, created, **kwargs):
     """
-    When a video is saved, start a background thread to process subtitles and extract words
+    When a video is saved, queue a job to process subtitles and extract words
     This runs when the video is first created
     """
     if created:  # Only run when the video is first created
         # Get all subtitles for the video
-        subtitles = Subtitle.objects.filter(video=instance)
-        if subtitles.exists():
-            # Start background thread to process video
-            thread = threading.Thread(
-                target=process_video_in_background,
-                args=(instance.id, instance.user.id)
-            )
-            thread.daemon = True  # Set thread as daemon so it terminates automatically when main thread exits
-            thread.start()
-            print(f"Background task started: Processing video {instance.title} and extracting words")
+        if instance.has_subtitles():
+            # Queue video processing, picked up by the extraction worker
+            enqueue_video_extraction(instance, debounce=True)
+            print(f"Extraction job queued: Processing video {instance.title} and extracting words")
 
 
-def process_subtitle_in_background(subtitle_id, user_id):
-    """Process subtitle and extract words in the background"""
-    from django.contrib.auth.models import User
-    from .models import Subtitle
-    
-    try:
-        subtitle = Subtitle.objects.get(id=subtitle_id)
-        user = User.objects.get(id=user_id)
-        
-        # Initialize word extractor
-        extractor = WordExtractor(user)
-        # Process individual subtitle
-        extractor.extract_words_from_subtitle(subtitle)
-        print(f"Background processing complete: Words extracted from subtitle segment")
-    except Exception as e:
-        print(f"Error processing subtitle: {str(e)}")
-
 @receiver(post_save, sender=Subtitle)
 def extract_words_after_subtitle_save(sender, instance, created, **kwargs):
     """
-    When a subtitle is saved, start a background thread to process it and extract words
+    When a subtitle is saved, queue incremental extraction of its video
+    The job is debounced, so saving subtitles row by row only queues a single job
     """
     if created:  # Only run when subtitle is first created
-        # Start background thread to process subtitle
-        thread = threading.Thread(
-            target=process_subtitle_in_background,
-            args=(instance.id, instance.video.user.id)
-        )
-        thread.daemon = True  # Set thread as daemon
-        thread.start()
-        # print(f"Background task started: Processing subtitle and extracting words")
+        if instance.transcript_id:
+            # Shared transcript, every video of it gets the new subtitle
+            for video in Video.objects.filter(transcript_id=instance.transcript_id):
+                enqueue_video_extraction(video, debounce=True)
+        elif instance.video_id:
+            enqueue_video_extraction(instance.video, debounce=True)
+
+
+@receiver(pre_save, sender=Subtitle)
+def unindex_subtitle_before_text_change(sender, instance, update_fields=None, **kwargs):
+    """
+    Keep the token index in line with the subtitle text without tokenizing in the request
+    A changed text drops the subtitle's index entries and queues extraction of its videos,
+    the extraction job indexes it again. New subtitles are indexed by the job queued in
+    extract_words_after_subtitle_save, saves that don't change the text leave the index alone
+    """
+    if instance.pk is None or not instance.indexed:
+        return
+    if update_fields is not None and 'text' not in update_fields:
+        return
+    old_text = Subtitle.objects.filter(pk=instance.pk).values_list('text', flat=True).first()
+    if old_text is None or old_text == instance.text:
+        return
+    SubtitleToken.objects.filter(subtitle_id=instance.pk).delete()
+    Subtitle.objects.filter(pk=instance.pk).update(indexed=False)
+    instance.indexed = False
+    if instance.transcript_id:
+        videos = Video.objects.filter(transcript_id=instance.transcript_id)
+    else:
+        videos = Video.objects.filter(id=instance.video_id)
+    for video in videos:
+        enqueue_video_extraction(video, debounce=True)
+
+@receiver(post_save, sender=UserWord)
+def invalidate_known_words_after_save(sender, instance, created, update_fields=None, **kwargs):
+    """
+    A new user word, or one moved to another definition, changes the user's known-word set
+    """
+    if created or update_fields is None or 'word_definition' in update_fields:
+        invalidate_known_words(instance.user_id)
+
+
+@receiver(post_delete, sender=UserWord)
+def invalidate_known_words_after_delete(sender, instance, **kwargs):
+    """
+    A deleted user word leaves the user's known-word set
+    """
+    invalidate_known_words(instance.user_id)
+
+
+@receiver(post_save, sender=UserWord)
+@receiver(post_delete, sender=UserWord)
+def invalidate_user_lookups_after_change(sender, instance, **kwargs):
+    """
+    Notes, favorite flag or the word itself changed, the user's cached lookup-word overlays are stale
+    """
+    invalidate_user_lookups(instance.user_id)
+
+
+@receiver(post_save, sender=WordDefinition)
+@receiver(post_delete, sender=WordDefinition)
+def invalidate_lookups_after_definition_change(sender, instance, **kwargs):
+    """
+    Drop the cached lookup-word payload of a changed or deleted definition
+    """
+    invalidate_definitions([instance.text])
+
 
 @receiver(post_delete, sender=Video)
 def delete_orphaned_user_words(sender, instance, **kwargs):
@@ -0,0 +1,498 @@
+"""Spelling suggestions for words no dictionary has (symmetric delete, as in SymSpell)
+
+Every vocabulary word is indexed under the strings obtained by deleting up to
+SPELLING_MAX_EDIT_DISTANCE characters from its first SPELLING_PREFIX_LENGTH characters.
+A misspelled word generates the same deletes of itself, the words sharing one of them
+are the only candidates, so a suggestion costs a few dozen binary searches and an edit
+distance per candidate instead of a pass over the vocabulary.
+
+The vocabulary is the WordDefinition texts plus the headwords of the local StarDict
+dictionaries. `python manage.py build_spelling_index` builds the index offline and saves
+it to SPELLING_INDEX_PATH. The deletes are stored as CRC32 values in a sorted array next
+to an array of word positions (8 bytes per entry), a CRC collision only adds a candidate
+that the edit distance then rejects.
+
+Each process loads the file once and, every SPELLING_INDEX_REFRESH_INTERVAL seconds,
+reloads it when it was rebuilt and adds the WordDefinitions created since it was built,
+so words saved by anyone are suggested without a rebuild. Running the command again adds
+them to the file (a full rebuild only when the StarDict dictionaries changed or with --full).
+"""
+import json
+import logging
+import os
+import struct
+import sys
+import threading
+import time
+import zlib
+from array import array
+from bisect import bisect_left, bisect_right
+
+from django.conf import settings
+
+from youdao import stardict as local_dictionaries
+
+from .word_frequency import get_frequency_ranks
+from .word_models import WordDefinition
+
+logger = logging.getLogger(__name__)
+
+# Defaults, can be overridden in settings.py
+DEFAULT_MAX_EDIT_DISTANCE = 2
+DEFAULT_PREFIX_LENGTH = 7
+DEFAULT_SUGGESTIONS = 5
+DEFAULT_REFRESH_INTERVAL = 60
+
+MAX_WORD_LENGTH = 50
+# Ranks of words outside the frequency list: saved definitions before dictionary-only headwords
+UNRANKED_DEFINITION = 0xFFFFFFFE
+UNRANKED_HEADWORD = 0xFFFFFFFF
+
+FILE_MAGIC = b'SPELLIX1'
+# magic, max edit distance, prefix length, last WordDefinition id, words, entries, metadata bytes
+FILE_HEADER = struct.Struct('<8sBBQQQQ')
+
+# Process-wide counters, see get_spelling_stats
+_stats = {
+    'suggestions': 0,
+    'suggestion_seconds': 0.0,
+    'max_suggestion_seconds': 0.0,
+    'loads': 0,
+    'added_words': 0,  # WordDefinitions added in this process since the file was built
+}
+_stats_lock = threading.Lock()
+
+
+def is_indexable(word):
+    """Single lowercase words only: letters, inner hyphens and apostrophes"""
+    return (
+        0 < len(word) <= MAX_WORD_LENGTH and word.isascii() and word[0].isalpha() and
+        all(c.isalpha() or c in "-'" for c in word)
+    )
+
+
+def _crc(text):
+    return zlib.crc32(text.encode('utf-8'))
+
+
+def delete_levels(word, max_distance):
+    """Strings obtained by deleting characters of word: [{word}, one deletion, ..., max_distance deletions]"""
+    found = {word}
+    levels = [{word}]
+    for _ in range(max_distance):
+        level = {
+            candidate[:i] + candidate[i + 1:]
+            for candidate in levels[-1] if candidate
+            for i in range(len(candidate))
+        } - found
+        found |= level
+        levels.append(level)
+    return levels
+
+
+def deletes(word, max_distance):
+    """The word and every string obtained by deleting up to max_distance of its characters"""
+    return set().union(*delete_levels(word, max_distance))
+
+
+def pattern_masks(pattern):
+    """Bit mask of the positions of every character of pattern, for osa_distance"""
+    masks = {}
+    for i, char in enumerate(pattern):
+        masks[char] = masks.get(char, 0) | (1 << i)
+    return masks
+
+
+def osa_distance(pattern, masks, text, max_distance=None):
+    """Optimal string alignment distance (Damerau-Levenshtein without repeated edits of a
+    substring) between pattern and text, bit-parallel (Hyyro 2003): one pass over text
+    with a few integer operations per character instead of a len(pattern) x len(text) table
+
+    :param masks: pattern_masks(pattern), computed once per pattern
+    :param max_distance: Stop early and return a value above it once the distance is known to exceed it
+    """
+    length = len(pattern)
+    if not length:
+        return len(text)
+    full = (1 << length) - 1
+    last = 1 << (length - 1)
+    vertical_positive, vertical_negative = full, 0
+    diagonal_zero = previous_match = 0
+    score = length
+    # The score drops by at most one per remaining character of text
+    remaining = len(text)
+    for char in text:
+        match = masks.get(char, 0)
+        transposition = (((~diagonal_zero) & match) << 1) & previous_match
+        diagonal_zero = (((match & vertical_positive) + vertical_positive) ^ vertical_positive) | \
+            match | vertical_negative | transposition
+        horizontal_positive = vertical_negative | (~(diagonal_zero | vertical_positive) & full)
+        horizontal_negative = diagonal_zero & vertical_positive
+        if horizontal_positive & last:
+            score += 1
+        elif horizontal_negative & last:
+            score -= 1
+        remaining -= 1
+        if max_distance is not None and score - remaining > max_distance:
+            return score - remaining
+        horizontal_positive = ((horizontal_positive << 1) | 1) & full
+        horizontal_negative = (horizontal_negative << 1) & full
+        vertical_positive = horizontal_negative | (~(diagonal_zero | horizontal_positive) & full)
+        vertical_negative = horizontal_positive & diagonal_zero
+        previous_match = match
+    return score
+
+
+def edit_distance(source, target, max_distance):
+    """osa_distance of two words, max_distance + 1 when it exceeds max_distance"""
+    if abs(len(source) - len(target)) > max_distance:
+        return max_distance + 1
+    return min(osa_distance(source, pattern_masks(source), target, max_distance), max_distance + 1)
+
+
+def get_stardict_signature():
+    """Identifies the loaded StarDict dictionaries, a change requires a full rebuild"""
+    signature = []
+    for dictionary in local_dictionaries.get_dictionaries():
+        idx_filename = dictionary.prefix + '.idx'
+        try:
+            stat = os.stat(idx_filename if os.path.exists(idx_filename) else idx_filename + '.gz')
+            signature.append([dictionary.prefix, stat.st_size, stat.st_mtime_ns])
+        except OSError:
+            signature.append([dictionary.prefix, 0, 0])
+    return signature
+
+
+class SpellingIndex:
+    """Symmetric delete index over a vocabulary
+
+    Words are kept in a list, their frequency rank (lower first among equally close
+    suggestions) in an array. Deletes live in two parallel arrays sorted by CRC; words
+    added after the build go to a dict until the next save merges them in.
+    """
+
+    def __init__(self, max_distance=DEFAULT_MAX_EDIT_DISTANCE, prefix_length=DEFAULT_PREFIX_LENGTH):
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self.words = []
+        self.ranks = array('I')
+        self.keys = array('I')  # CRC32 of the deletes, sorted
+        self.positions = array('I')  # Position in words of the word each key was generated from
+        self.added = {}  # CRC32 -> positions, words added since the arrays were built
+        self.last_definition_id = 0
+        self.stardict_signature = []
+        self._word_positions = {}
+
+    def __len__(self):
+        return len(self.words)
+
+    def __contains__(self, word):
+        return word in self._word_positions
+
+    def _word_deletes(self, word):
+        return deletes(word[:self.prefix_length], self.max_distance)
+
+    def _append(self, word, rank):
+        """Add a word to the word list, returns its position or None if it was there already"""
+        if word in self._word_positions:
+            position = self._word_positions[word]
+            self.ranks[position] = min(self.ranks[position], rank)
+            return None
+        position = self._word_positions[word] = len(self.words)
+        self.words.append(word)
+        self.ranks.append(rank)
+        return position
+
+    def build(self, words):
+        """Index (word, rank) pairs from scratch"""
+        self.words = []
+        self.ranks = array('I')
+        self.added = {}
+        self._word_positions = {}
+        for word, rank in words:
+            self._append(word, rank)
+        self._set_entries(
+            (crc << 32) | position
+            for position, word in enumerate(self.words)
+            for crc in {_crc(delete) for delete in self._word_deletes(word)}
+        )
+
+    def _set_entries(self, entries):
+        """Replace the sorted arrays with entries packed as (crc << 32) | position"""
+        entries = sorted(entries)
+        self.keys = array('I', (entry >> 32 for entry in entries))
+        self.positions = array('I', (entry & 0xFFFFFFFF for entry in entries))
+
+    def add(self, words):
+        """Add (word, rank) pairs to a built index, returns the number of new words"""
+        count = 0
+        for word, rank in words:
+            position = self._append(word, rank)
+            if position is None:
+                continue
+            count += 1
+            for crc in {_crc(delete) for delete in self._word_deletes(word)}:
+                self.added.setdefault(crc, []).append(position)
+        return count
+
+    def compact(self):
+        """Merge the added words into the sorted arrays"""
+        if not self.added:
+            return
+        entries = [(key << 32) | position for key, position in zip(self.keys, self.positions)]
+        entries.extend((crc << 32) | position for crc, positions in self.added.items() for position in positions)
+        self._set_entries(entries)
+        self.added = {}
+
+    def _candidates(self, crc):
+        start = bisect_left(self.keys, crc)
+        end = bisect_right(self.keys, crc, start)
+        yield from self.positions[start:end]
+        yield from self.added.get(crc, ())
+
+    def suggest(self, word, limit=DEFAULT_SUGGESTIONS, max_distance=None):
+        """
+        Closest vocabulary words, nearest first, then most frequent
+        :return: List of (word, edit distance), empty when nothing is within max_distance
+        """
+        max_distance = self.max_distance if max_distance is None else min(max_distance, self.max_distance)
+        masks = pattern_masks(word)
+        seen = set()
+        found = []
+        # Suggestions per distance, once limit words are this close farther candidates are skipped
+        counts = [0] * (max_distance + 1)
+        # A word within distance k shares a delete reached with at most k deletions from the
+        # query, so the deletes are visited by level and the levels above the cutoff skipped
+        for level, level_deletes in enumerate(delete_levels(word[:self.prefix_length], max_distance)):
+            if level > max_distance:
+                break
+            for delete in level_deletes:
+                for position in self._candidates(_crc(delete)):
+                    if position in seen:
+                        continue
+                    seen.add(position)
+                    candidate = self.words[position]
+                    if candidate == word or abs(len(candidate) - len(word)) > max_distance:
+                        continue
+                    distance = osa_distance(word, masks, candidate, max_distance)
+                    if distance <= max_distance:
+                        found.append((distance, self.ranks[position], candidate))
+                        counts[distance] += 1
+                        while max_distance and sum(counts[:max_distance]) >= limit:
+                            max_distance -= 1
+        found = sorted(suggestion for suggestion in found if suggestion[0] <= max_distance)
+        return [(candidate, distance) for distance, _, candidate in found[:limit]]
+
+    def memory_usage(self):
+        """Bytes used by the index, per part"""
+        words = sys.getsizeof(self.words) + sum(sys.getsizeof(word) for word in self.words)
+        usage = {
+            'words': words,
+            'word_lookup': sys.getsizeof(self._word_positions),
+            'ranks': self.ranks.itemsize * len(self.ranks),
+            'deletes': (self.keys.itemsize * len(self.keys) + self.positions.itemsize * len(self.positions)),
+            'added': sys.getsizeof(self.added) + sum(sys.getsizeof(positions) for positions in self.added.values()),
+        }
+        usage['total'] = sum(usage.values())
+        return usage
+
+    def save(self, path):
+        """Write the index (added words merged in), through a temporary file so readers never see half of it"""
+        self.compact()
+        metadata = json.dumps({'stardict': self.stardict_signature}).encode('utf-8')
+        temp_path = '%s.%d.tmp' % (path, os.getpid())
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        try:
+            with open(temp_path, 'wb') as f:
+                f.write(FILE_HEADER.pack(
+                    FILE_MAGIC, self.max_distance, self.prefix_length, self.last_definition_id,
+                    len(self.words), len(self.keys), len(metadata)
+                ))
+                f.write(metadata)
+                self.ranks.tofile(f)
+                self.keys.tofile(f)
+                self.positions.tofile(f)
+                f.write('\n'.join(self.words).encode('utf-8'))
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    @classmethod
+    def load(cls, path):
+        """Read an index written by save, raises ValueError when the file isn't one"""
+        with open(path, 'rb') as f:
+            header = f.read(FILE_HEADER.size)
+            if len(header) != FILE_HEADER.size:
+                raise ValueError(f'{path} is not a spelling index')
+            magic, max_distance, prefix_length, last_definition_id, word_count, entry_count, metadata_size = \
+                FILE_HEADER.unpack(header)
+            if magic != FILE_MAGIC:
+                raise ValueError(f'{path} is not a spelling index')
+            index = cls(max_distance, prefix_length)
+            index.last_definition_id = last_definition_id
+            index.stardict_signature = json.loads(f.read(metadata_size).decode('utf-8'))['stardict']
+            index.ranks.fromfile(f, word_count)
+            index.keys.fromfile(f, entry_count)
+            index.positions.fromfile(f, entry_count)
+            words = f.read().decode('utf-8')
+        index.words = words.split('\n') if word_count else []
+        index._word_positions = {word: position for position, word in enumerate(index.words)}
+        return index
+
+
+def definition_words(after_id=0):
+    """(word, rank) of the WordDefinitions created after after_id, and the highest id seen"""
+    frequency_ranks = get_frequency_ranks()
+    words = []
+    last_id = after_id
+    for definition_id, text in WordDefinition.objects.filter(id__gt=after_id).values_list('id', 'text').iterator():
+        last_id = max(last_id, definition_id)
+        word = text.strip().lower()
+        if is_indexable(word):
+            words.append((word, frequency_ranks.get(word, UNRANKED_DEFINITION)))
+    return words, last_id
+
+
+def headword_words():
+    """(word, rank) of the headwords of the loaded StarDict dictionaries"""
+    frequency_ranks = get_frequency_ranks()
+    for dictionary in local_dictionaries.get_dictionaries():
+        for headword in dictionary.headwords():
+            word = headword.strip().lower()
+            if is_indexable(word):
+                yield word, frequency_ranks.get(word, UNRANKED_HEADWORD)
+
+
+def get_index_path():
+    return getattr(settings, 'SPELLING_INDEX_PATH', os.path.join(settings.BASE_DIR, 'spelling_index.bin'))
+
+
+def build_index(full=False, path=None):
+    """Build or update the index file
+
+    Without full, an existing file with the same settings and StarDict dictionaries only
+    gets the WordDefinitions created since it was built.
+
+    :return: (index, whether it was rebuilt from scratch)
+    """
+    path = path or get_index_path()
+    max_distance = getattr(settings, 'SPELLING_MAX_EDIT_DISTANCE', DEFAULT_MAX_EDIT_DISTANCE)
+    prefix_length = getattr(settings, 'SPELLING_PREFIX_LENGTH', DEFAULT_PREFIX_LENGTH)
+    signature = get_stardict_signature()
+
+    index = None
+    if not full and os.path.exists(path):
+        try:
+            index = SpellingIndex.load(path)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Rebuilding the spelling index, failed to read {path}: {str(e)}")
+        if index is not None and (index.max_distance, index.prefix_length, index.stardict_signature) != \
+                (max_distance, prefix_length, signature):
+            index = None
+
+    rebuilt = index is None
+    if rebuilt:
+        index = SpellingIndex(max_distance, prefix_length)
+        words, index.last_definition_id = definition_words()
+        index.build(words + list(headword_words()))
+        index.stardict_signature = signature
+    else:
+        words, index.last_definition_id = definition_words(index.last_definition_id)
+        index.add(words)
+    index.save(path)
+    return index, rebuilt
+
+
+_index = None
+_index_mtime = None
+_checked_at = None
+_lock = threading.Lock()
+
+
+def get_index():
+    """The index of this process, None until build_spelling_index has written the file
+
+    Reloaded when the file changes and caught up with new WordDefinitions at most every
+    SPELLING_INDEX_REFRESH_INTERVAL seconds.
+    """
+    global _index, _index_mtime, _checked_at
+    interval = getattr(settings, 'SPELLING_INDEX_REFRESH_INTERVAL', DEFAULT_REFRESH_INTERVAL)
+    now = time.monotonic()
+    if _checked_at is not None and now - _checked_at < interval:
+        return _index
+
+    with _lock:
+        if _checked_at is not None and now - _checked_at < interval:
+            return _index
+        _checked_at = now
+        path = get_index_path()
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            mtime = None
+
+        if mtime is not None and mtime != _index_mtime:
+            try:
+                _index = SpellingIndex.load(path)
+                _index_mtime = mtime
+                with _stats_lock:
+                    _stats['loads'] += 1
+                    _stats['added_words'] = 0
+            except (OSError, ValueError) as e:
+                logger.warning(f"Failed to load the spelling index {path}: {str(e)}")
+
+        if _index is not None:
+            try:
+                words, _index.last_definition_id = definition_words(_index.last_definition_id)
+                added = _index.add(words)
+                with _stats_lock:
+                    _stats['added_words'] += added
+            except Exception as e:
+                logger.warning(f"Failed to add new definitions to the spelling index: {str(e)}")
+        return _index
+
+
+def suggest(word, limit=None):
+    """Spelling suggestions for a word no dictionary has, [] when there is no index"""
+    index = get_index()
+    if index is None:
+        return []
+    start = time.perf_counter()
+    suggestions = [
+        candidate for candidate, _ in
+        index.suggest(word, limit or getattr(settings, 'SPELLING_SUGGESTIONS', DEFAULT_SUGGESTIONS))
+    ]
+    seconds = time.perf_counter() - start
+    with _stats_lock:
+        _stats['suggestions'] += 1
+        _stats['suggestion_seconds'] += seconds
+        _stats['max_suggestion_seconds'] = max(_stats['max_suggestion_seconds'], seconds)
+    return suggestions
+
+
+def get_spelling_stats():
+    """Size and memory of the index of this process, and suggestion latency"""
+    index = _index
+    with _stats_lock:
+        stats = {
+            'loaded': index is not None,
+            'path': get_index_path(),
+            'loads': _stats['loads'],
+            'added_words': _stats['added_words'],
+            'suggestions': _stats['suggestions'],
+            'avg_suggestion_ms': round(
+                _stats['suggestion_seconds'] / _stats['suggestions'] * 1000, 3
+            ) if _stats['suggestions'] else 0,
+            'max_suggestion_ms': round(_stats['max_suggestion_seconds'] * 1000, 3),
+        }
+    if index is not None:
+        stats.update({
+            'words': len(index),
+            'entries': len(index.keys) + sum(len(positions) for positions in index.added.values()),
+            'max_edit_distance': index.max_distance,
+            'prefix_length': index.prefix_length,
+            'last_definition_id': index.last_definition_id,
+            'memory_bytes': index.memory_usage(),
+        })
+    return stats
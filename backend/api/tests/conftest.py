@@ -0,0 +1,40 @@
+import pytest
+from django.contrib.auth.models import User
+
+from api.models import Subtitle, Video
+from youdao.spider import YoudaoSpider
+
+LINES = ['The harbor was quiet', 'A lighthouse blinked', 'Seagulls circled overhead']
+
+
+def youdao_result(word):
+    return {'query': word, 'errorCode': 0, 'basic': {'explains': [f'n. {word}']}}
+
+
+@pytest.fixture
+def lookups(monkeypatch, settings):
+    """Answers YoudaoSpider.get_results_many, words in lookups.failing come back as network errors"""
+    settings.WORD_TOKENIZER_ENGINE = 'regex'
+    settings.EXTRACTION_SKIP_COMMON_WORDS = 0
+
+    class Lookups:
+        failing = set()
+
+    def get_results_many(words, use_api=False, use_cache=True, concurrency=None):
+        for word in words:
+            # The spider's default result when the request fails
+            yield word, {'query': '', 'errorCode': 0} if word in Lookups.failing else youdao_result(word)
+
+    monkeypatch.setattr(YoudaoSpider, 'get_results_many', staticmethod(get_results_many))
+    monkeypatch.setattr('api.word_extractor.enqueue_pronunciations', lambda words: None)
+    return Lookups
+
+
+@pytest.fixture
+def video(db):
+    user = User.objects.create_user(username='learner')
+    video = Video.objects.create(user=user, url='https://www.youtube.com/watch?v=dQw4w9WgXcQ', title='Video')
+    Subtitle.objects.bulk_create([
+        Subtitle(video=video, text=text, start_time=index, end_time=index + 1) for index, text in enumerate(LINES)
+    ])
+    return video
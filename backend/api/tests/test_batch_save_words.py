@@ -0,0 +1,151 @@
+import pytest
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from api.models import Subtitle, Video
+from api.word_adapter import CHUNK_SIZE, batch_save_words, save_word
+from api.word_models import UserWord, WordDefinition, WordReference
+
+# Queries of a batch with existing and new definitions, user words and references,
+# whatever its size. Bulk writes are split in chunks at the database's query parameter
+# limit (142 references on SQLite), the batches below stay within one chunk.
+BATCH_QUERIES = 14
+
+
+class RolledBack(Exception):
+    pass
+
+
+def chunks(count):
+    return -(-count // CHUNK_SIZE)
+
+
+def save_one_by_one(user, words_data):
+    """The per-word path batch_save_words replaced: save_word for every item"""
+    new_word_count = updated_word_count = 0
+    results = []
+    for word_data in words_data:
+        result = save_word(user, word_data)
+        results.append(result.get('is_new'))
+        if result.get('success'):
+            if result.get('is_new', False):
+                new_word_count += 1
+            else:
+                updated_word_count += 1
+    return {
+        'saved_count': new_word_count + updated_word_count,
+        'new_word_count': new_word_count,
+        'updated_word_count': updated_word_count,
+        'results': results,
+    }
+
+
+def saved_state(user):
+    """What the user's words look like in the database"""
+    return {
+        'definitions': sorted(WordDefinition.objects.filter(text__startswith='word').values_list(
+            'text', 'translation', 'phonetic')),
+        'user_words': sorted(UserWord.objects.filter(user=user).values_list('word_definition__text', 'notes')),
+        'references': sorted(WordReference.objects.filter(user_word__user=user).values_list(
+            'user_word__word_definition__text', 'subtitle_id', 'context_start', 'context_end', 'surface_form')),
+    }
+
+
+@pytest.fixture
+def user(db):
+    return User.objects.create_user(username='learner')
+
+
+@pytest.fixture
+def subtitles(user):
+    video = Video.objects.create(user=user, url='https://www.youtube.com/watch?v=dQw4w9WgXcQ', title='Video')
+    # bulk_create, the post_save handlers are not under test
+    return Subtitle.objects.bulk_create([
+        Subtitle(video=video, text=f'Line {index}', start_time=index, end_time=index + 1)
+        for index in range(20)
+    ])
+
+
+def make_words(user, subtitles, count, repeat=1):
+    """count words, each repeated on repeat subtitles
+
+    The first quarter is already in the user's vocabulary, the second quarter only has a
+    definition without a translation, the rest is new.
+    """
+    video_id = subtitles[0].video_id
+    for index in range(count // 2):
+        word_def = WordDefinition.objects.create(text=f'word{index}', language='en')
+        if index < count // 4:
+            user_word = UserWord.objects.create(user=user, word_definition=word_def, notes='old')
+            WordReference.objects.create(user_word=user_word, subtitle=subtitles[0], video_id=video_id,
+                                         context_start=0, context_end=4)
+
+    words_data = []
+    for occurrence in range(repeat):
+        for index in range(count):
+            words_data.append({
+                'text': f'Word{index}',
+                'translation': f'translation {index}',
+                'phonetic': f'w{index}',
+                'notes': 'seen' if occurrence == 0 and index % 3 == 0 else '',
+                'reference_data': {
+                    'subtitle_id': subtitles[occurrence % len(subtitles)].id,
+                    'context_start': index,
+                    'context_end': index + 4,
+                    'surface_form': f'Word{index}',
+                    'video_id': video_id,
+                },
+            })
+    return words_data
+
+
+@pytest.mark.parametrize('count, repeat', [(10, 1), (10, 10), (25, 5)])
+def test_query_count_does_not_depend_on_batch_size(user, subtitles, count, repeat, django_assert_num_queries):
+    words_data = make_words(user, subtitles, count, repeat)
+
+    with django_assert_num_queries(BATCH_QUERIES):
+        result = batch_save_words(user, words_data)
+
+    assert result['success']
+    assert result['saved_count'] == count * repeat
+
+
+@pytest.mark.parametrize('count', [CHUNK_SIZE * 2 + 200])
+def test_queries_of_large_batches_grow_with_chunks(user, subtitles, count):
+    words_data = make_words(user, subtitles, count)
+
+    with CaptureQueriesContext(connection) as queries:
+        result = batch_save_words(user, words_data)
+
+    assert result['success']
+    assert result['new_word_count'] == count - count // 4
+    selects = [query for query in queries.captured_queries if query['sql'].startswith('SELECT')]
+    assert len(selects) == (
+        chunks(count) + chunks(count - count // 2)  # definitions, then the inserted ones
+        + chunks(count) + chunks(count - count // 4)  # user words, then the inserted ones
+        + 1 + chunks(count)  # subtitles, references
+    )
+    # Bulk writes go in batches at the database's query parameter limit, not one per word
+    assert len(queries.captured_queries) - len(selects) < count // 25
+
+
+@pytest.mark.parametrize('count, repeat', [(8, 1), (12, 3)])
+def test_matches_saving_word_by_word(user, subtitles, count, repeat):
+    words_data = make_words(user, subtitles, count, repeat)
+    # Repeated entries of the same word within the batch
+    words_data += words_data[:3]
+
+    try:
+        with transaction.atomic():
+            expected = save_one_by_one(user, words_data)
+            expected_state = saved_state(user)
+            raise RolledBack
+    except RolledBack:
+        pass
+
+    result = batch_save_words(user, words_data)
+    result['results'] = [item.get('is_new') for item in result['results']]
+
+    assert {key: result[key] for key in expected} == expected
+    assert saved_state(user) == expected_state
@@ -0,0 +1,49 @@
+from datetime import timedelta
+
+from django.utils import timezone
+
+from api.extraction_queue import claim_next_job, complete_job, enqueue_video_extraction, fail_job, renew_lease, run_job
+from api.job_models import ExtractionJob
+
+
+def expire_lease(job):
+    ExtractionJob.objects.filter(id=job.id).update(locked_until=timezone.now() - timedelta(seconds=1))
+
+
+def test_renewing_extends_the_held_lease(video, settings):
+    settings.EXTRACTION_JOB_LEASE_SECONDS = 60
+    enqueue_video_extraction(video)
+    job = claim_next_job()
+    claimed_until = job.locked_until
+
+    assert renew_lease(job)
+    assert job.locked_until > claimed_until
+    assert ExtractionJob.objects.get(id=job.id).locked_until == job.locked_until
+
+
+def test_a_reclaimed_job_drops_the_result_of_its_first_worker(video):
+    enqueue_video_extraction(video)
+    stale = claim_next_job()
+    expire_lease(stale)
+    current = claim_next_job()
+    assert current.id == stale.id and current.attempts == 2
+
+    assert not renew_lease(stale)
+    assert not complete_job(stale, {'processed_count': 1})
+    fail_job(stale, 'stale worker')
+    job = ExtractionJob.objects.get(id=stale.id)
+    assert job.status == ExtractionJob.STATUS_RUNNING
+    assert job.locked_until == current.locked_until and job.last_error == ''
+
+    assert complete_job(current, {'processed_count': 0})
+    assert ExtractionJob.objects.get(id=stale.id).status == ExtractionJob.STATUS_DONE
+
+
+def test_run_job_completes_under_its_lease(video, lookups):
+    enqueue_video_extraction(video)
+    job = claim_next_job()
+
+    assert run_job(job)
+    job = ExtractionJob.objects.get(id=job.id)
+    assert job.status == ExtractionJob.STATUS_DONE and job.locked_until is None
+    assert job.result['processed_count'] > 0
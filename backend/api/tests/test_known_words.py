@@ -0,0 +1,53 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.cache import caches
+
+from api import known_words
+from api.known_words import CACHE_ALIAS, VERSION_KEY, get_known_words, get_known_word_stats, is_known_word
+from api.word_extractor import WordExtractor
+from api.word_models import UserWord, WordDefinition
+
+
+def test_checks_use_the_process_copy_until_the_version_moves(db, monkeypatch):
+    user = User.objects.create_user(username='learner')
+    harbor, lighthouse = WordDefinition.objects.bulk_create([
+        WordDefinition(text='harbor', language='en'), WordDefinition(text='lighthouse', language='en')
+    ])
+    UserWord.objects.create(user=user, word_definition=harbor)
+    assert is_known_word(user.id, harbor.id)
+
+    cache = caches[CACHE_ALIAS]
+    read_keys = []
+    get = cache.get
+    monkeypatch.setattr(cache, 'get', lambda key, *args, **kwargs: read_keys.append(key) or get(key, *args, **kwargs))
+    local_hits = get_known_word_stats()['local_hits']
+
+    assert not is_known_word(user.id, lighthouse.id)
+    assert read_keys == [VERSION_KEY.format(user_id=user.id)]
+    assert get_known_word_stats()['local_hits'] == local_hits + 1
+
+    # Another process saved a word without this process hearing of it, only the version tells
+    UserWord.objects.bulk_create([UserWord(user=user, word_definition=lighthouse)])
+    assert not is_known_word(user.id, lighthouse.id)
+    cache.set(VERSION_KEY.format(user_id=user.id), time.time_ns(), None)
+    assert is_known_word(user.id, lighthouse.id)
+
+
+def test_the_process_copy_keeps_the_most_recently_used_sets(db, settings):
+    settings.KNOWN_WORDS_LOCAL_USERS = 2
+    users = [User.objects.create_user(username=f'learner{index}') for index in range(3)]
+    for user in users + users[:1]:
+        get_known_words(user.id)
+
+    assert list(known_words._local)[-2:] == [users[2].id, users[0].id]
+    assert users[1].id not in known_words._local
+
+
+def test_extraction_counts_the_words_the_user_has_saved(video, lookups):
+    extractor = WordExtractor(video.user)
+    first = extractor.process_video(video)
+    again = WordExtractor(video.user).process_video(video)
+
+    assert first['stats']['saved_word_count'] == 0
+    assert again['stats']['saved_word_count'] == again['stats']['known_word_count'] > 0
@@ -0,0 +1,84 @@
+import threading
+
+import pytest
+
+from api import lookup_service
+from api.lookup_service import SingleFlight
+from api.tests.conftest import youdao_result
+from youdao import cache
+from youdao import stardict
+from youdao.spider import YoudaoSpider
+
+
+@pytest.fixture
+def youdao_cache(tmp_path, monkeypatch):
+    """youdao.db in a temporary file, and no StarDict dictionaries"""
+    monkeypatch.setattr(cache, 'DB_DIR', str(tmp_path / 'youdao.db'))
+    monkeypatch.setattr(stardict, 'lookup', lambda word: None)
+    cache.close_connection()
+    cache.clear()
+    yield cache
+    cache.close_connection()
+    cache.clear()
+
+
+@pytest.fixture
+def spider_calls(lookups, monkeypatch):
+    """Words of every get_results_many call, single word requests fail the test"""
+    calls = []
+    get_results_many = YoudaoSpider.get_results_many
+
+    def counting_get_results_many(words, use_api=False, use_cache=True, concurrency=None):
+        calls.append(sorted(words))
+        return get_results_many(words, use_api, use_cache, concurrency)
+
+    def get_result(self, use_api=False, use_cache=True):
+        raise AssertionError(f"'{self.word}' was looked up on its own")
+
+    monkeypatch.setattr(YoudaoSpider, 'get_results_many', staticmethod(counting_get_results_many))
+    monkeypatch.setattr(YoudaoSpider, 'get_result', get_result)
+    return calls
+
+
+def test_spider_misses_are_looked_up_with_one_request_batch(db, youdao_cache, spider_calls):
+    youdao_cache.put('harbor', youdao_result('harbor'))
+    youdao_cache.put_miss('qwzx', 60)
+
+    payloads = lookup_service.get_shared_payloads(['harbor', 'lighthouse', 'seagulls', 'qwzx'])
+
+    assert spider_calls == [['lighthouse', 'seagulls']]
+    assert payloads['harbor']['response']['source'] == 'youdao_db'
+    assert payloads['lighthouse']['status'] == 200
+    assert payloads['lighthouse']['response']['source'] == 'youdao_spider'
+    assert payloads['qwzx']['status'] == 404
+
+    # The spider's payloads are cached like those of single lookups
+    assert lookup_service.get_shared_payloads(['seagulls', 'lighthouse']) == {
+        'seagulls': payloads['seagulls'], 'lighthouse': payloads['lighthouse']
+    }
+    assert len(spider_calls) == 1
+
+
+def test_do_many_waits_for_keys_another_caller_is_running():
+    single_flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+
+    def slow(keys):
+        started.set()
+        release.wait(5)
+        return {key: f'leader {key}' for key in keys}
+
+    leader = threading.Thread(target=single_flight.do_many, args=(['a'], slow))
+    leader.start()
+    started.wait(5)
+    threading.Timer(0.1, release.set).start()
+
+    ran = []
+    results, coalesced = single_flight.do_many(
+        ['a', 'b'], lambda keys: ran.append(keys) or {key: f'follower {key}' for key in keys}, wait=5
+    )
+    leader.join()
+
+    assert ran == [['b']]
+    assert results == {'a': 'leader a', 'b': 'follower b'}
+    assert coalesced == 1
@@ -0,0 +1,78 @@
+import pytest
+
+from api import word_extractor
+from api.job_models import ExtractionJob
+from api.models import Subtitle, SubtitleToken
+from api.tokenizers import get_tokenizer
+from api.transcript_store import attach_transcript, store_transcript
+from api.word_extractor import WordExtractor
+
+
+@pytest.fixture
+def tokenizer_calls(lookups, monkeypatch):
+    """Number of times a tokenizer was handed out"""
+    calls = []
+
+    def counting_get_tokenizer(engine=None):
+        calls.append(engine)
+        return get_tokenizer(engine)
+
+    monkeypatch.setattr(word_extractor, 'get_tokenizer', counting_get_tokenizer)
+    return calls
+
+
+def indexed_terms(subtitle):
+    return sorted(SubtitleToken.objects.filter(subtitle=subtitle).values_list('term', flat=True))
+
+
+def test_saving_a_subtitle_queues_indexing_instead_of_tokenizing(video, tokenizer_calls):
+    subtitle = Subtitle.objects.create(video=video, text='Waves crashed ashore', start_time=10, end_time=11)
+
+    assert tokenizer_calls == []
+    assert not Subtitle.objects.get(id=subtitle.id).indexed
+    assert ExtractionJob.objects.filter(video=video, status=ExtractionJob.STATUS_PENDING).exists()
+
+    WordExtractor(video.user).process_new_subtitles(video)
+
+    assert Subtitle.objects.get(id=subtitle.id).indexed
+    assert indexed_terms(subtitle) == ['ashore', 'crashed', 'waves']
+
+
+def test_stored_transcript_is_indexed_by_extraction(video, tokenizer_calls):
+    transcript, created = store_transcript('dQw4w9WgXcQ', [{'start': 0, 'end': 1, 'text': 'Shared words here'}])
+    attach_transcript(video, transcript)
+
+    assert created
+    assert tokenizer_calls == []
+    assert not SubtitleToken.objects.filter(subtitle__transcript=transcript).exists()
+
+    WordExtractor(video.user).process_new_subtitles(video)
+
+    assert indexed_terms(transcript.subtitles.get()) == ['here', 'shared', 'words']
+
+
+def test_changed_text_is_indexed_again_by_the_next_extraction(video, tokenizer_calls):
+    extractor = WordExtractor(video.user)
+    extractor.process_new_subtitles(video)
+    first, second, third = video.get_subtitles().order_by('id')
+    watermark = third.id
+    ExtractionJob.objects.all().delete()
+    tokenizer_calls.clear()
+
+    first.translation = '港口很安静'
+    first.save()
+    assert first.indexed and indexed_terms(first) == ['harbor', 'quiet', 'the', 'was']
+
+    first.text = 'The harbor was noisy'
+    first.save()
+
+    assert tokenizer_calls == []
+    assert not Subtitle.objects.get(id=first.id).indexed
+    assert indexed_terms(first) == []
+    assert ExtractionJob.objects.filter(video=video, status=ExtractionJob.STATUS_PENDING).exists()
+
+    result = extractor.process_new_subtitles(video)
+
+    assert indexed_terms(first) == ['harbor', 'noisy', 'the', 'was']
+    assert result['last_subtitle_id'] == watermark
+    assert video.user.user_words.filter(word_definition__text='noisy').exists()
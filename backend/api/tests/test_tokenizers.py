@@ -0,0 +1,48 @@
+from pathlib import Path
+
+import pytest
+
+from api.tokenizers import ENGLISH_MODEL_NAME, RegexTokenizer, SpacyTokenizer
+from api.word_extractor import WordExtractor
+
+spacy = pytest.importorskip('spacy')
+
+CORPUS = Path(__file__).parent / 'fixtures' / 'tokenizer_corpus.txt'
+
+# The English model's tokenizer is the English language defaults, a blank English
+# pipeline tokenizes the same when the model isn't installed
+MODEL_NAME = ENGLISH_MODEL_NAME if spacy.util.is_package(ENGLISH_MODEL_NAME) else 'blank:en'
+
+
+def load_corpus():
+    with open(CORPUS, encoding='utf-8') as f:
+        return [line.rstrip('\n') for line in f]
+
+
+def spans(tokens):
+    return [(text, start, start + len(text)) for text, start in tokens]
+
+
+@pytest.fixture(scope='module')
+def tokenized():
+    texts = load_corpus()
+    return texts, list(SpacyTokenizer(MODEL_NAME).pipe(texts)), list(RegexTokenizer().pipe(texts))
+
+
+def test_corpus_covers_tricky_cases():
+    text = '\n'.join(load_corpus())
+    for sample in ("can't", "'ll", "o'clock", "dogs'", "state-of-the-art", "10-15", "$3.50", "1,000,000", "p.m."):
+        assert sample in text
+
+
+def test_engines_find_the_same_tokens(tokenized):
+    texts, expected, actual = tokenized
+    for text, expected_tokens, actual_tokens in zip(texts, expected, actual):
+        assert spans(actual_tokens) == spans(expected_tokens), text
+
+
+def test_engines_find_the_same_words(tokenized):
+    texts, expected, actual = tokenized
+    extractor = WordExtractor(user=None)
+    for text, expected_tokens, actual_tokens in zip(texts, expected, actual):
+        assert extractor.find_word_positions(actual_tokens) == extractor.find_word_positions(expected_tokens), text
@@ -0,0 +1,32 @@
+from api.job_models import VideoExtractionState
+from api.word_extractor import WordExtractor
+
+
+def test_watermark_advances_past_resolved_subtitles(video, lookups):
+    result = WordExtractor(video.user).process_new_subtitles(video)
+
+    last_id = video.get_subtitles().order_by('-id').first().id
+    assert result['last_subtitle_id'] == last_id
+    assert VideoExtractionState.objects.get(video=video).last_subtitle_id == last_id
+
+
+def test_watermark_stays_below_subtitle_with_failed_lookup(video, lookups):
+    first, second, third = video.get_subtitles().order_by('id')
+    lookups.failing = {'lighthouse'}
+
+    result = WordExtractor(video.user).process_new_subtitles(video)
+
+    assert result['failed_subtitle_ids'] == [second.id]
+    assert result['stats']['failed_lookup_count'] == 1
+    assert result['last_subtitle_id'] == first.id
+
+    # The next run picks up from the failed subtitle and moves past it once the lookup works
+    lookups.failing = set()
+    subtitles, since_subtitle_id, full_run = WordExtractor(video.user).get_new_subtitles(video)
+    assert [subtitle.id for subtitle in subtitles] == [second.id, third.id]
+    assert not full_run
+
+    result = WordExtractor(video.user).process_new_subtitles(video)
+
+    assert result['last_subtitle_id'] == third.id
+    assert video.user.user_words.filter(word_definition__text='lighthouse').exists()
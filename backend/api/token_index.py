@@ -0,0 +1,123 @@
+"""Per-subtitle token index
+
+Every subtitle is tokenized once, by the extraction job queued when it is stored, and its
+words go into SubtitleToken with their character offsets. Requests never tokenize, so the
+spaCy model is only loaded by the extraction workers. Later extractions read the
+occurrences back instead of tokenizing again, and "which subtitles contain this word" is an
+indexed join on the term instead of a `text__icontains` scan over subtitle texts.
+
+Subtitles stored before the index existed are indexed the first time they are extracted,
+or all at once with `python manage.py build_token_index`. Deleting a subtitle deletes its
+tokens, saving a subtitle with a changed text drops them and queues extraction, which
+indexes it again (see api/signals.py and WordExtractor.get_new_subtitles).
+"""
+from django.db import transaction
+
+from .models import Subtitle, SubtitleToken
+
+# Subtitle IDs per IN (...) query, stays below SQLite's variable limit
+QUERY_BATCH_SIZE = 500
+MAX_TERM_LENGTH = SubtitleToken._meta.get_field('term').max_length
+
+
+def batched(items, size=QUERY_BATCH_SIZE):
+    """Split a list into lists of at most size items"""
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def tokenize_subtitles(subtitles):
+    """Index entries of subtitles, without storing them"""
+    # Imported here, the extractor itself reads the index
+    from .word_extractor import WordExtractor
+
+    extractor = WordExtractor(user=None)
+    tokens = []
+    token_lists = extractor.tokenizer.pipe(subtitle.text or '' for subtitle in subtitles)
+    for subtitle, token_list in zip(subtitles, token_lists):
+        for word_text, start, end in extractor.find_word_positions(token_list):
+            term = word_text.lower()
+            if len(term) <= MAX_TERM_LENGTH:
+                tokens.append(SubtitleToken(subtitle_id=subtitle.id, term=term, start=start, end=end))
+    return tokens
+
+
+def index_subtitles(subtitles, tokens=None):
+    """Tokenize subtitles and replace their index entries
+
+    :param subtitles: Subtitle instances, marked as indexed afterwards
+    :param tokens: Entries computed beforehand with tokenize_subtitles, e.g. in another process
+    :return: Number of stored tokens
+    """
+    subtitles = list(subtitles)
+    if not subtitles:
+        return 0
+    if tokens is None:
+        tokens = tokenize_subtitles(subtitles)
+
+    save_tokens(
+        [subtitle.id for subtitle in subtitles], tokens,
+        reindexed_ids=[subtitle.id for subtitle in subtitles if subtitle.indexed]
+    )
+    for subtitle in subtitles:
+        subtitle.indexed = True
+    return len(tokens)
+
+
+def save_tokens(subtitle_ids, tokens, reindexed_ids=()):
+    """Store index entries and mark their subtitles as indexed
+
+    :param reindexed_ids: Subtitles whose old entries are replaced
+    """
+    if not subtitle_ids:
+        return
+    with transaction.atomic():
+        for ids in batched(reindexed_ids):
+            SubtitleToken.objects.filter(subtitle_id__in=ids).delete()
+
+        # Subtitles of a shared transcript may have been indexed by another video's run meanwhile
+        already_indexed = set()
+        for ids in batched(set(subtitle_ids) - set(reindexed_ids)):
+            already_indexed.update(
+                Subtitle.objects.filter(id__in=ids, indexed=True).values_list('id', flat=True)
+            )
+        tokens = [token for token in tokens if token.subtitle_id not in already_indexed]
+
+        SubtitleToken.objects.bulk_create(tokens, batch_size=QUERY_BATCH_SIZE)
+        for ids in batched(subtitle_ids):
+            Subtitle.objects.filter(id__in=ids).update(indexed=True)
+
+
+def ensure_indexed(subtitles):
+    """Index the subtitles that are not indexed yet, returns the number of newly indexed subtitles"""
+    missing = [subtitle for subtitle in subtitles if not subtitle.indexed]
+    index_subtitles(missing)
+    return len(missing)
+
+
+def get_occurrences(subtitles, tokens=None):
+    """Indexed words of the given subtitles
+
+    :param tokens: Unsaved entries of subtitles that are not indexed yet, see tokenize_subtitles
+    :return: (term, subtitle_id, start, end, surface_form) tuples ordered by subtitle and position
+    """
+    texts = {subtitle.id: subtitle.text for subtitle in subtitles}
+    rows = [(token.term, token.subtitle_id, token.start, token.end) for token in tokens or []]
+    for ids in batched(sorted(subtitle.id for subtitle in subtitles if subtitle.indexed)):
+        rows.extend(
+            SubtitleToken.objects.filter(subtitle_id__in=ids).values_list('term', 'subtitle_id', 'start', 'end')
+        )
+    rows.sort(key=lambda row: (row[1], row[2]))
+    return [(term, subtitle_id, start, end, texts[subtitle_id][start:end]) for term, subtitle_id, start, end in rows]
+
+
+def find_term_tokens(terms, subtitles):
+    """Index entries of the given terms within a Subtitle queryset, joined on the term index"""
+    matches = []
+    for term_batch in batched(set(terms)):
+        matches.extend(
+            SubtitleToken.objects.filter(term__in=term_batch, subtitle__in=subtitles)
+            .order_by('subtitle_id', 'start')
+        )
+    return matches
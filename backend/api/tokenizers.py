@@ -0,0 +1,611 @@
+"""Tokenizer engines used by WordExtractor
+
+Extraction only needs word boundaries and character offsets, so the engine is
+pluggable. Every engine turns a text into a list of (token_text, start) pairs,
+whitespace excluded. WordExtractor.find_word_positions filters those into words.
+
+- spacy: the tokenizer of the shared spaCy English model, with all pipeline
+  components disabled
+- regex: a pure-Python port of the spaCy tokenizer algorithm with compiled
+  regexes and a lexicon of the English tokenizer exceptions. It gives the same
+  tokens and offsets without importing spaCy or loading a model.
+
+The engine is picked per deployment with the WORD_TOKENIZER_ENGINE setting.
+`python manage.py check_tokenizer_parity` compares both engines on a subtitle corpus,
+api/tests/test_tokenizers.py on the fixed corpus in api/tests/fixtures/tokenizer_corpus.txt.
+"""
+import re
+import threading
+import unicodedata
+
+from django.conf import settings
+
+# Default spaCy model used for English word extraction
+ENGLISH_MODEL_NAME = 'en_core_web_sm'
+
+# Number of subtitles handed to nlp.pipe at a time
+NLP_BATCH_SIZE = 256
+
+# Infixes added to the English defaults: split on hyphens, underscores and tildes, and
+# on apostrophes between letters that are not covered by the contraction exceptions
+CUSTOM_INFIXES = [r'''[\-_~]''', r'''(?<=[a-zA-Z])\'(?=[a-zA-Z])''']
+
+# Process-wide model registry, one loaded model per model name
+_nlp_registry = {}
+_nlp_registry_lock = threading.Lock()
+
+
+# Load English model
+def load_english_model(model_name=ENGLISH_MODEL_NAME):
+    """Load English spaCy model and configure it to not split contractions"""
+    import spacy
+
+    try:
+        # Load model
+        nlp = spacy.load(model_name)
+
+        # Define list of common contractions
+        contractions = [
+            "'s", "'ve", "'re", "'d", "'ll", "'m", "n't", "'t",
+            "ain't", "aren't", "can't", "couldn't", "didn't", "doesn't", "don't", "hadn't",
+            "hasn't", "haven't", "he's", "here's", "i'm", "isn't", "it's", "let's",
+            "mustn't", "shan't", "she's", "shouldn't", "that's", "there's", "they're",
+            "wasn't", "we're", "we've", "weren't", "what's", "where's", "who's", "won't",
+            "wouldn't", "y'all", "you're", "you've", "you'll", "you'd"
+        ]
+
+        # Custom tokenization rules to treat contractions as complete words
+        infix_re = spacy.util.compile_infix_regex(list(nlp.Defaults.infixes) + CUSTOM_INFIXES)
+        nlp.tokenizer.infix_finditer = infix_re.finditer
+
+        return nlp
+    except OSError:
+        print("Warning: English model not found. Please install it with 'python -m spacy download en_core_web_sm'")
+        raise
+
+
+def get_english_model(model_name=ENGLISH_MODEL_NAME):
+    """Get the shared English spaCy model, loading it on first use
+
+    The model is loaded at most once per process and shared by all threads,
+    so creating a WordExtractor no longer reloads it from disk.
+    """
+    nlp = _nlp_registry.get(model_name)
+    if nlp is None:
+        with _nlp_registry_lock:
+            # Check again, another thread may have loaded it while we waited
+            nlp = _nlp_registry.get(model_name)
+            if nlp is None:
+                nlp = load_english_model(model_name)
+                _nlp_registry[model_name] = nlp
+    return nlp
+
+
+class SpacyTokenizer:
+    """Tokenize with the shared spaCy model, only its tokenizer runs"""
+    name = 'spacy'
+
+    def __init__(self, model_name=ENGLISH_MODEL_NAME, batch_size=NLP_BATCH_SIZE):
+        self.model_name = model_name
+        self.batch_size = batch_size
+
+    def pipe(self, texts):
+        """Yield the tokens of every text"""
+        nlp = get_english_model(self.model_name)
+        # Extraction only uses token text and offsets, which all come from the
+        # tokenizer, so tagger/parser/NER etc. are skipped
+        docs = nlp.pipe(texts, batch_size=self.batch_size, disable=list(nlp.pipe_names))
+        for doc in docs:
+            yield [(token.text, token.idx) for token in doc if not token.is_space]
+
+    def tokenize(self, text):
+        """Tokenize one text into (token_text, start) pairs"""
+        return next(self.pipe([text]))
+
+
+# Character classes of the English tokenizer rules
+_PUNCT = r"… …… , : ; \! \? ¿ ؟ ¡ \( \) \[ \] \{ \} < > _ # \* & 。 ？ ！ ， 、 ； ： ～ · । ، ۔ ؛ ٪"
+_QUOTES = r'\' " ” “ ` ‘ ´ ’ ‚ , „ » « 「 」 『 』 （ ） 〔 〕 【 】 《 》 〈 〉 〈 〉 ⟦ ⟧'
+_CURRENCY = r"\$ £ € ¥ ฿ US\$ C\$ A\$ ₽ ﷼ ₴ ₠ ₡ ₢ ₣ ₤ ₥ ₦ ₧ ₨ ₩ ₪ ₫ € ₭ ₮ ₯ ₰ ₱ ₲ ₳ ₴ ₵ ₶ ₷ ₸ ₹ ₺ ₻ ₼ ₽ ₾ ₿"
+_HYPHENS = "- – — -- --- —— ~"
+_UNITS = (
+    "km km² km³ m m² m³ dm dm² dm³ cm cm² cm³ mm mm² mm³ ha µm nm yd in ft "
+    "kg g mg µg t lb oz m/s km/h kmh mph hPa Pa mbar mb MB kb KB gb GB tb "
+    "TB T G M K % км км² км³ м м² м³ дм дм² дм³ см см² см³ мм мм² мм³ нм "
+    "кг г мг м/с км/ч кПа Па мбар Кб КБ кб Мб МБ мб Гб ГБ гб Тб ТБ тб"
+    "كم كم² كم³ م م² م³ سم سم² سم³ مم مم² مم³ كم غرام جرام جم كغ ملغ كوب اكواب"
+)
+
+_EMOTICONS = r"""
+:) :-) :)) :-)) :))) :-))) (: (-: =) (= :] :-] [: [-: [= =] :o) (o: :} :-} 8) 8-) (-8 ;) ;-) (; (-;
+:( :-( :(( :-(( :((( :-((( ): )-: =( >:( :') :'-) :'( :'-( :/ :-/ =/ =| :| :-| ]= =[ :1 :P :-P :p :-p
+:O :-O :o :-o :0 :-0 :() >:o :* :-* :3 :-3 =3 :> :-> :X :-X :x :-x :D :-D ;D ;-D =D xD XD xDD XDD 8D 8-D
+^_^ ^__^ ^___^ >.< >.> <.< ._. ;_; -_- -__- v.v V.V v_v V_V o_o o_O O_o O_O 0_o o_0 0_0 o.O O.o O.O
+o.o 0.0 o.0 0.o @_@ <3 <33 <333 </3 (^_^) (-_-) (._.) (>_<) (*_*) (¬_¬) ಠ_ಠ ಠ︵ಠ (ಠ_ಠ) ¯\(ツ)/¯
+(╯°□°）╯︵┻━┻ ><(((*>
+"""
+
+
+def _char_class(predicate, end=0x10000):
+    """Collect the characters below end that match predicate into a regex character class body"""
+    ranges = []
+    for code in range(end):
+        if predicate(chr(code)):
+            if ranges and ranges[-1][1] == code - 1:
+                ranges[-1][1] = code
+            else:
+                ranges.append([code, code])
+    return ''.join(
+        re.escape(chr(low)) if low == high else f'{re.escape(chr(low))}-{re.escape(chr(high))}'
+        for low, high in ranges
+    )
+
+
+def _is_uncased_letter(char):
+    return char.isalpha() and not char.islower() and not char.isupper()
+
+
+def _build_affix_rules():
+    """Build the prefix, suffix and infix patterns of the English tokenizer"""
+    alpha = _char_class(str.isalpha)
+    alpha_lower = _char_class(lambda c: c.islower() or _is_uncased_letter(c))
+    alpha_upper = _char_class(lambda c: c.isupper() or _is_uncased_letter(c))
+    icons = _char_class(lambda c: unicodedata.category(c) == 'So', end=0x110000)
+
+    list_punct = _PUNCT.split(' ')
+    list_quotes = _QUOTES.split(' ')
+    list_currency = _CURRENCY.split(' ')
+    list_ellipses = [r"\.\.+", "…"]
+    list_icons = [f"[{icons}]"]
+    punct = _PUNCT.replace(' ', '|')
+    currency = _CURRENCY.replace(' ', '|')
+    hyphens = _HYPHENS.replace(' ', '|')
+    units = _UNITS.replace(' ', '|')
+    concat_quotes = _QUOTES.replace(' ', '')
+
+    prefixes = (
+        ["§", "%", "=", "—", "–", r"\+(?![0-9])"]
+        + list_punct + list_ellipses + list_quotes + list_currency + list_icons
+    )
+    suffixes = (
+        list_punct + list_ellipses + list_quotes + list_icons
+        + ["'s", "'S", "’s", "’S", "—", "–"]
+        + [
+            r"(?<=[0-9])\+",
+            r"(?<=°[FfCcKk])\.",
+            rf"(?<=[0-9])(?:{currency})",
+            rf"(?<=[0-9])(?:{units})",
+            rf"(?<=[0-9{alpha_lower}%²\-\+{punct}(?:{concat_quotes})])\.",
+            rf"(?<=[{alpha_upper}][{alpha_upper}])\.",
+        ]
+    )
+    infixes = (
+        list_ellipses + list_icons
+        + [
+            r"(?<=[0-9])[+\-\*^](?=[0-9-])",
+            rf"(?<=[{alpha_lower}{concat_quotes}])\.(?=[{alpha_upper}{concat_quotes}])",
+            rf"(?<=[{alpha}]),(?=[{alpha}])",
+            rf"(?<=[{alpha}0-9])(?:{hyphens})(?=[{alpha}])",
+            rf"(?<=[{alpha}0-9])[:<>=/](?=[{alpha}])",
+        ]
+        + CUSTOM_INFIXES
+    )
+
+    # URLs are kept as one token (host, optional scheme, port and path)
+    url_pattern = (
+        r"^"
+        r"(?:(?:[\w\+\-\.]{2,})://)?"
+        r"(?:\S+(?::\S*)?@)?"
+        r"(?:"
+        r"(?!(?:10|127)(?:\.\d{1,3}){3})"
+        r"(?!(?:169\.254|192\.168)(?:\.\d{1,3}){2})"
+        r"(?!172\.(?:1[6-9]|2\d|3[0-1])(?:\.\d{1,3}){2})"
+        r"(?:[1-9]\d?|1\d\d|2[01]\d|22[0-3])"
+        r"(?:\.(?:1?\d{1,2}|2[0-4]\d|25[0-5])){2}"
+        r"(?:\.(?:[1-9]\d?|1\d\d|2[0-4]\d|25[0-4]))"
+        r"|"
+        r"(?:"
+        r"(?:"
+        r"[A-Za-z0-9¡-￿]"
+        r"[A-Za-z0-9¡-￿_-]{0,62}"
+        r")?"
+        r"[A-Za-z0-9¡-￿]\."
+        r")+"
+        rf"(?:[{alpha_lower}]{{2,63}})"
+        r")"
+        r"(?::\d{2,5})?"
+        r"(?:[/?#]\S*)?"
+        r"$"
+    )
+
+    return (
+        re.compile('|'.join('^' + piece for piece in prefixes if piece.strip())).search,
+        re.compile('|'.join(piece + '$' for piece in suffixes if piece.strip())).search,
+        re.compile('|'.join(piece for piece in infixes if piece.strip())).finditer,
+        re.compile('(?u)' + url_pattern).match,
+    )
+
+
+def _build_special_cases():
+    """Lexicon of English tokenizer exceptions, mapping a string to the tokens it splits into
+
+    Mirrors the English exceptions of spaCy so both engines agree on contractions
+    ("don't" -> "do" + "n't"), abbreviations ("Mr.", "e.g."), times and emoticons.
+    """
+    exc = {}
+
+    # Base exceptions
+    for orth in [" ", "\t", "\\t", "\n", "\\n", "\u2014", "\u00a0", "'", '\\")', "<space>", "''", "C++"]:
+        exc[orth] = (orth,)
+    for letter in "abcdefghijklmnopqrstuvwxyzäöü":
+        exc[letter + "."] = (letter + ".",)
+    for orth in _EMOTICONS.split():
+        exc[orth] = (orth,)
+    for unit in "cfkCFK":
+        exc[f"°{unit}."] = ("°", unit, ".")
+
+    # Pronouns
+    for orth in ["i", "I"]:
+        exc[orth + "'m"] = (orth, "'m")
+        exc[orth + "m"] = (orth, "m")
+        exc[orth + "'ma"] = (orth, "'m", "a")
+        exc[orth + "ma"] = (orth, "m", "a")
+
+    for pron in ["i", "you", "he", "she", "it", "we", "they"]:
+        for orth in [pron, pron.title()]:
+            for apos in ["'", ""]:
+                exc[orth + apos + "ll"] = (orth, apos + "ll")
+                exc[orth + apos + "ll" + apos + "ve"] = (orth, apos + "ll", apos + "ve")
+                exc[orth + apos + "d"] = (orth, apos + "d")
+                exc[orth + apos + "d" + apos + "ve"] = (orth, apos + "d", apos + "ve")
+
+    for pron in ["i", "you", "we", "they"]:
+        for orth in [pron, pron.title()]:
+            exc[orth + "'ve"] = (orth, "'ve")
+            exc[orth + "ve"] = (orth, "ve")
+
+    for pron in ["you", "we", "they"]:
+        for orth in [pron, pron.title()]:
+            exc[orth + "'re"] = (orth, "'re")
+            exc[orth + "re"] = (orth, "re")
+
+    for pron in ["he", "she", "it"]:
+        for orth in [pron, pron.title()]:
+            exc[orth + "'s"] = (orth, "'s")
+            exc[orth + "s"] = (orth, "s")
+
+    # W-words, relative pronouns, prepositions etc.
+    singular = {"that", "this"}
+    plural = {"these", "those"}
+    for word in ["who", "what", "when", "where", "why", "how", "there",
+                 "that", "this", "these", "those"]:
+        for orth in [word, word.title()]:
+            for apos in ["'", ""]:
+                if word not in plural:
+                    exc[orth + apos + "s"] = (orth, apos + "s")
+                exc[orth + apos + "ll"] = (orth, apos + "ll")
+                exc[orth + apos + "ll" + apos + "ve"] = (orth, apos + "ll", apos + "ve")
+                if word not in singular:
+                    exc[orth + apos + "re"] = (orth, apos + "re")
+                    exc[orth + apos + "ve"] = (orth, apos + "ve")
+                exc[orth + apos + "d"] = (orth, apos + "d")
+                exc[orth + apos + "d" + apos + "ve"] = (orth, apos + "d", apos + "ve")
+
+    # Verbs
+    for verb in ["ca", "could", "do", "does", "did", "had", "may", "might", "must",
+                 "need", "ought", "sha", "should", "wo", "would"]:
+        for orth in [verb, verb.title()]:
+            exc[orth + "n't"] = (orth, "n't")
+            exc[orth + "nt"] = (orth, "nt")
+            exc[orth + "n't've"] = (orth, "n't", "'ve")
+            exc[orth + "ntve"] = (orth, "nt", "ve")
+
+    for verb in ["could", "might", "must", "should", "would"]:
+        for orth in [verb, verb.title()]:
+            exc[orth + "'ve"] = (orth, "'ve")
+            exc[orth + "ve"] = (orth, "ve")
+
+    for verb in ["ai", "are", "is", "was", "were", "have", "has", "dare"]:
+        for orth in [verb, verb.title()]:
+            exc[orth + "n't"] = (orth, "n't")
+            exc[orth + "nt"] = (orth, "nt")
+
+    # Other contractions with trailing apostrophe
+    for word in ["doin", "goin", "nothin", "nuthin", "ol", "somethin"]:
+        for orth in [word, word.title()]:
+            exc[orth] = (orth,)
+            exc[orth + "'"] = (orth + "'",)
+
+    # Other contractions with leading apostrophe
+    for word in ["em", "ll", "nuff"]:
+        exc[word] = (word,)
+        exc["'" + word] = ("'" + word,)
+
+    # Times
+    for hour in range(1, 12 + 1):
+        for period in ["a.m.", "am", "p.m.", "pm"]:
+            exc[f"{hour}{period}"] = (f"{hour}", period)
+
+    # Rest
+    exc.update({
+        "y'all": ("y'", "all"),
+        "yall": ("y", "all"),
+        "how'd'y": ("how", "'d", "'y"),
+        "How'd'y": ("How", "'d", "'y"),
+        "not've": ("not", "'ve"),
+        "notve": ("not", "ve"),
+        "Not've": ("Not", "'ve"),
+        "Notve": ("Not", "ve"),
+        "cannot": ("can", "not"),
+        "Cannot": ("Can", "not"),
+        "gonna": ("gon", "na"),
+        "Gonna": ("Gon", "na"),
+        "gotta": ("got", "ta"),
+        "Gotta": ("Got", "ta"),
+        "let's": ("let", "'s"),
+        "Let's": ("Let", "'s"),
+        "c'mon": ("c'm", "on"),
+        "C'mon": ("C'm", "on"),
+    })
+
+    for orth in [
+        "'S", "'s", "‘S", "‘s", "and/or", "w/o", "'re", "'Cause", "'cause", "'cos",
+        "'Cos", "'coz", "'Coz", "'cuz", "'Cuz", "'bout", "ma'am", "Ma'am", "o'clock", "O'clock",
+        "lovin'", "Lovin'", "lovin", "Lovin", "havin'", "Havin'", "havin", "Havin",
+        "doin'", "Doin'", "doin", "Doin", "goin'", "Goin'", "goin", "Goin",
+        "Mt.", "Ak.", "Ala.", "Apr.", "Ariz.", "Ark.", "Aug.", "Calif.", "Colo.", "Conn.",
+        "Dec.", "Del.", "Feb.", "Fla.", "Ga.", "Ia.", "Id.", "Ill.", "Ind.", "Jan.", "Jul.",
+        "Jun.", "Kan.", "Kans.", "Ky.", "La.", "Mar.", "Mass.", "Mich.", "Minn.", "Miss.",
+        "N.C.", "N.D.", "N.H.", "N.J.", "N.M.", "N.Y.", "Neb.", "Nebr.", "Nev.", "Nov.",
+        "Oct.", "Okla.", "Ore.", "Pa.", "S.C.", "Sep.", "Sept.", "Tenn.", "Va.", "Wash.", "Wis.",
+        "'d", "a.m.", "Adm.", "Bros.", "co.", "Co.", "Corp.", "D.C.", "Dr.", "e.g.", "E.g.",
+        "E.G.", "Gen.", "Gov.", "i.e.", "I.e.", "I.E.", "Inc.", "Jr.", "Ltd.", "Md.", "Messrs.",
+        "Mo.", "Mont.", "Mr.", "Mrs.", "Ms.", "p.m.", "Ph.D.", "Prof.", "Rep.", "Rev.", "Sen.",
+        "St.", "vs.", "v.s.",
+    ]:
+        exc[orth] = (orth,)
+
+    # Real words that would otherwise be split as contractions
+    for orth in ["Ill", "ill", "Its", "its", "Hell", "hell", "Shell", "shell", "Shed", "shed",
+                 "were", "Were", "Well", "well", "Whore", "whore"]:
+        exc.pop(orth, None)
+
+    # Typographic apostrophe variants
+    for orth, pieces in list(exc.items()):
+        if "'" in orth:
+            exc[orth.replace("'", "’")] = tuple(piece.replace("'", "’") for piece in pieces)
+
+    return exc
+
+
+_regex_rules = None
+_regex_rules_lock = threading.Lock()
+
+
+def get_regex_rules():
+    """Compiled affix rules and lexicon of the regex engine, built once per process"""
+    global _regex_rules
+    if _regex_rules is None:
+        with _regex_rules_lock:
+            if _regex_rules is None:
+                _regex_rules = _build_affix_rules() + (_build_special_cases(),)
+    return _regex_rules
+
+
+class RegexTokenizer:
+    """Pure-Python tokenizer that reproduces the spaCy English tokenizer
+
+    Text is split on whitespace, then every chunk goes through the same steps as
+    in spaCy: lexicon lookup, prefix/suffix stripping and infix splitting. Results
+    are cached per chunk, subtitles repeat most of their chunks.
+    """
+    name = 'regex'
+
+    # Chunks cached per tokenizer before the cache is reset
+    CACHE_SIZE = 100000
+
+    def __init__(self):
+        self.prefix_search, self.suffix_search, self.infix_finditer, self.url_match, \
+            self.special_cases = get_regex_rules()
+        self._cache = {}
+
+        # Lexicon entries that affix splitting breaks apart ("Dr." -> "Dr" + "."), keyed by
+        # the tokens they break into, so they can be merged back after splitting
+        self.special_patterns = {}
+        for orth in self.special_cases:
+            if any(char.isspace() for char in orth):
+                continue
+            if self._find_prefix(orth) or self._find_suffix(orth) or any(self.infix_finditer(orth)):
+                self.special_patterns[self._tokenize_chunk(orth, with_special_cases=False)] = orth
+        # Token trie of the patterns, a node holds None when a pattern ends there
+        self.pattern_trie = {}
+        for pattern in self.special_patterns:
+            node = self.pattern_trie
+            for piece in pattern:
+                node = node.setdefault(piece, {})
+            node[None] = True
+
+    def pipe(self, texts):
+        """Yield the tokens of every text"""
+        for text in texts:
+            yield self.tokenize(text)
+
+    def tokenize(self, text):
+        """Tokenize one text into (token_text, start) pairs"""
+        text = text or ''
+        tokens = []
+        for chunk_match in re.finditer(r'\S+', text):
+            chunk = chunk_match.group()
+            pieces = self._cache.get(chunk)
+            if pieces is None:
+                if len(self._cache) >= self.CACHE_SIZE:
+                    self._cache = {}
+                pieces = self._cache[chunk] = self._tokenize_chunk(chunk)
+
+            offset = chunk_match.start()
+            for piece in pieces:
+                tokens.append((piece, offset))
+                offset += len(piece)
+        return self._merge_special_cases(text, tokens)
+
+    def _tokenize_chunk(self, chunk, with_special_cases=True):
+        """Split one whitespace-free chunk into tokens"""
+        if with_special_cases:
+            special = self.special_cases.get(chunk)
+            if special:
+                return special
+
+        prefixes = []
+        suffixes = []
+        core = self._split_affixes(chunk, prefixes, suffixes, with_special_cases)
+
+        pieces = prefixes
+        if core:
+            special = self.special_cases.get(core) if with_special_cases else None
+            if special:
+                pieces.extend(special)
+            elif self.url_match(core):
+                pieces.append(core)
+            else:
+                pieces.extend(self._split_infixes(core))
+        pieces.extend(reversed(suffixes))
+        return tuple(pieces)
+
+    def _split_affixes(self, string, prefixes, suffixes, with_special_cases=True):
+        """Strip prefixes and suffixes off string until none match or a lexicon entry remains"""
+        special_cases = self.special_cases if with_special_cases else {}
+        last_size = 0
+        while string and len(string) != last_size:
+            if string in special_cases:
+                break
+            last_size = len(string)
+
+            pre_len = self._find_prefix(string)
+            if pre_len:
+                prefix = string[:pre_len]
+                minus_pre = string[pre_len:]
+                if minus_pre and minus_pre in special_cases:
+                    prefixes.append(prefix)
+                    string = minus_pre
+                    break
+
+            suf_len = self._find_suffix(string[pre_len:])
+            if suf_len:
+                suffix = string[-suf_len:]
+                minus_suf = string[:-suf_len]
+                if minus_suf and minus_suf in special_cases:
+                    suffixes.append(suffix)
+                    string = minus_suf
+                    break
+
+            if pre_len and suf_len and (pre_len + suf_len) <= len(string):
+                prefixes.append(prefix)
+                suffixes.append(suffix)
+                string = string[pre_len:-suf_len]
+            elif pre_len:
+                prefixes.append(prefix)
+                string = minus_pre
+            elif suf_len:
+                suffixes.append(suffix)
+                string = minus_suf
+        return string
+
+    def _merge_special_cases(self, text, tokens):
+        """Re-apply lexicon entries whose text was split across several tokens
+
+        Longer matches win, then the leftmost one, like the special case matcher of spaCy.
+        A match spanning whitespace is not a lexicon entry and keeps its tokens.
+        """
+        matches = []
+        trie = self.pattern_trie
+        for start, (piece, _) in enumerate(tokens):
+            node = trie.get(piece)
+            end = start + 1
+            while node is not None:
+                if None in node:
+                    matches.append((start, end))
+                if end == len(tokens):
+                    break
+                node = node.get(tokens[end][0])
+                end += 1
+        if not matches:
+            return tokens
+
+        matches.sort(key=lambda match: (match[1] - match[0], -match[0]))
+        seen = set()
+        merged = {}
+        for start, end in reversed(matches):
+            if start not in seen and end - 1 not in seen:
+                merged[start] = end
+            seen.update(range(start, end))
+
+        result = []
+        i = 0
+        while i < len(tokens):
+            end = merged.get(i)
+            if end is None:
+                result.append(tokens[i])
+                i += 1
+                continue
+
+            offset = tokens[i][1]
+            last_piece, last_offset = tokens[end - 1]
+            special = self.special_cases.get(text[offset:last_offset + len(last_piece)])
+            if special:
+                for piece in special:
+                    result.append((piece, offset))
+                    offset += len(piece)
+            else:
+                result.extend(tokens[i:end])
+            i = end
+        return result
+
+    def _find_prefix(self, string):
+        match = self.prefix_search(string)
+        return match.end() - match.start() if match else 0
+
+    def _find_suffix(self, string):
+        match = self.suffix_search(string)
+        return match.end() - match.start() if match else 0
+
+    def _split_infixes(self, string):
+        pieces = []
+        start = 0
+        for match in self.infix_finditer(string):
+            infix_start = match.start()
+            infix_end = match.end()
+            if infix_start == 0:
+                continue
+            if infix_start != start:
+                pieces.append(string[start:infix_start])
+            if infix_start != infix_end:
+                pieces.append(string[infix_start:infix_end])
+            start = infix_end
+        if string[start:]:
+            pieces.append(string[start:])
+        return pieces
+
+
+TOKENIZER_ENGINES = {
+    SpacyTokenizer.name: SpacyTokenizer,
+    RegexTokenizer.name: RegexTokenizer,
+}
+
+_tokenizer_registry = {}
+_tokenizer_registry_lock = threading.Lock()
+
+
+def get_tokenizer(engine=None):
+    """Get the shared tokenizer for an engine, WORD_TOKENIZER_ENGINE by default"""
+    engine = engine or getattr(settings, 'WORD_TOKENIZER_ENGINE', SpacyTokenizer.name)
+    tokenizer = _tokenizer_registry.get(engine)
+    if tokenizer is None:
+        if engine not in TOKENIZER_ENGINES:
+            raise ValueError(f"Unknown tokenizer engine '{engine}', "
+                             f"expected one of: {', '.join(TOKENIZER_ENGINES)}")
+        with _tokenizer_registry_lock:
+            tokenizer = _tokenizer_registry.get(engine)
+            if tokenizer is None:
+                tokenizer = TOKENIZER_ENGINES[engine]()
+                _tokenizer_registry[engine] = tokenizer
+    return tokenizer
@@ -0,0 +1,81 @@
+"""Shared transcript store
+
+The subtitles of a YouTube video are the same for every user, so they are stored once
+per (YouTube ID, language) as a Transcript and every user's Video references it. Only
+the first user to open a video fetches and merges its subtitles, later users get the
+shared transcript attached instantly. The words are indexed by the extraction job the
+caller queues (see api/token_index.py), not in the request.
+
+Only subtitles the server fetched from YouTube itself are stored as a shared transcript,
+subtitles uploaded by a client stay on the uploader's video.
+"""
+import logging
+import re
+
+from django.db import IntegrityError, transaction
+
+from .models import Transcript, Subtitle
+
+logger = logging.getLogger(__name__)
+
+YOUTUBE_ID_PATTERN = re.compile(r'^[0-9A-Za-z_-]{11}$')
+
+
+def is_youtube_id(value):
+    """Whether a value has the format of a YouTube video ID"""
+    return isinstance(value, str) and bool(YOUTUBE_ID_PATTERN.match(value))
+
+
+def get_shared_transcript(youtube_id, language='en'):
+    """The stored transcript of a YouTube video, None if nobody has stored its subtitles yet"""
+    transcript = Transcript.objects.filter(youtube_id=youtube_id, language=language).first()
+    if transcript is None or transcript.segment_count == 0:
+        return None
+    return transcript
+
+
+def attach_transcript(video, transcript):
+    """Point a user's video at a shared transcript"""
+    if video.transcript_id != transcript.id:
+        video.transcript = transcript
+        video.save(update_fields=['transcript'])
+    return video
+
+
+def store_transcript(youtube_id, segments, language='en'):
+    """Store merged segments fetched from YouTube as the shared transcript of a video
+
+    If another request stored the same transcript first, its transcript is returned and
+    the given segments are dropped, so every video keeps pointing at one set of subtitles.
+
+    :param segments: List of {'start', 'end', 'text'} dicts
+    :return: (transcript, created)
+    """
+    try:
+        with transaction.atomic():
+            transcript, _ = Transcript.objects.get_or_create(youtube_id=youtube_id, language=language)
+    except IntegrityError:
+        transcript = Transcript.objects.get(youtube_id=youtube_id, language=language)
+
+    if not segments:
+        return transcript, False
+
+    with transaction.atomic():
+        # Conditional update, only one request can fill an empty transcript
+        claimed = Transcript.objects.filter(id=transcript.id, segment_count=0).update(segment_count=len(segments))
+        if not claimed:
+            transcript.refresh_from_db()
+            return transcript, False
+
+        Subtitle.objects.bulk_create([
+            Subtitle(
+                transcript=transcript,
+                start_time=segment['start'],
+                end_time=segment['end'],
+                text=segment['text']
+            ) for segment in segments
+        ])
+
+    transcript.segment_count = len(segments)
+    logger.info(f"Stored shared transcript {youtube_id} ({language}) with {len(segments)} subtitles")
+    return transcript, True
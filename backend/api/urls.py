@@ -122,11 +122,20 @@ urlpatterns = [
     path('api/check-favorite/', web_dictionary_views.check_favorite_word, name='check_favorite_word'),
     # Word lookup API endpoint
     path('lookup-word/', word_lookup.lookup_word, name='lookup_word'),
+    path('lookup-words/', word_lookup.lookup_words, name='lookup_words'),
     path('api/get_video_subtitles/<int:video_id>/', web_dictionary_views.get_video_subtitles, name='get_video_subtitles'),
     
     # Dictionary API endpoints
     path('videos/<int:video_id>/extract-words/', views_dictionary.extract_words_from_video, name='extract_words_from_video'),
     path('extract-all-words/', views_dictionary.extract_words_from_all_videos, name='extract_all_words'),
+    path('extract-all-words/<int:batch_id>/', views_dictionary.extract_all_words_progress, name='extract_all_words_progress'),
+    path('extraction-queue/stats/', views_dictionary.extraction_queue_stats, name='extraction_queue_stats'),
+    path('pronunciation-queue/stats/', views_dictionary.pronunciation_queue_stats, name='pronunciation_queue_stats'),
+    path('known-words/stats/', views_dictionary.known_word_stats, name='known_word_stats'),
+    path('dictionary-cache/stats/', views_dictionary.dictionary_cache_stats, name='dictionary_cache_stats'),
+    path('word-lookup/stats/', views_dictionary.word_lookup_stats, name='word_lookup_stats'),
+    path('spelling-index/stats/', views_dictionary.spelling_index_stats, name='spelling_index_stats'),
+    path('vocabulary-preference/', views_dictionary.vocabulary_preference, name='vocabulary_preference'),
     path('words/<int:word_id>/', views_dictionary.update_word, name='update_word'),
     path('words/<int:word_id>/delete/', views_dictionary.delete_word, name='api_delete_word'),
     
@@ -12,12 +12,15 @@ from youtube_transcript_api import YouTubeTranscriptApi, TranscriptsDisabled, No
 import re
 import sys
 import logging
+from django.db.models import Q
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
-from .models import Video, Subtitle, Sentence, UserActivity
+from .models import Video, Subtitle, SubtitleTranslation, Sentence, UserActivity
 from .serializers import VideoSerializer, SubtitleSerializer, SentenceSerializer
+from .extraction_queue import enqueue_video_extraction
+from .transcript_store import get_shared_transcript, attach_transcript, store_transcript, is_youtube_id
 
 
 def merge_english_subtitles(subtitles, max_gap=1.0, max_duration=10.0, max_chars=200):
@@ -35,8 +38,8 @@ def merge_english_subtitles(subtitles, max_gap=1.0, max_duration=10.0, max_chars
     if not subtitles or len(subtitles) <= 1:
         return subtitles
 
-    # Lazy load spaCy model, only load when needed
-    import spacy
+    # Lazy load spaCy model, only load when needed (shared with word extraction)
+    from .word_extractor import get_english_model
     nlp = None
 
     merged_subtitles = []
@@ -67,12 +70,12 @@ def merge_english_subtitles(subtitles, max_gap=1.0, max_duration=10.0, max_chars
         if should_merge and len(current_text) > 10:
             if nlp is None:  # Lazy load spaCy model
                 try:
-                    nlp = spacy.load("en_core_web_sm")
+                    nlp = get_english_model()
                 except:
                     # If model is not installed, try to download it
                     import subprocess
                     subprocess.call([sys.executable, "-m", "spacy", "download", "en_core_web_sm"])
-                    nlp = spacy.load("en_core_web_sm")
+                    nlp = get_english_model()
 
             # Check if current text is already a complete sentence
             if current_text and current_text.strip()[-1] in ['.', '?', '!', ':', ';']:
@@ -158,8 +161,12 @@ class SubtitleViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         video_id = self.request.query_params.get('video_id')
         if video_id:
-            return Subtitle.objects.filter(video__user=self.request.user, video_id=video_id).order_by('start_time')
-        return Subtitle.objects.filter(video__user=self.request.user).order_by('start_time')
+            video = get_object_or_404(Video, user=self.request.user, id=video_id)
+            return video.get_subtitles().order_by('start_time')
+        # Own subtitles and subtitles of shared transcripts the user has a video of
+        return Subtitle.objects.filter(
+            Q(video__user=self.request.user) | Q(transcript__videos__user=self.request.user)
+        ).distinct().order_by('start_time')
 
 class SentenceViewSet(viewsets.ModelViewSet):
     """API endpoint for managing saved sentences from video subtitles"""
@@ -252,7 +259,7 @@ def fetch_subtitles(request, video_id):
         video = Video.objects.get(url=video_url, user=request.user)
 
         # Check if this video already has subtitles
-        existing_subtitles = Subtitle.objects.filter(video=video).count()
+        existing_subtitles = video.subtitles_count()
         if existing_subtitles > 0:
             # If subtitles already exist, return success without re-fetching
             logger.info(f"Video already has {existing_subtitles} subtitles")
@@ -280,6 +287,20 @@ def fetch_subtitles(request, video_id):
         )
         logger.info(f"New video created (title omitted for encoding safety)")
 
+    # Reuse the transcript if another user already fetched this video
+    transcript = get_shared_transcript(video_id)
+    if transcript:
+        attach_transcript(video, transcript)
+        logger.info(f"Attached shared transcript with {transcript.segment_count} subtitles")
+        enqueue_video_extraction(video)
+        return Response({
+            "video_id": video.id,
+            "url": video.url,
+            "title": video.title,
+            "subtitles_count": transcript.segment_count,
+            "shared": True
+        }, status=status.HTTP_200_OK)
+
     # Use youtube-transcript-api to get subtitles
     try:
         # Extract video ID from video URL
@@ -506,57 +527,15 @@ def fetch_subtitles(request, video_id):
                 merged_subtitles = filtered_subtitles
                 print(f"Subtitle merging failed, using filtered subtitles: {str(e)}")
 
-            # Only create and save merged subtitle objects
-            logger.info("Creating subtitle objects")
-            subtitle_objects = [
-                Subtitle(
-                    video=video,
-                    start_time=sub["start"],
-                    end_time=sub["end"],
-                    text=sub["text"]
-                ) for sub in merged_subtitles
-            ]
-
-            # Bulk create merged subtitles (reduce database calls)
-            logger.info(f"Bulk creating {len(subtitle_objects)} subtitle objects")
-            Subtitle.objects.bulk_create(subtitle_objects)
+            # Only save merged subtitles, as the shared transcript of this YouTube video
+            logger.info(f"Storing {len(merged_subtitles)} merged subtitles as shared transcript")
+            transcript, _ = store_transcript(youtube_id, merged_subtitles)
+            attach_transcript(video, transcript)
             logger.info("Subtitle creation complete")
 
-            # Start word extraction after bulk creating subtitles (since bulk_create doesn't trigger signals)
-            import threading
-            from .word_extractor import WordExtractor
-
-            def process_video_words(video_id, user_id):
-                try:
-                    from django.contrib.auth.models import User
-                    from .models import Video
-
-                    # Re-get video and user objects (necessary in new thread)
-                    video_obj = Video.objects.get(id=video_id)
-                    user = User.objects.get(id=user_id)
-
-                    # Initialize word extractor and process video
-                    extractor = WordExtractor(user)
-                    result = extractor.process_video(video_obj)
-
-                    # 获取详细结果
-                    processed_count = result.get('processed_count', 0)
-                    new_count = result.get('new_count', 0)
-                    updated_count = result.get('updated_count', 0)
-
-                    print(f"Word extraction has been completed. Video '{video_obj.title}' processed {processed_count} words "
-                          f"(new: {new_count}, updated: {updated_count})")
-                except Exception as e:
-                    print(f"Word extraction error: {str(e)}")
-
-            # Save current video ID for use in thread
-            video_id_for_thread = video.id
-
-            # Start background thread for word extraction
-            logger.info(f"Starting word extraction thread after saving subtitles for video ID: {video_id_for_thread}")
-            thread = threading.Thread(target=process_video_words, args=(video_id_for_thread, request.user.id))
-            thread.daemon = True
-            thread.start()
+            # Queue word extraction after bulk creating subtitles (since bulk_create doesn't trigger signals)
+            logger.info(f"Queueing word extraction after saving subtitles for video ID: {video.id}")
+            enqueue_video_extraction(video)
 
             logger.info("Fetch subtitles completed successfully")
             return Response({
@@ -595,7 +574,7 @@ def fetch_subtitles(request, video_id):
             logger.error(f"General exception in fetch_subtitles: {str(e)}")
             if video:
                 # Check if this video has any subtitles
-                if Subtitle.objects.filter(video=video).count() == 0:
+                if not video.has_subtitles():
                     video.delete()
                     logger.info(f"Deleted video without subtitles due to error: {video_id}")
             return Response({
@@ -619,9 +598,12 @@ def save_subtitles(request):
         video_id = request.data.get('video_id')
         video_title = request.data.get('video_title')  # Get video title
         subtitles_data = request.data.get('subtitles', [])
+        language = request.data.get('language') or 'en'
 
         if not video_id or not subtitles_data:
             return Response({'error': 'Missing video_id or subtitles data'}, status=status.HTTP_400_BAD_REQUEST)
+        if not is_youtube_id(video_id):
+            return Response({'error': 'Invalid YouTube video ID'}, status=status.HTTP_400_BAD_REQUEST)
 
         # Try to find a video with matching URL, or create a new one if it doesn't exist
         try:
@@ -653,12 +635,20 @@ def save_subtitles(request):
             )
 
         # Check if video already has subtitles
-        existing_subtitles_count = Subtitle.objects.filter(video=video).count()
+        existing_subtitles_count = video.subtitles_count()
         if existing_subtitles_count > 0:
             # Video already has subtitles, don't add again
             logger.info(f"Video {video_id} already has {existing_subtitles_count} subtitles, skipping save")
             return Response({'message': f'Video already has {existing_subtitles_count} subtitles, skipping save'}, status=status.HTTP_200_OK)
 
+        # The server already fetched this video's subtitles from YouTube, share them
+        transcript = get_shared_transcript(video_id, language)
+        if transcript:
+            attach_transcript(video, transcript)
+            enqueue_video_extraction(video)
+            logger.info(f"Attached shared transcript with {transcript.segment_count} subtitles to video {video_id}")
+            return Response({'message': f'Video already has {transcript.segment_count} subtitles, skipping save'}, status=status.HTTP_200_OK)
+
         # Check for duplicate subtitles
         seen_timestamps = set()
         unique_subtitles_data = []
@@ -675,56 +665,24 @@ def save_subtitles(request):
                 seen_timestamps.add(key)
                 unique_subtitles_data.append(subtitle_data)
 
-        # Create subtitles in bulk
-        subtitles = []
-        for subtitle_data in unique_subtitles_data:
-            subtitle = Subtitle(
+        # Create subtitles in bulk on this user's video only, uploaded subtitles are
+        # never shared with other users (see api/transcript_store.py)
+        subtitles = [
+            Subtitle(
                 video=video,
                 text=subtitle_data.get('text', ''),
                 start_time=subtitle_data.get('start_time', 0),
                 end_time=subtitle_data.get('end_time', 0)
-            )
-            subtitles.append(subtitle)
+            ) for subtitle_data in unique_subtitles_data
+        ]
 
         # Save all subtitles
         if subtitles:
             Subtitle.objects.bulk_create(subtitles)
 
-            # Start word extraction after bulk creating subtitles (since bulk_create doesn't trigger signals)
-            import threading
-            from .word_extractor import WordExtractor
-
-            def process_video_words(video_id, user_id):
-                try:
-                    from django.contrib.auth.models import User
-                    from .models import Video
-
-                    # Re-get video and user objects (necessary in new thread)
-                    video_obj = Video.objects.get(id=video_id)
-                    user = User.objects.get(id=user_id)
-
-                    # Initialize word extractor and process video
-                    extractor = WordExtractor(user)
-                    result = extractor.process_video(video_obj)
-
-                    # 获取详细结果
-                    processed_count = result.get('processed_count', 0)
-                    new_count = result.get('new_count', 0)
-                    updated_count = result.get('updated_count', 0)
-
-                    print(f"Word extraction has been completed. Video '{video_obj.title}' processed {processed_count} words "
-                          f"(new: {new_count}, updated: {updated_count})")
-                except Exception as e:
-                    print(f"Word extraction error: {str(e)}")
-
-            # Save current video ID for use in thread
-            video_id_for_thread = video.id
-
-            # Start background thread for word extraction
-            logger.info("Starting word extraction thread after saving subtitles")
-            thread = threading.Thread(target=process_video_words, args=(video_id_for_thread, request.user.id))
-            thread.daemon = True
-            thread.start()
+            # Queue word extraction after bulk creating subtitles (since bulk_create doesn't trigger signals)
+            logger.info("Queueing word extraction after saving subtitles")
+            enqueue_video_extraction(video)
 
         return Response({'message': f'{len(subtitles)} subtitles saved successfully'}, status=status.HTTP_201_CREATED)
 
@@ -750,8 +708,9 @@ def add_sentence(request):
     # Get subtitle
     try:
         subtitle = Subtitle.objects.get(id=subtitle_id)
-        # Ensure subtitle belongs to current user
-        if subtitle.video.user != request.user:
+        # Ensure subtitle belongs to one of the current user's videos
+        video = subtitle.get_video_for(request.user)
+        if video is None:
             return Response({
                 'error': 'Subtitle does not belong to this user'
             }, status=status.HTTP_403_FORBIDDEN)
@@ -777,7 +736,7 @@ def add_sentence(request):
                     text=text,
                     defaults={
                         'translation': translation,
-                        'video': subtitle.video,
+                        'video': video,
                         'start_time': subtitle.start_time,
                         'end_time': subtitle.end_time
                     }
@@ -785,11 +744,11 @@ def add_sentence(request):
 
                 # If existing sentence needs update
                 if not created and (sentence.translation != translation or
-                                    sentence.video != subtitle.video or
+                                    sentence.video != video or
                                     sentence.start_time != subtitle.start_time or
                                     sentence.end_time != subtitle.end_time):
                     sentence.translation = translation
-                    sentence.video = subtitle.video
+                    sentence.video = video
                     sentence.start_time = subtitle.start_time
                     sentence.end_time = subtitle.end_time
                     sentence.save()
@@ -835,8 +794,7 @@ def mark_subtitle(request, video_id):
         video = get_object_or_404(Video, url=video_url, user=request.user)
 
         # Find subtitle that contains the current time
-        subtitle = Subtitle.objects.filter(
-            video=video,
+        subtitle = video.get_subtitles().filter(
             start_time__lte=current_time,
             end_time__gte=current_time
         ).first()
@@ -972,21 +930,21 @@ def get_subtitle_translations(request):
                 # Return empty results if no video found
                 return Response({'results': []}, status=status.HTTP_200_OK)
 
-        # Get all subtitles with translations for this video
-        subtitles = Subtitle.objects.filter(
-            video=video,
-            translation__isnull=False  # Only get subtitles that have translations
-        ).exclude(translation='')
+        # Get the user's translations of this video's subtitles, its own or a shared transcript's
+        translations = SubtitleTranslation.objects.filter(
+            user=request.user, subtitle__in=video.get_subtitles()
+        ).exclude(translation='').select_related('subtitle').order_by('subtitle__start_time')
+        pairs = [(item.subtitle, item.translation) for item in translations]
 
-        logger.info(f"Found {subtitles.count()} subtitles with translations for video: {video.title}")
+        logger.info(f"Found {len(pairs)} subtitles with translations for video: {video.title}")
 
         # Format the response
         results = [{
             'text': subtitle.text,
-            'translation': subtitle.translation,
+            'translation': translation,
             'start_time': subtitle.start_time,
             'end_time': subtitle.end_time
-        } for subtitle in subtitles]
+        } for subtitle, translation in pairs]
 
         return Response({'results': results}, status=status.HTTP_200_OK)
 
@@ -1120,8 +1078,8 @@ def update_subtitle_translation(request):
     """
     Update translation for a subtitle.
 
-    This endpoint receives a subtitle ID and its translation,
-    then updates the subtitle record with the translation text.
+    This endpoint receives a subtitle ID and its translation, then saves it as the
+    user's own translation of the subtitle (SubtitleTranslation).
 
     Request body should contain:
     - subtitle_id: ID of the subtitle to update
@@ -1149,14 +1107,16 @@ def update_subtitle_translation(request):
             subtitle = Subtitle.objects.get(id=subtitle_id)
 
             # Check if user has permission to update this subtitle
-            if subtitle.video.user != request.user:
+            video = subtitle.get_video_for(request.user)
+            if video is None:
                 return Response({
                     'error': 'You do not have permission to update this subtitle'
                 }, status=status.HTTP_403_FORBIDDEN)
 
-            # Update the translation
-            subtitle.translation = translation
-            subtitle.save()
+            # Update the user's translation, subtitles of a shared transcript keep one per user
+            SubtitleTranslation.objects.update_or_create(
+                user=request.user, subtitle=subtitle, defaults={'translation': translation}
+            )
 
             # Log activity
             try:
@@ -1165,8 +1125,8 @@ def update_subtitle_translation(request):
                     action_type='translate_subtitle',
                     details={
                         'subtitle_id': subtitle_id,
-                        'video_id': subtitle.video.url.split('v=')[1] if 'v=' in subtitle.video.url else '',
-                        'video_title': subtitle.video.title
+                        'video_id': video.url.split('v=')[1] if 'v=' in video.url else '',
+                        'video_title': video.title
                     }
                 )
             except Exception as e:
@@ -1179,7 +1139,7 @@ def update_subtitle_translation(request):
                 'subtitle': {
                     'id': subtitle.id,
                     'text': subtitle.text,
-                    'translation': subtitle.translation,
+                    'translation': translation,
                     'start_time': subtitle.start_time,
                     'end_time': subtitle.end_time
                 }
@@ -1,11 +1,19 @@
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
 from rest_framework import status
 from django.shortcuts import get_object_or_404
+from youdao import cache as youdao_cache
 from .models import Video
-from .word_models import UserWord, WordReference
+from .word_models import UserWord, WordReference, VocabularyPreference
 from .word_extractor import WordExtractor
+from .extraction_queue import get_queue_stats, enqueue_all_videos
+from .pronunciation_queue import get_queue_stats as get_pronunciation_queue_stats
+from .job_models import ExtractionBatch
+from .known_words import get_known_word_stats
+from .lookup_service import get_lookup_stats
+from .spelling_index import get_spelling_stats
+from .word_frequency import get_frequency_ranks, get_skip_common_words
 from .word_adapter import update_word as update_user_word, delete_word as delete_user_word
 
 
@@ -15,28 +23,23 @@ def extract_words_from_video(request, video_id):
     """Extract all words from a specific video and add them to the user's dictionary"""
     try:
         video = get_object_or_404(Video, id=video_id, user=request.user)
-        language = request.data.get('language', 'en')
         
-        # Create word extractor and process video
-        extractor = WordExtractor(request.user, language)
+        # Extraction is English only, WordExtractor fixes the language
+        extractor = WordExtractor(request.user)
         
-        # If request requires reprocessing, delete old words first
+        # Only subtitles added since the last extraction are processed, unless reprocessing is forced
         force_reprocess = request.data.get('force_reprocess', False)
-        if force_reprocess:
-            # This functionality needs to be reimplemented in WordExtractor
-            pass
-        
-        word_count = extractor.process_video(video)
-        
-        # Count words in video subtitles
-        # Note: This logic needs to change because we no longer use WordReference
-        # This is just a simplified return of the processing result
-        unique_words = word_count  # Simplified processing, should actually be obtained through other means
+        result = extractor.process_new_subtitles(video, force=bool(force_reprocess))
         
         return Response({
             'success': True,
-            'message': f'Successfully extracted {word_count} word occurrences from video',
-            'unique_words': unique_words,
+            'message': f"Successfully extracted {result['processed_count']} word occurrences from video",
+            'processed_count': result['processed_count'],
+            'new_words': result['new_count'],
+            'updated_words': result['updated_count'],
+            'unique_words': result['new_count'] + result['updated_count'],
+            'since_subtitle_id': result['since_subtitle_id'],
+            'last_subtitle_id': result['last_subtitle_id'],
             'video_id': video.id,
             'video_title': video.title
         }, status=status.HTTP_200_OK)
@@ -51,24 +54,21 @@ def extract_words_from_video(request, video_id):
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def extract_words_from_all_videos(request):
-    """Extract words from all of the user's videos and add them to the dictionary"""
+    """Queue word extraction of all of the user's videos, returns a handle to follow the progress
+
+    The videos are extracted in the background by the extraction worker, poll
+    extract-all-words/<batch_id>/ for the progress.
+    """
     try:
-        language = request.data.get('language', 'en')
         force_reprocess = request.data.get('force_reprocess', False)
-        
-        # Create word extractor and process all videos
-        extractor = WordExtractor(request.user, language)
-        word_count = extractor.process_all_videos(force_reprocess)
-        
-        # Get user's word statistics
-        total_unique_words = UserWord.objects.filter(user=request.user).count()
-        
+        batch = enqueue_all_videos(request.user, force=bool(force_reprocess))
+
         return Response({
             'success': True,
-            'message': f'Successfully processed all videos',
-            'unique_words': total_unique_words,
-            'total_occurrences': word_count,
-        }, status=status.HTTP_200_OK)
+            'message': f'Queued word extraction for {batch.job_count} videos',
+            'batch_id': batch.id,
+            'progress': batch.get_progress(),
+        }, status=status.HTTP_202_ACCEPTED)
         
     except Exception as e:
         return Response({
@@ -77,6 +77,50 @@ def extract_words_from_all_videos(request):
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def extract_all_words_progress(request, batch_id):
+    """Progress of an extract-all-words request"""
+    batch = get_object_or_404(ExtractionBatch, id=batch_id, user=request.user)
+    progress = batch.get_progress()
+    response = {
+        'success': True,
+        'batch_id': batch.id,
+        'progress': progress,
+    }
+    if progress['state'] == 'done':
+        response['unique_words'] = UserWord.objects.filter(user=request.user).count()
+    return Response(response, status=status.HTTP_200_OK)
+
+
+@api_view(['GET', 'PUT'])
+@permission_classes([IsAuthenticated])
+def vocabulary_preference(request):
+    """Get or set how many of the most frequent English words extraction skips for the user
+    
+    PUT {"skip_common_words": N} applies to extractions from then on, null restores the
+    site default. Already extracted references are kept.
+    """
+    if request.method == 'PUT':
+        skip = request.data.get('skip_common_words')
+        if skip is not None:
+            try:
+                skip = int(skip)
+            except (TypeError, ValueError):
+                skip = -1
+            if skip < 0:
+                return Response({
+                    'success': False,
+                    'message': 'skip_common_words must be a non-negative integer or null'
+                }, status=status.HTTP_400_BAD_REQUEST)
+        VocabularyPreference.objects.update_or_create(user=request.user, defaults={'skip_common_words': skip})
+    
+    return Response({
+        'success': True,
+        'skip_common_words': get_skip_common_words(request.user),
+        'frequency_list_size': len(get_frequency_ranks())
+    }, status=status.HTTP_200_OK)
+
 @api_view(['DELETE'])
 @permission_classes([IsAuthenticated])
 def delete_word(request, word_id):
@@ -147,3 +191,63 @@ def update_word(request, word_id):
             'success': False,
             'message': f'Error updating word: {str(e)}'
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def extraction_queue_stats(request):
+    """Queue depth and wait/run latency of background word extraction jobs"""
+    return Response({
+        'success': True,
+        'stats': get_queue_stats()
+    }, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def pronunciation_queue_stats(request):
+    """Depth of the pronunciation prefetch queue, per status and per priority"""
+    return Response({
+        'success': True,
+        'stats': get_pronunciation_queue_stats()
+    }, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def known_word_stats(request):
+    """Hit rate of the per-user known-word sets and the queries they saved, for this process"""
+    return Response({
+        'success': True,
+        'stats': get_known_word_stats()
+    }, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def word_lookup_stats(request):
+    """Latency and hit rate of each lookup-word tier and the coalesced requests, for this process"""
+    return Response({
+        'success': True,
+        'stats': get_lookup_stats()
+    }, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def spelling_index_stats(request):
+    """Size, memory usage and suggestion latency of the spelling index, for this process"""
+    return Response({
+        'success': True,
+        'stats': get_spelling_stats()
+    }, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def dictionary_cache_stats(request):
+    """Hit rate of the in-process Youdao cache (youdao/cache.py), for this process"""
+    return Response({
+        'success': True,
+        'stats': youdao_cache.get_stats()
+    }, status=status.HTTP_200_OK)
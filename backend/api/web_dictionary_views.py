@@ -6,12 +6,14 @@ from django.contrib import messages
 from django.http import JsonResponse, HttpResponse, Http404
 
 import os
+from django.conf import settings
 from youdao.spider import YoudaoSpider
-from youdao.config import VOICE_DIR
+from youdao import voice_store
 from .word_models import WordDefinition, UserWord, WordReference
-from .models import Video, Subtitle
+from .models import Video
 from .word_adapter import get_user_words, delete_word, update_word, toggle_favorite, delete_all_words as adapter_delete_all_words, get_word_detail, check_word_favorite
 from .word_extractor import WordExtractor
+from .file_serving import serve_file
 
 @method_decorator(login_required, name='dispatch')
 class DictionaryView(ListView):
@@ -202,7 +204,7 @@ class WordDetailView(DetailView):
                         # Find word references
                         word_references = WordReference.objects.filter(
                             user_word=user_word
-                        ).select_related('subtitle', 'subtitle__video').order_by('-created_at')
+                        ).select_related('subtitle', 'video').order_by('-created_at')
                         
                         if word_references.exists():
                             # Extract video ID from URL
@@ -210,7 +212,9 @@ class WordDetailView(DetailView):
                             normalized_references = []
                             
                             for ref in word_references:
-                                video = ref.subtitle.video
+                                video = ref.video
+                                if video is None:
+                                    continue
                                 video_url = video.url
                                 # Extract video ID from URL
                                 if 'youtube.com' in video_url or 'youtu.be' in video_url:
@@ -316,12 +320,11 @@ class WordPronunciationView(APIView):
             
         try:
             # Check if the pronunciation file already exists
-            voice_file_path = os.path.join(VOICE_DIR, text + '.mp3')
-            if not os.path.isfile(voice_file_path):
-                print(f"Pronunciation file does not exist, trying to download: {voice_file_path}")
+            voice_file_path = voice_store.find(text)
+            if not voice_file_path:
+                print(f"Pronunciation file does not exist, trying to download: {text}")
                 # Explicitly specify download pronunciation
-                spider = YoudaoSpider(text)
-                voice_file_path = spider.get_voice(text, download=True)
+                voice_file_path = YoudaoSpider.get_voice(text, download=True)
                 print(f"Download result: {voice_file_path}")
                 
                 # If successfully downloaded and word exists, update word's has_audio flag
@@ -329,34 +332,27 @@ class WordPronunciationView(APIView):
                     word.has_audio = True
                     word.save()
                     print(f"Updating word '{text}' has_audio flag")
-            else:
-                print(f"Pronunciation file already exists: {voice_file_path}")
             
-            # If pronunciation file exists, provide it to the user
+            # If pronunciation file exists, provide it to the user (streamed, or sent by nginx
+            # when PRONUNCIATION_ACCEL_REDIRECT_PREFIX is set) with long-lived caching headers
             if voice_file_path and os.path.isfile(voice_file_path):
-                print(f"Providing pronunciation file: {voice_file_path}")
-                with open(voice_file_path, 'rb') as f:
-                    # Read audio file content
-                    audio_data = f.read()
-                    
-                    # Create response object
-                    response = HttpResponse(audio_data, content_type='audio/mpeg')
-                    
-                    # Add necessary response headers, allow cross-origin access
-                    response['Access-Control-Allow-Origin'] = '*'
-                    response['Access-Control-Allow-Methods'] = 'GET, OPTIONS'
-                    response['Access-Control-Allow-Headers'] = 'Origin, Content-Type, Accept, Authorization'
-                    response['Content-Disposition'] = f'inline; filename="{text}.mp3"'
-                    
-                    # Tell the browser this is not a download file but can be played directly
-                    response['X-Content-Type-Options'] = 'nosniff'
-                    
-                    # Record return size
-                    print(f"Returning audio file size: {len(audio_data)} bytes")
-                    
-                    return response
+                response = serve_file(
+                    request, voice_file_path, 'audio/mpeg', filename=f"{text}.mp3",
+                    accel_prefix=settings.PRONUNCIATION_ACCEL_REDIRECT_PREFIX,
+                    accel_path=voice_store.relative_path(text)
+                )
+                
+                # Add necessary response headers, allow cross-origin access
+                response['Access-Control-Allow-Origin'] = '*'
+                response['Access-Control-Allow-Methods'] = 'GET, OPTIONS'
+                response['Access-Control-Allow-Headers'] = 'Origin, Content-Type, Accept, Authorization, Range'
+                
+                # Tell the browser this is not a download file but can be played directly
+                response['X-Content-Type-Options'] = 'nosniff'
+                
+                return response
             else:
-                print(f"Pronunciation file does not exist: {voice_file_path}")
+                print(f"Pronunciation file does not exist: {text}")
                 raise Http404("Word pronunciation does not exist")
                 
         except Exception as e:
@@ -534,20 +530,13 @@ def check_favorite_word(request):
         return JsonResponse({'status': 'error', 'message': 'Missing required parameters'}, status=400)
     
     try:
-        # Build word information for adapter
-        word_info = {}
-        if word_id:
-            word_info['id'] = word_id
-        elif word_text:
-            word_info['text'] = word_text.lower()
-        
         # Use adapter to check word favorite status
-        result = check_word_favorite(user, word_info)
+        result = check_word_favorite(user, word_id=word_id, word_text=word_text.lower() if word_text else None)
         
         return JsonResponse({
             'status': 'success',
-            'is_favorite': result['is_favorite'],
-            'word_id': result['word_id']
+            'is_favorite': result.get('is_favorite', False),
+            'word_id': result.get('word_id')
         })
         
     except Exception as e:
@@ -605,12 +594,8 @@ def extract_words_view(request, video_id=None):
                 # Process single video
                 video = get_object_or_404(Video, id=video_id, user=request.user)
                 
-                if force_reprocess:
-                    # Delete existing word associations
-                    subtitles = Subtitle.objects.filter(video=video)
-                    # Use new model, delete user words associated with these subtitles
-                    # Note: due to new model architecture, words and subtitles are not directly linked, this operation may need to be moved to WordExtractor
-                word_count = extractor.process_video(video)
+                # Only subtitles added since the last extraction are processed, unless reprocessing is forced
+                word_count = extractor.process_new_subtitles(video, force=force_reprocess)
                 messages.success(request, f'Successfully extracted words from video {video.title}!')
                 return redirect('video_detail', pk=video_id)
             else:
@@ -746,7 +731,7 @@ def get_video_subtitles(request, pk=None, video_id=None):
             }, status=400) 
         
         # Get all subtitles for this video
-        subtitles = Subtitle.objects.filter(video=video).order_by('start_time')
+        subtitles = video.get_subtitles().order_by('start_time')
         
         # Format subtitle data as JSON
         subtitles_data = [{
@@ -6,12 +6,15 @@ from django.views.generic import ListView, DetailView
 from django.utils.decorators import method_decorator
 from django.http import HttpResponse
 from django.db.models import Count
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
 import re
 import csv
-import threading
-from .models import Video, Subtitle
-from .word_models import UserWord
+from .models import Video
+from .extraction_queue import enqueue_video_extraction, needs_extraction
+
+# Own subtitles plus the subtitles of the shared transcript
+SUBTITLE_COUNT = Count('subtitles') + Coalesce('transcript__segment_count', 0)
 
 
 def login_view(request):
@@ -85,7 +88,7 @@ class DashboardView(ListView):
     def get_queryset(self):
         # No longer return all videos, we will handle it in get_context_data
         return Video.objects.filter(user=self.request.user) \
-                           .annotate(subtitle_count=Count('subtitles')) \
+                           .annotate(subtitle_count=SUBTITLE_COUNT) \
                            .order_by('-created_at')
     
     def get_context_data(self, **kwargs):
@@ -93,7 +96,7 @@ class DashboardView(ListView):
         
         # Obtain all videos
         all_videos = Video.objects.filter(user=self.request.user) \
-                               .annotate(subtitle_count=Count('subtitles')) \
+                               .annotate(subtitle_count=SUBTITLE_COUNT) \
                                .order_by('-created_at')
         
         # Separate videos with and without subtitles
@@ -136,16 +139,11 @@ class VideoDetailView(DetailView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         video = self.get_object()
-        context['subtitles'] = Subtitle.objects.filter(video=video).order_by('start_time')
+        context['subtitles'] = video.get_subtitles().order_by('start_time')
         context['video'].youtube_id = extract_youtube_id(video.url)
         
-        # Check if the video has already processed words
-        has_processed_words = UserWord.objects.filter(
-            references__subtitle__video=video
-        ).exists()
-        
-        # Only start background word extraction if words haven't been processed
-        if context['subtitles'].exists() and not has_processed_words:
+        # Only start background word extraction if there are subtitles above the extraction watermark
+        if needs_extraction(video):
             self.start_background_word_extraction(video)
         
         # Get user's authentication token and pass it to the frontend for API calls
@@ -157,38 +155,15 @@ class VideoDetailView(DetailView):
         return context
     
     def start_background_word_extraction(self, video):
-        """Start word extraction in the background"""
-        def process_video_words(video_id, user_id):
-            try:
-                from django.contrib.auth.models import User
-                from .models import Video
-                from .word_extractor import WordExtractor
-                
-                # Re-get video and user objects (necessary in new thread)
-                video = Video.objects.get(id=video_id)
-                user = User.objects.get(id=user_id)
-                
-                # Initialize word extractor and process video
-                extractor = WordExtractor(user)
-                count = extractor.process_video(video)
-                print(f"Word extraction completed: Extracted {count} words from video '{video.title}'")
-            except Exception as e:
-                print(f"Word extraction error: {str(e)}")
-        
-        # Start new thread
-        thread = threading.Thread(
-            target=process_video_words,
-            args=(video.id, video.user.id)
-        )
-        thread.daemon = True
-        thread.start()
+        """Queue word extraction, it runs in the extraction worker"""
+        enqueue_video_extraction(video)
 
 
 @login_required
 def download_subtitles(request, pk):
     """Download video subtitles as CSV file"""
     video = get_object_or_404(Video, pk=pk, user=request.user)
-    subtitles = Subtitle.objects.filter(video=video).order_by('start_time')
+    subtitles = video.get_subtitles().order_by('start_time')
     
     # Create CSV file
     response = HttpResponse(content_type='text/csv')
@@ -1,5 +1,10 @@
 from django.db import transaction
 from .word_models import WordDefinition, UserWord
+from .lemmatizer import find_definition
+from .known_words import invalidate_known_words, is_known_word
+from .lookup_service import invalidate_definitions, invalidate_user_lookups
+from .job_models import PronunciationJob
+from .pronunciation_queue import enqueue_pronunciations
 import hashlib
 
 def get_user_words(user, search_query=None, sort_by='newest', favorites_only=False, paginate=None):
@@ -190,6 +195,8 @@ def save_word(user, word_data):
                 subtitle_id = reference_data.get('subtitle_id')
                 context_start = reference_data.get('context_start')
                 context_end = reference_data.get('context_end')
+                surface_form = reference_data.get('surface_form', '')
+                video_id = reference_data.get('video_id')
                 
                 # If necessary reference data provided, create reference
                 if subtitle_id is not None and context_start is not None and context_end is not None:
@@ -200,6 +207,9 @@ def save_word(user, word_data):
                         # Find the subtitle
                         try:
                             subtitle = Subtitle.objects.get(id=subtitle_id)
+                            if video_id is None:
+                                video = subtitle.get_video_for(user)
+                                video_id = video.id if video else None
                             
                             # Create reference if it doesn't exist
                             word_ref, created = WordReference.objects.get_or_create(
@@ -207,13 +217,18 @@ def save_word(user, word_data):
                                 subtitle=subtitle,
                                 defaults={
                                     'context_start': context_start,
-                                    'context_end': context_end
+                                    'context_end': context_end,
+                                    'surface_form': surface_form,
+                                    'video_id': video_id
                                 }
                             )
                             
                             # If reference already exists but context positions have changed, update them
                             if not created:
                                 update_ref_fields = []
+                                if surface_form and word_ref.surface_form != surface_form:
+                                    word_ref.surface_form = surface_form
+                                    update_ref_fields.append('surface_form')
                                 if word_ref.context_start != context_start:
                                     word_ref.context_start = context_start
                                     update_ref_fields.append('context_start')
@@ -316,8 +331,10 @@ def toggle_favorite(user, word_id=None, word_text=None):
         # If not found by ID, try to find by text
         if not user_word and word_text:
             try:
-                # Find word definition by text
-                word_def = WordDefinition.objects.get(text__iexact=word_text.strip().lower())
+                # Find word definition by text, inflected forms are stored under their lemma
+                word_def = find_definition(word_text)
+                if word_def is None:
+                    raise WordDefinition.DoesNotExist
                 
                 # Find user word
                 user_word = UserWord.objects.get(user=user, word_definition=word_def)
@@ -333,6 +350,10 @@ def toggle_favorite(user, word_id=None, word_text=None):
         user_word.is_favorite = not user_word.is_favorite
         user_word.save(update_fields=['is_favorite'])
         
+        # Favorited words are downloaded before every other queued pronunciation
+        if user_word.is_favorite and not user_word.word_definition.has_audio:
+            enqueue_pronunciations([user_word.word_definition.text], PronunciationJob.PRIORITY_FAVORITED)
+        
         # Return result
         return {
             'success': True,
@@ -401,8 +422,14 @@ def check_word_favorite(user, word_id=None, word_text=None):
         # If not found by ID, try to find by text
         if not user_word and word_text:
             try:
-                # Find word definition by text
-                word_def = WordDefinition.objects.get(text__iexact=word_text.strip().lower())
+                # Find word definition by text, inflected forms are stored under their lemma
+                word_def = find_definition(word_text)
+                if word_def is None:
+                    raise WordDefinition.DoesNotExist
+                
+                # Words missing from the user's known-word set need no query
+                if is_known_word(user.id, word_def.id) is False:
+                    raise UserWord.DoesNotExist
                 
                 # Find user word
                 user_word = UserWord.objects.get(user=user, word_definition=word_def)
@@ -609,18 +636,18 @@ def get_word_detail(user, word_id):
         from .models import Subtitle, Video
         
         refs = WordReference.objects.filter(user_word=user_word) \
-            .select_related('subtitle', 'subtitle__video') \
+            .select_related('subtitle', 'video') \
             .order_by('-created_at')
         
         # Format references for output
         references = []
         for ref in refs:
-            if ref.subtitle and ref.subtitle.video:
+            if ref.subtitle and ref.video:
                 references.append({
                     'id': ref.id,
                     'text': ref.subtitle.text,
-                    'video_title': ref.subtitle.video.title,
-                    'video_url': ref.subtitle.video.url,
+                    'video_title': ref.video.title,
+                    'video_url': ref.video.url,
                     'start_time': ref.subtitle.start_time,
                     'end_time': ref.subtitle.end_time,
                     'created_at': ref.created_at
@@ -651,36 +678,246 @@ def get_word_detail(user, word_id):
         return {'success': False, 'message': f'Error getting word details: {str(e)}'}
 
 
+# Definition fields that batch saves fill in when the stored value is empty
+DEFINITION_FILL_FIELDS = ['translation', 'uk_phonetic', 'us_phonetic', 'phonetic', 'has_audio', 'web_translation']
+# Values per IN (...) lookup of a batch save, stays below SQLite's query parameter limit
+CHUNK_SIZE = 500
+# save_word's result for an item without text
+EMPTY_TEXT_RESULT = {'success': False, 'message': 'Word text cannot be empty'}
+
+
+def _chunks(items):
+    items = list(items)
+    for start in range(0, len(items), CHUNK_SIZE):
+        yield items[start:start + CHUNK_SIZE]
+
+
 @transaction.atomic
 def batch_save_words(user, words_data):
     """Batch save words
     
+    Set-based equivalent of calling save_word for every item: definitions, user words
+    and references are pre-fetched in bulk, missing rows are inserted with
+    bulk_create(ignore_conflicts=True) and empty definition fields are filled with a
+    single bulk_update. The number of queries only grows with the number of
+    CHUNK_SIZE chunks of the lookups, not with every word.
+    
     Args:
         user: User object
         words_data: List of word data to save, each element contains word information
     
     Returns:
-        dict: Dictionary containing operation results
+        dict: Dictionary containing operation results, results holds the save_word
+        result of every item in input order
     """
+    from django.utils import timezone
+    from .models import Subtitle
+    from .word_models import WordReference
+    
     try:
         if not isinstance(words_data, list):
             return {'success': False, 'message': 'words_data must be a list'}
         
-        results = []
-        new_word_count = 0  # 新添加的单词计数
-        updated_word_count = 0  # 更新了引用的已有单词计数
-        processed_count = 0  # 总处理单词计数（新添加+更新引用）
+        now = timezone.now()
         
+        # 1. Normalize entries and merge the values of repeated words, in input order
+        entries = []  # (key, reference) per item, key is None for items without text
+        merged_fields = {}  # key -> first non-empty value of each definition field
+        merged_notes = {}  # key -> list of notes to append
         for word_data in words_data:
-            result = save_word(user, word_data)
-            results.append(result)
-            if result.get('success'):
-                processed_count += 1
-                # 判断是新添加的单词还是更新了引用的已有单词
-                if result.get('is_new', False):
-                    new_word_count += 1
-                else:
-                    updated_word_count += 1
+            text = word_data.get('text', '').lower().strip()
+            if not text:
+                entries.append((None, None))
+                continue
+            key = (text, word_data.get('language', 'en'))
+            
+            fields = merged_fields.setdefault(key, {})
+            for field in DEFINITION_FILL_FIELDS:
+                value = word_data.get(field, False if field == 'has_audio' else '')
+                if value and not fields.get(field):
+                    fields[field] = value
+            
+            notes = word_data.get('notes', '')
+            if notes:
+                merged_notes.setdefault(key, []).append(notes)
+            
+            reference = None
+            reference_data = word_data.get('reference_data', None)
+            if reference_data and isinstance(reference_data, dict):
+                subtitle_id = reference_data.get('subtitle_id')
+                context_start = reference_data.get('context_start')
+                context_end = reference_data.get('context_end')
+                if subtitle_id is not None and context_start is not None and context_end is not None:
+                    reference = (subtitle_id, context_start, context_end,
+                                 reference_data.get('surface_form', ''), reference_data.get('video_id'))
+            
+            entries.append((key, reference))
+        
+        if not merged_fields:
+            return {
+                'success': True,
+                'message': '成功处理 0 个单词（新增: 0, 更新引用: 0）',
+                'total': len(words_data),
+                'saved_count': 0,
+                'new_word_count': 0,
+                'updated_word_count': 0,
+                'results': [EMPTY_TEXT_RESULT for _ in entries]
+            }
+        
+        texts = {text for text, _ in merged_fields}
+        languages = {language for _, language in merged_fields}
+        
+        # 2. Word definitions: fetch existing, insert missing, fill empty fields
+        definitions = {
+            (word_def.text, word_def.language): word_def
+            for chunk in _chunks(texts)
+            for word_def in WordDefinition.objects.filter(text__in=chunk, language__in=languages)
+            if (word_def.text, word_def.language) in merged_fields
+        }
+        existing_def_keys = set(definitions)
+        
+        missing_defs = [
+            WordDefinition(text=text, language=language, **merged_fields[(text, language)])
+            for text, language in merged_fields
+            if (text, language) not in definitions
+        ]
+        if missing_defs:
+            WordDefinition.objects.bulk_create(missing_defs, ignore_conflicts=True)
+            # SQLite doesn't return primary keys when conflicts are ignored, fetch them back
+            definitions.update({
+                (word_def.text, word_def.language): word_def
+                for chunk in _chunks({word_def.text for word_def in missing_defs})
+                for word_def in WordDefinition.objects.filter(text__in=chunk, language__in=languages)
+                if (word_def.text, word_def.language) in merged_fields
+            })
+        
+        changed_defs = []
+        changed_def_fields = set()
+        for key in existing_def_keys:
+            word_def = definitions[key]
+            changed = False
+            for field, value in merged_fields[key].items():
+                if not getattr(word_def, field) and value:
+                    setattr(word_def, field, value)
+                    changed_def_fields.add(field)
+                    changed = True
+            if changed:
+                word_def.last_updated = now
+                changed_defs.append(word_def)
+        if changed_defs:
+            WordDefinition.objects.bulk_update(changed_defs, list(changed_def_fields) + ['last_updated'])
+        
+        # 3. User words: fetch existing, insert missing, append notes and touch last_seen_at
+        def_ids = {word_def.id: key for key, word_def in definitions.items()}
+        user_words = {
+            def_ids[user_word.word_definition_id]: user_word
+            for chunk in _chunks(def_ids)
+            for user_word in UserWord.objects.filter(user=user, word_definition_id__in=chunk)
+        }
+        existing_user_word_keys = set(user_words)
+        
+        missing_user_words = [
+            UserWord(user=user, word_definition=word_def, notes='\n'.join(merged_notes.get(key, [])))
+            for key, word_def in definitions.items()
+            if key not in user_words
+        ]
+        if missing_user_words:
+            UserWord.objects.bulk_create(missing_user_words, ignore_conflicts=True)
+            # bulk_create doesn't send post_save
+            invalidate_known_words(user.id)
+            user_words.update({
+                def_ids[user_word.word_definition_id]: user_word
+                for chunk in _chunks(user_word.word_definition_id for user_word in missing_user_words)
+                for user_word in UserWord.objects.filter(user=user, word_definition_id__in=chunk)
+            })
+        
+        touched_user_words = []
+        for key in existing_user_word_keys:
+            user_word = user_words[key]
+            for notes in merged_notes.get(key, []):
+                user_word.notes = f"{user_word.notes}\n{notes}" if user_word.notes else notes
+            user_word.last_seen_at = now
+            touched_user_words.append(user_word)
+        if touched_user_words:
+            UserWord.objects.bulk_update(touched_user_words, ['notes', 'last_seen_at'])
+        
+        # 4. Word references: one per (user word, subtitle), the last occurrence's positions win
+        wanted_refs = {}
+        for key, reference in entries:
+            if reference is not None and key in user_words:
+                subtitle_id, context_start, context_end, surface_form, video_id = reference
+                wanted_refs[(user_words[key].id, subtitle_id)] = (context_start, context_end, surface_form, video_id)
+        
+        if wanted_refs:
+            # Subtitles that no longer exist are ignored, like in save_word
+            existing_subtitle_ids = {
+                subtitle_id
+                for chunk in _chunks({subtitle_id for _, subtitle_id in wanted_refs})
+                for subtitle_id in Subtitle.objects.filter(id__in=chunk).values_list('id', flat=True)
+            }
+            wanted_refs = {
+                ref_key: positions for ref_key, positions in wanted_refs.items()
+                if ref_key[1] in existing_subtitle_ids
+            }
+            
+            existing_refs = {}
+            for chunk in _chunks(wanted_refs):
+                for word_ref in WordReference.objects.filter(
+                    user_word_id__in={user_word_id for user_word_id, _ in chunk},
+                    subtitle_id__in={subtitle_id for _, subtitle_id in chunk}
+                ):
+                    existing_refs[(word_ref.user_word_id, word_ref.subtitle_id)] = word_ref
+            
+            new_refs = []
+            changed_refs = []
+            for (user_word_id, subtitle_id), (context_start, context_end, surface_form, video_id) in wanted_refs.items():
+                word_ref = existing_refs.get((user_word_id, subtitle_id))
+                if word_ref is None:
+                    new_refs.append(WordReference(
+                        user_word_id=user_word_id,
+                        subtitle_id=subtitle_id,
+                        video_id=video_id,
+                        context_start=context_start,
+                        context_end=context_end,
+                        surface_form=surface_form
+                    ))
+                elif (word_ref.context_start != context_start or word_ref.context_end != context_end
+                      or (surface_form and word_ref.surface_form != surface_form)):
+                    word_ref.context_start = context_start
+                    word_ref.context_end = context_end
+                    word_ref.surface_form = surface_form or word_ref.surface_form
+                    changed_refs.append(word_ref)
+            
+            if new_refs:
+                WordReference.objects.bulk_create(new_refs, ignore_conflicts=True)
+            if changed_refs:
+                WordReference.objects.bulk_update(changed_refs, ['context_start', 'context_end', 'surface_form'])
+        
+        # Bulk writes don't send signals, drop the cached lookup-word responses they changed
+        invalidate_definitions({word_def.text for word_def in missing_defs + changed_defs})
+        invalidate_user_lookups(user.id)
+        
+        # 5. Results the same as saving the words one by one: the first occurrence
+        # of a word is new if its definition or user word didn't exist yet
+        new_word_count = 0  # 新添加的单词计数
+        updated_word_count = 0  # 更新了引用的已有单词计数
+        results = []
+        words = {}  # key -> word dict shared by the results of its occurrences
+        seen_keys = set()
+        for key, _ in entries:
+            if key is None:
+                results.append(EMPTY_TEXT_RESULT)
+                continue
+            is_new = key not in seen_keys and (key not in existing_def_keys or key not in existing_user_word_keys)
+            if is_new:
+                new_word_count += 1
+            else:
+                updated_word_count += 1
+            seen_keys.add(key)
+            if key not in words:
+                words[key] = _word_dict(user, definitions[key], user_words[key])
+            results.append({'success': True, 'message': 'Word saved successfully', 'is_new': is_new, 'word': words[key]})
+        processed_count = new_word_count + updated_word_count  # 总处理单词计数（新添加+更新引用）
         
         return {
             'success': True,
@@ -696,6 +933,24 @@ def batch_save_words(user, words_data):
         return {'success': False, 'message': f'Error batch saving words: {str(e)}'}
 
 
+def _word_dict(user, word_def, user_word):
+    """The word of a save_word result"""
+    return {
+        'id': generate_secure_word_id(word_def.text, user.id),
+        'text': word_def.text,
+        'language': word_def.language,
+        'translation': word_def.translation,
+        'uk_phonetic': word_def.uk_phonetic,
+        'us_phonetic': word_def.us_phonetic,
+        'phonetic': word_def.phonetic,
+        'has_audio': word_def.has_audio,
+        'web_translation': word_def.web_translation,
+        'notes': user_word.notes,
+        'is_favorite': user_word.is_favorite,
+        'created_at': user_word.created_at
+    }
+
+
 def generate_secure_word_id(word_text, user_id):
     """Generate secure word ID, does not directly expose user ID"""
     # Combine word text and user ID
@@ -1,39 +1,20 @@
 import re
-import spacy
+import time
+from functools import cached_property
+from django.db.models import Q
 from .models import Video, Subtitle
-from .word_models import UserWord
+from .word_models import UserWord, WordDefinition
 from .word_adapter import batch_save_words
+from .job_models import VideoExtractionState
+from .extraction_queue import get_dictionary_version
+from .lemmatizer import get_lemmas, parse_inflection, record_inflections
+from .token_index import ensure_indexed, get_occurrences, save_tokens, tokenize_subtitles
+from .word_frequency import get_skip_common_words, skip_common_words
+from .known_words import get_known_words
+from .pronunciation_queue import enqueue_pronunciations
+from .tokenizers import get_english_model, get_tokenizer
 from youdao.spider import YoudaoSpider
 
-# Load English model
-def load_english_model():
-    """Load English spaCy model and configure it to not split contractions"""
-    try:
-        # Load model
-        nlp = spacy.load('en_core_web_sm')
-        
-        # Define list of common contractions
-        contractions = [
-            "'s", "'ve", "'re", "'d", "'ll", "'m", "n't", "'t",
-            "ain't", "aren't", "can't", "couldn't", "didn't", "doesn't", "don't", "hadn't",
-            "hasn't", "haven't", "he's", "here's", "i'm", "isn't", "it's", "let's",
-            "mustn't", "shan't", "she's", "shouldn't", "that's", "there's", "they're",
-            "wasn't", "we're", "we've", "weren't", "what's", "where's", "who's", "won't",
-            "wouldn't", "y'all", "you're", "you've", "you'll", "you'd"
-        ]
-        
-        # Custom tokenization rules to treat contractions as complete words
-        infix_re = spacy.util.compile_infix_regex(
-            list(nlp.Defaults.infixes) + [r'''[\-_~]'''] + 
-            [r'''(?<=[a-zA-Z])\'(?=[a-zA-Z])''']  # Match apostrophes as part of words
-        )
-        nlp.tokenizer.infix_finditer = infix_re.finditer
-
-        return nlp
-    except OSError:
-        print("Warning: English model not found. Please install it with 'python -m spacy download en_core_web_sm'")
-        raise
-
 
 class WordExtractor:
     """Extract English words from subtitles and store them in the database"""
@@ -41,8 +22,44 @@ class WordExtractor:
     def __init__(self, user):
         self.user = user
         self.language = 'en'  # Fixed to English
-        # Load English model
-        self.nlp = load_english_model()
+    
+    @property
+    def nlp(self):
+        """Shared English model from the process-wide registry"""
+        return get_english_model()
+    
+    @property
+    def tokenizer(self):
+        """Shared tokenizer of the engine selected with WORD_TOKENIZER_ENGINE"""
+        return get_tokenizer()
+    
+    @cached_property
+    def skip_common_words(self):
+        """Number of most frequent words this user's extractions skip, see api/word_frequency.py"""
+        return get_skip_common_words(self.user)
+    
+    @cached_property
+    def known_words(self):
+        """The user's known-word set (api/known_words.py), taken once so checks stay in memory, None without one"""
+        return get_known_words(self.user.id) if self.user else None
+    
+    def find_word_positions(self, tokens):
+        """Collect (word, start, end) for every valid word among (token_text, start) pairs"""
+        word_positions = []
+        
+        # Iterate through all tokens
+        for token_text, token_start in tokens:
+            token_text = token_text.strip()
+            
+            # Skip whitespace and punctuation (no letters), and already processed words
+            if token_text:
+                if not any(token_start >= start and token_start + len(token_text) <= end 
+                       for _, start, end in word_positions):
+                    # Filter valid words
+                    if self.is_valid_word(token_text):
+                        word_positions.append((token_text, token_start, token_start + len(token_text)))
+        
+        return word_positions
     
     def clean_text(self, text):
         """Clean text by removing punctuation and special characters"""
@@ -63,9 +80,31 @@ class WordExtractor:
         :param download_audio: Whether to download audio file, default is False
         """
         try:
-            spider = YoudaoSpider(word_text)
-            result = spider.get_result(use_api=False)
-            
+            result = YoudaoSpider(word_text).get_result(use_api=False)
+        except Exception as e:
+            print(f"Error getting data for word '{word_text}': {str(e)}")
+            return None
+        return self.build_word_data(word_text, result, download_audio)
+    
+    def get_words_data(self, words, download_audio=False, failed=None):
+        """Word data of many words, fetched concurrently with YoudaoSpider.get_results_many
+        
+        :param failed: Optional set that collects the words whose lookup failed, see lookup_failed
+        :return: Generator of (word, word data or None) in completion order
+        """
+        for word_text, result in YoudaoSpider.get_results_many(words, use_api=False):
+            if failed is not None and self.lookup_failed(result):
+                failed.add(word_text)
+            yield word_text, self.build_word_data(word_text, result, download_audio)
+    
+    def lookup_failed(self, result):
+        """Whether a YoudaoSpider result is a failed lookup (network error, timeout, a page that
+        couldn't be parsed) rather than a word Youdao has no translation for"""
+        return result.get('errorCode', 0) == 0 and 'basic' not in result and not result.get('web')
+    
+    def build_word_data(self, word_text, result, download_audio=False):
+        """Turn a YoudaoSpider result into word data, None if it has no translation"""
+        try:
             # Check if there are valid translation results
             if result['errorCode'] == 0 and 'basic' in result and 'explains' in result['basic'] and result['basic']['explains']:
                 # Build return data
@@ -105,12 +144,12 @@ class WordExtractor:
                 try:
                     if download_audio:
                         # If need to download audio
-                        voice_file = spider.get_voice(word_text, download=True)
+                        voice_file = YoudaoSpider.get_voice(word_text, download=True)
                         if voice_file:
                             word_data['has_audio'] = True
                     else:
                         # Only check if audio file is available, don't download
-                        voice_file = spider.get_voice(word_text, download=False)
+                        voice_file = YoudaoSpider.get_voice(word_text, download=False)
                         if voice_file:
                             word_data['has_audio'] = True
                 except Exception as audio_err:
@@ -141,67 +180,151 @@ class WordExtractor:
             
         return True
     
-    def extract_words_from_subtitle(self, subtitle):
-        """Extract words and their context from a single subtitle, add translations and phonetic symbols, but don't download pronunciations"""
-        # Get subtitle text
-        text = subtitle.text
-        if not text:
-            return []
-        
-        # Use spaCy to analyze text
-        doc = self.nlp(text)
+    def resolve_definitions(self, words, inflections=None, failed=None, saved=None):
+        """Resolve word data once per unique lemma
         
-        # Collect positions of identified words
-        word_positions = []
+        Words are keyed on their lemma (see api/lemmatizer.py), so "ran" and "runs" resolve
+        to the definition of "run". Lemmas that already have a WordDefinition are not
+        looked up again, their references are linked to the existing definition when saving.
+        A looked up word whose explanations mark it as an inflected form is recorded in the
+        inflection table and keyed on its lemma from then on.
         
-        # Iterate through all tokens
-        for token in doc:
-            token_text = token.text.strip()
-            
-            # Skip whitespace, punctuation, and already processed words
-            if token_text and not token.is_punct and not token.is_space:
-                if not any(token.idx >= start and token.idx + len(token_text) <= end 
-                       for _, start, end in word_positions):
-                    # Filter valid words
-                    if self.is_valid_word(token_text):
-                        word_positions.append((token_text, token.idx, token.idx + len(token_text)))
-        
-        # Collect data for all processed words
-        words_data = []
+        :param words: Iterable of normalized (lowercase) words
+        :param inflections: Optional list that collects the learned (form, lemma, inflection type)
+                            entries for the caller to record, instead of recording them right away
+        :param failed: Optional set that collects the keys whose lookup failed, they are
+                       neither resolved nor known
+        :param saved: Optional set that collects the known keys the user has already saved,
+                      according to the user's known-word set
+        :return: (resolved, known, lookup_count, lemmas) where resolved maps key -> word data,
+                 known is the set of keys that already have a definition and lemmas maps
+                 every word whose key differs from the word itself to its key
+        """
+        words = set(words)
+        lemmas = get_lemmas(words, self.language)
+        keys = {lemmas.get(word, word) for word in words}
+        definition_ids = dict(
+            WordDefinition.objects.filter(text__in=keys, language=self.language)
+            .values_list('text', 'id')
+        )
+        known = set(definition_ids)
+        if saved is not None and self.known_words is not None:
+            saved.update(text for text, definition_id in definition_ids.items() if definition_id in self.known_words)
         
-        # Process each found word
-        for word_text, start, end in word_positions:
-            # Get word data (translation, phonetics, pronunciation), and automatically download pronunciation files
-            word_data = self.get_word_data(word_text, download_audio=True)
+        resolved = {}
+        inflected = {}  # form -> (lemma, inflection type, word data)
+        lookup_count = 0
+        # Get word data (translation, phonetics) concurrently, pronunciation files are only checked,
+        # missing ones are downloaded later by the pronunciation queue (see missing_audio)
+        for word_text, word_data in self.get_words_data(keys - known, failed=failed):
+            lookup_count += 1
             
-            # If translation couldn't be obtained, skip this word
+            # If translation couldn't be obtained, the word is skipped
             if word_data is None:
                 continue
-                
-            # Build word data
-            word_info = {
-                'text': word_text.lower(),
-                'language': self.language,
-                # Remove hardcoded frequency, frequency will be calculated dynamically through reference counts
-                'translation': word_data['translation'],
-                'uk_phonetic': word_data['uk_phonetic'],
-                'us_phonetic': word_data['us_phonetic'],
-                'phonetic': word_data['phonetic'],
-                'has_audio': word_data['has_audio'],
-                'web_translation': word_data.get('web_translation', ''),
-                'reference_data': {
-                    'subtitle_id': subtitle.id,
-                    'context_start': start,
-                    'context_end': end
-                }
-            }
+            inflection = parse_inflection(word_text, word_data['translation'])
+            if inflection:
+                lemma, inflection_type = inflection
+                inflected[word_text] = (lemma, inflection_type, word_data)
+            else:
+                resolved[word_text] = word_data
+        
+        if inflected:
+            # Newly learned forms are keyed on their lemma, which is looked up if it has no definition yet
+            missing_lemmas = {lemma for lemma, _, _ in inflected.values()} - known - set(resolved)
+            known.update(
+                WordDefinition.objects.filter(text__in=missing_lemmas, language=self.language)
+                .values_list('text', flat=True)
+            )
+            for lemma, word_data in self.get_words_data(missing_lemmas - known):
+                lookup_count += 1
+                if word_data is not None:
+                    resolved[lemma] = word_data
             
-            # Add to batch processing list
-            words_data.append(word_info)
+            learned = {}
+            for form, (lemma, inflection_type, word_data) in inflected.items():
+                if lemma in known or lemma in resolved:
+                    learned[form] = (lemma, inflection_type)
+                else:
+                    # The lemma couldn't be resolved, keep the form's own definition
+                    resolved[form] = word_data
+            learned_entries = [(form, lemma, inflection_type) for form, (lemma, inflection_type) in learned.items()]
+            if inflections is None:
+                record_inflections(learned_entries, self.language)
+            else:
+                inflections.extend(learned_entries)
+            for word in words:
+                key = lemmas.get(word, word)
+                if key in learned:
+                    lemmas[word] = learned[key][0]
+        
+        return resolved, known, lookup_count, lemmas
+    
+    def missing_audio(self, resolved):
+        """Resolved words without a stored pronunciation file, to queue with enqueue_pronunciations"""
+        return sorted(key for key, word_data in resolved.items() if not word_data.get('has_audio'))
+    
+    def build_word_info(self, word_text, word_data, subtitle_id, start, end, surface_form='', video_id=None):
+        """Build the batch_save_words entry for one word occurrence
         
-        # Batch save words
+        word_data is None for words that already have a WordDefinition, in that case
+        only the reference is saved and the existing definition is left untouched.
+        """
+        word_data = word_data or {}
+        return {
+            'text': word_text,
+            'language': self.language,
+            # Remove hardcoded frequency, frequency will be calculated dynamically through reference counts
+            'translation': word_data.get('translation', ''),
+            'uk_phonetic': word_data.get('uk_phonetic', ''),
+            'us_phonetic': word_data.get('us_phonetic', ''),
+            'phonetic': word_data.get('phonetic', ''),
+            'has_audio': word_data.get('has_audio', False),
+            'web_translation': word_data.get('web_translation', ''),
+            'reference_data': {
+                'subtitle_id': subtitle_id,
+                'context_start': start,
+                'context_end': end,
+                'surface_form': surface_form,
+                'video_id': video_id
+            }
+        }
+    
+    def fan_out_references(self, occurrences, resolved, known, lemmas, video_id=None):
+        """Turn (word, subtitle_id, start, end, surface_form) occurrences into batch_save_words entries keyed on the lemma"""
+        words_data = []
+        for word_text, subtitle_id, start, end, surface_form in occurrences:
+            key = lemmas.get(word_text, word_text)
+            if key in resolved:
+                words_data.append(self.build_word_info(key, resolved[key], subtitle_id, start, end, surface_form, video_id))
+            elif key in known:
+                words_data.append(self.build_word_info(key, None, subtitle_id, start, end, surface_form, video_id))
+        return words_data
+    
+    def extract_words_from_subtitle(self, subtitle):
+        """Extract words and their context from a single subtitle, add translations and phonetic symbols, but don't download pronunciations"""
+        # Get subtitle text
+        text = subtitle.text
+        if not text:
+            return {
+                'success': True,
+                'saved_count': 0,
+                'message': 'No valid words found'
+            }
+        
+        # Collect positions of identified words from the token index
+        ensure_indexed([subtitle])
+        occurrences, _ = skip_common_words(get_occurrences([subtitle]), self.skip_common_words)
+        
+        # Resolve each distinct lemma once, then build one entry per occurrence
+        resolved, known, _, lemmas = self.resolve_definitions(word for word, _, _, _, _ in occurrences)
+        video = subtitle.get_video_for(self.user) if self.user else subtitle.video
+        words_data = self.fan_out_references(occurrences, resolved, known, lemmas, video.id if video else None)
+        
+        # Batch save words, then queue the pronunciations they don't have yet
         if words_data:
             result = batch_save_words(self.user, words_data)
+            enqueue_pronunciations(self.missing_audio(resolved))
             return result
         
         return {
@@ -210,41 +333,194 @@ class WordExtractor:
             'message': 'No valid words found'
         }
     
-    def process_video(self, video):
-        """Process all subtitles of a single video"""
-        subtitles = Subtitle.objects.filter(video=video)
-        word_count = 0
-        new_word_count = 0
-        updated_count = 0
+    def process_video(self, video, subtitles=None):
+        """Process all subtitles of a single video, or only the given subtitles of it
+        
+        Runs as a staged pipeline so each distinct word is looked up only once per video:
+        1. tokenize: read the word occurrences of all subtitles from the token index and
+           drop the user's most common words
+        2. resolve: collapse occurrences to unique lemmas and resolve definitions
+           for lemmas that don't have a WordDefinition yet
+        3. save: fan the definitions back out to one reference per occurrence and batch save,
+           then queue the pronunciation files the new definitions don't have yet
+        
+        Stages 1 and 2 (extract_video_words) only read from the database, stage 3
+        (save_video_words) does all the writing, so the parallel engine in
+        api/parallel_extraction.py can run them in different processes.
+        """
+        if subtitles is None:
+            subtitles = video.get_subtitles()
+        extraction = self.extract_video_words(video, list(subtitles))
+        return self.save_video_words(extraction)
+    
+    def extract_video_words(self, video, subtitles):
+        """Stages 1 and 2 of process_video, returns everything save_video_words needs to write"""
+        stats = {
+            'subtitle_count': 0,
+            'occurrence_count': 0,
+            'unique_word_count': 0,
+            'lemma_count': 0,
+            'known_word_count': 0,
+            'saved_word_count': 0,  # Known words the user already has, only their references are saved
+            'lookup_count': 0,
+            'failed_lookup_count': 0,
+            'tokenized_subtitle_count': 0,
+            'skipped_common_count': 0,
+            'tokenize_seconds': 0.0,
+            'resolve_seconds': 0.0,
+            'save_seconds': 0.0
+        }
+        
+        # Stage 1: read the word occurrences from the token index, subtitles stored before
+        # the index existed are tokenized in batches first
+        stage_start = time.perf_counter()
+        unindexed_ids = [subtitle.id for subtitle in subtitles if not subtitle.indexed]
+        index_tokens = tokenize_subtitles([subtitle for subtitle in subtitles if not subtitle.indexed])
+        occurrences = get_occurrences(subtitles, index_tokens)
+        stats['tokenized_subtitle_count'] = len(unindexed_ids)
+        stats['subtitle_count'] = len(subtitles)
+        stats['occurrence_count'] = len(occurrences)
+        
+        # The user's most common words are dropped before any lookup, they stay in the index
+        occurrences, stats['skipped_common_count'] = skip_common_words(occurrences, self.skip_common_words)
+        stats['tokenize_seconds'] = round(time.perf_counter() - stage_start, 3)
+        
+        # Stage 2: resolve each unique lemma once
+        stage_start = time.perf_counter()
+        unique_words = {word_text for word_text, _, _, _, _ in occurrences}
+        inflections = []
+        failed = set()
+        saved = set()
+        resolved, known, lookup_count, lemmas = self.resolve_definitions(unique_words, inflections, failed, saved)
+        stats['unique_word_count'] = len(unique_words)
+        stats['lemma_count'] = len({lemmas.get(word, word) for word in unique_words})
+        stats['known_word_count'] = len(known)
+        stats['saved_word_count'] = len(saved)
+        stats['lookup_count'] = lookup_count
+        stats['failed_lookup_count'] = len(failed)
+        stats['resolve_seconds'] = round(time.perf_counter() - stage_start, 3)
         
-        for subtitle in subtitles:
-            result = self.extract_words_from_subtitle(subtitle)
-            word_count += result.get('saved_count', 0)
-            new_word_count += result.get('new_word_count', 0)
-            updated_count += result.get('updated_word_count', 0)
+        return {
+            'unindexed_ids': unindexed_ids,
+            'index_tokens': index_tokens,
+            'inflections': inflections,
+            'words_data': self.fan_out_references(occurrences, resolved, known, lemmas, video.id),
+            'missing_audio': self.missing_audio(resolved),
+            # Subtitles with a word whose lookup failed, the watermark stays below them
+            'failed_subtitle_ids': sorted({
+                subtitle_id for word_text, subtitle_id, _, _, _ in occurrences
+                if lemmas.get(word_text, word_text) in failed
+            }),
+            'stats': stats
+        }
+    
+    def save_video_words(self, extraction):
+        """Stage 3 of process_video: store the index entries, learned inflections and words"""
+        stats = extraction['stats']
+        stage_start = time.perf_counter()
+        save_tokens(extraction['unindexed_ids'], extraction['index_tokens'])
+        if extraction['inflections']:
+            record_inflections(extraction['inflections'], self.language)
+        words_data = extraction['words_data']
+        result = batch_save_words(self.user, words_data) if words_data else {}
+        # The saved words moved the user's set to a new version
+        self.__dict__.pop('known_words', None)
+        # Pronunciations are downloaded by the pronunciation worker, once the definitions exist
+        enqueue_pronunciations(extraction.get('missing_audio', []))
+        stats['save_seconds'] = round(time.perf_counter() - stage_start, 3)
             
         # Return the detailed processing result.    
         return {
-            'processed_count': word_count,
-            'new_count': new_word_count, 
-            'updated_count': updated_count
+            'processed_count': result.get('saved_count', 0),
+            'new_count': result.get('new_word_count', 0), 
+            'updated_count': result.get('updated_word_count', 0),
+            'failed_subtitle_ids': extraction.get('failed_subtitle_ids', []),
+            'stats': stats
         }
     
+    def get_new_subtitles(self, video, force=False):
+        """Subtitles above the video's extraction watermark, and the ones below it whose text
+        changed since they were indexed (see api/signals.py)
+        
+        All subtitles are returned when the video has no watermark yet, when the watermark
+        was stored with another EXTRACTION_DICTIONARY_VERSION, or with force=True.
+        
+        :return: (subtitles, since_subtitle_id, full_run)
+        """
+        state = VideoExtractionState.objects.filter(video=video).first()
+        full_run = force or state is None or state.dictionary_version != get_dictionary_version()
+        since_subtitle_id = 0 if full_run else state.last_subtitle_id
+        subtitles = list(
+            video.get_subtitles().filter(Q(id__gt=since_subtitle_id) | Q(indexed=False)).order_by('id')
+        )
+        return subtitles, since_subtitle_id, full_run
+    
+    def advance_watermark(self, video, subtitle_ids, full_run, failed_subtitle_ids=()):
+        """Move the video's watermark past the processed subtitles, returns the state
+        
+        The watermark stays below the first subtitle with a failed word lookup, so the next
+        extraction processes that subtitle and the ones after it again. Re-indexed subtitles
+        below the watermark (see get_new_subtitles) don't move it back otherwise.
+        """
+        first_failed = min(failed_subtitle_ids) if failed_subtitle_ids else None
+        if first_failed is not None:
+            subtitle_ids = [subtitle_id for subtitle_id in subtitle_ids if subtitle_id < first_failed]
+        state, _ = VideoExtractionState.objects.get_or_create(video=video)
+        if subtitle_ids or full_run or first_failed is not None:
+            if full_run:
+                state.last_subtitle_id = max(subtitle_ids, default=0)
+            else:
+                state.last_subtitle_id = max([state.last_subtitle_id] + subtitle_ids)
+            if first_failed is not None:
+                state.last_subtitle_id = min(state.last_subtitle_id, first_failed - 1)
+            state.dictionary_version = get_dictionary_version()
+            if full_run:
+                state.processed_subtitle_count = len(subtitle_ids)
+            else:
+                state.processed_subtitle_count += len(subtitle_ids)
+            state.save()
+        return state
+    
+    def process_new_subtitles(self, video, force=False):
+        """Process only the subtitles above the video's extraction watermark and advance it
+        
+        The whole video is processed when it has no watermark yet, when the watermark was
+        stored with another EXTRACTION_DICTIONARY_VERSION, or with force=True.
+        """
+        subtitles, since_subtitle_id, full_run = self.get_new_subtitles(video, force)
+        if subtitles:
+            result = self.process_video(video, subtitles)
+        else:
+            result = {'processed_count': 0, 'new_count': 0, 'updated_count': 0, 'stats': {}}
+        
+        state = self.advance_watermark(video, [subtitle.id for subtitle in subtitles], full_run,
+                                       result.get('failed_subtitle_ids'))
+        result['since_subtitle_id'] = since_subtitle_id
+        result['last_subtitle_id'] = state.last_subtitle_id
+        return result
+    
     def process_all_videos(self, force_reprocess=False):
-        """Process all videos of the user, extract words"""
+        """Process all videos of the user in this thread, extract words
+        
+        Blocks until every video is done, requests should queue the videos with
+        enqueue_all_videos instead so the extraction worker runs them in parallel.
+        """
         videos = Video.objects.filter(user=self.user)
         total_results = {
             'processed_count': 0,
             'new_count': 0,
-            'updated_count': 0
+            'updated_count': 0,
+            'stats': {}
         }
         
         for video in videos:
-            # 处理每个视频，聚合结果
-            result = self.process_video(video)
+            # 处理每个视频，聚合结果，只处理水位线之后的新字幕
+            result = self.process_new_subtitles(video, force=force_reprocess)
             total_results['processed_count'] += result.get('processed_count', 0)
             total_results['new_count'] += result.get('new_count', 0)
             total_results['updated_count'] += result.get('updated_count', 0)
+            for key, value in result.get('stats', {}).items():
+                total_results['stats'][key] = round(total_results['stats'].get(key, 0) + value, 3)
             
         return total_results
         
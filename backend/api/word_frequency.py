@@ -0,0 +1,73 @@
+"""Word frequency ranks
+
+A ranked list of the most common English words ships in api/data/word_frequency.txt
+(rank 1 = most frequent). It is loaded once per process into a word -> rank dict.
+
+Extraction skips the occurrences of words ranked within a user's "skip common words"
+threshold before any lookup, so "the", "is" and "you" don't produce a definition lookup
+and a WordReference each time they are spoken. The threshold is set per user
+(VocabularyPreference.skip_common_words), the EXTRACTION_SKIP_COMMON_WORDS setting is
+the default for users without one. 0 keeps every word.
+
+Occurrences skipped this way are still in the token index, so lowering the threshold
+and re-extracting with force brings their references back.
+`python manage.py benchmark_common_words` measures what a threshold saves on a transcript.
+"""
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+
+FREQUENCY_FILE = Path(__file__).resolve().parent / 'data' / 'word_frequency.txt'
+
+
+@lru_cache(maxsize=None)
+def get_frequency_ranks():
+    """word -> rank (1 = most frequent) of the shipped frequency list"""
+    ranks = {}
+    with open(FREQUENCY_FILE, encoding='utf-8') as f:
+        for line in f:
+            word = line.strip().lower()
+            if word and not word.startswith('#') and word not in ranks:
+                ranks[word] = len(ranks) + 1
+    return ranks
+
+
+def get_rank(word):
+    """Frequency rank of a word, None if it isn't in the list"""
+    return get_frequency_ranks().get(word.lower())
+
+
+def get_skip_common_words(user):
+    """Number of most frequent words skipped during the user's extractions"""
+    from .word_models import VocabularyPreference
+
+    default = getattr(settings, 'EXTRACTION_SKIP_COMMON_WORDS', 0)
+    if user is None or user.pk is None:
+        return default
+    skip = (
+        VocabularyPreference.objects.filter(user=user)
+        .values_list('skip_common_words', flat=True).first()
+    )
+    return default if skip is None else skip
+
+
+def is_common_word(word, top_n):
+    """Whether the word is among the top_n most frequent words"""
+    if top_n <= 0:
+        return False
+    rank = get_frequency_ranks().get(word.lower())
+    return rank is not None and rank <= top_n
+
+
+def skip_common_words(occurrences, top_n):
+    """Drop the occurrences of the top_n most frequent words
+
+    :param occurrences: (word, ...) tuples as returned by token_index.get_occurrences
+    :return: (kept occurrences, number of skipped occurrences)
+    """
+    if top_n <= 0:
+        return occurrences, 0
+    ranks = get_frequency_ranks()
+    kept = [occurrence for occurrence in occurrences if ranks.get(occurrence[0], top_n + 1) > top_n]
+    return kept, len(occurrences) - len(kept)
@@ -1,16 +1,31 @@
-import pickle
-import sqlite3
+import re
+
+from django.conf import settings
+from django.db.models import Q
 from django.http import JsonResponse
 from django.views.decorators.http import require_GET
-from youdao.spider import YoudaoSpider
-from youdao.config import DB_DIR
-from .word_models import WordDefinition, UserWord, WordReference
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+
+from .lookup_service import lookup, lookup_many
+from .models import Subtitle
+
+WORD_PATTERN = re.compile(r'\b[a-zA-Z]+\b')
+MAX_WORD_LENGTH = 50
+DEFAULT_BATCH_MAX_WORDS = 200
+
 
 @require_GET
 def lookup_word(request):
     """
     Query word definition API endpoint
-    First try to query from Django database, if not exist then query from youdao.db, if still not exist then use spider to get
+    First try to query from Django database, if not exist then query from youdao.db, then the local StarDict
+    dictionaries (config.config['stardict']), if still not exist then use spider to get
+    Inflected forms are looked up by their lemma ("ran" -> "run"), the queried form is returned as surface_form
+    Definitions are shared between users and cached, the user's notes, frequency and favorite flag are
+    added from a per-user cache, see api/lookup_service.py
     """
     word_text = request.GET.get('word', '').strip().lower()
     
@@ -18,143 +33,62 @@ def lookup_word(request):
         return JsonResponse({'error': 'Please provide a word'}, status=400)
     
     # Handle possible sentence situation, extract the first word
-    import re
-    words = re.findall(r'\b[a-zA-Z]+\b', word_text)
+    words = WORD_PATTERN.findall(word_text)
     if words:
         word_text = words[0].lower()
     
     # Simple filter non-word content
-    if len(word_text) > 50 or not any(c.isalpha() for c in word_text):
+    if len(word_text) > MAX_WORD_LENGTH or not any(c.isalpha() for c in word_text):
         return JsonResponse({'error': 'Invalid word'}, status=400)
     
-    result = {}
-    
-    # 1. First query Django database (using new model)
-    try:
-        user = request.user if request.user.is_authenticated else None
-        word_def = WordDefinition.objects.filter(text__iexact=word_text).first()
-        
-        if word_def:
-            # Found word definition
-            result = {
-                'source': 'django_db',
-                'word': word_def.text,
-                'translation': word_def.translation or '',
-                'phonetic': word_def.phonetic or '',
-                'uk_phonetic': word_def.uk_phonetic or '',
-                'us_phonetic': word_def.us_phonetic or '',
-                'web_translation': word_def.web_translation or '',
-                'has_audio': word_def.has_audio
-            }
-            
-            # If user is logged in, try to get user's notes and frequency
-            if user:
-                user_word = UserWord.objects.filter(user=user, word_definition=word_def).first()
-                if user_word:
-                    result['notes'] = user_word.notes or ''
-                    # Calculate word frequency in references
-                    result['frequency'] = WordReference.objects.filter(user_word=user_word).count()
-                    result['is_favorite'] = user_word.is_favorite
-            
-            return JsonResponse(result)
-    except Exception as e:
-        print(f"Failed to query word from Django database: {str(e)}")
-    
-    # 2. Then query youdao.db
-    try:
-        if DB_DIR:
-            conn = sqlite3.connect(DB_DIR)
-            cursor = conn.cursor()
-            cursor.execute('SELECT data FROM words WHERE word = ?', (word_text,))
-            row = cursor.fetchone()
-            conn.close()
-            
-            if row:
-                youdao_data = pickle.loads(row[0])
-                result = {
-                    'source': 'youdao_db',
-                    'word': word_text,
-                    'translation': '',
-                    'phonetic': '',
-                    'uk_phonetic': '',
-                    'us_phonetic': '',
-                    'web_translation': ''
-                }
-                
-                # Extract Youdao data
-                if 'basic' in youdao_data:
-                    basic = youdao_data['basic']
-                    
-                    # Phonetic
-                    if 'phonetic' in basic:
-                        result['phonetic'] = basic['phonetic']
-                    if 'uk-phonetic' in basic:
-                        result['uk_phonetic'] = basic['uk-phonetic']
-                    if 'us-phonetic' in basic:
-                        result['us_phonetic'] = basic['us-phonetic']
-                    
-                    # Translation
-                    if 'explains' in basic and basic['explains']:
-                        result['translation'] = '; '.join(basic['explains'])
-                
-                # Web translation
-                if 'web' in youdao_data and youdao_data['web']:
-                    web_trans = []
-                    for item in youdao_data['web']:
-                        if 'key' in item and 'value' in item:
-                            web_trans.append(f"{item['key']}: {', '.join(item['value'])}")
-                    result['web_translation'] = '; '.join(web_trans)
-                
-                return JsonResponse(result)
-    except Exception as e:
-        print(f"Failed to query word from youdao.db: {str(e)}")
-    
-    # 3. Finally use spider to get
-    try:
-        spider = YoudaoSpider(word_text)
-        youdao_result = spider.get_result(use_cache=True)
-        
-        if youdao_result and youdao_result['errorCode'] == 0:
-            result = {
-                'source': 'youdao_spider',
-                'word': word_text,
-                'translation': '',
-                'phonetic': '',
-                'uk_phonetic': '',
-                'us_phonetic': '',
-                'web_translation': ''
-            }
-            
-            # Extract Youdao data
-            if 'basic' in youdao_result:
-                basic = youdao_result['basic']
-                
-                # Phonetic
-                if 'phonetic' in basic:
-                    result['phonetic'] = basic['phonetic']
-                if 'uk-phonetic' in basic:
-                    result['uk_phonetic'] = basic['uk-phonetic']
-                if 'us-phonetic' in basic:
-                    result['us_phonetic'] = basic['us-phonetic']
-                
-                # Translation
-                if 'explains' in basic and basic['explains']:
-                    result['translation'] = '; '.join(basic['explains'])
-            
-            # Web translation
-            if 'web' in youdao_result and youdao_result['web']:
-                web_trans = []
-                for item in youdao_result['web']:
-                    if 'key' in item and 'value' in item:
-                        web_trans.append(f"{item['key']}: {', '.join(item['value'])}")
-                result['web_translation'] = '; '.join(web_trans)
-            
-            return JsonResponse(result)
-    except Exception as e:
-        print(f"Failed to use spider to query word: {str(e)}")
-    
-    # If all methods fail, return error
-    return JsonResponse({
-        'error': 'Failed to find word definition',
-        'word': word_text
-    }, status=404)
+    user = request.user if request.user.is_authenticated else None
+    status_code, result = lookup(word_text, user)
+    return JsonResponse(result, status=status_code)
+
+
+@api_view(['GET', 'POST'])
+@permission_classes([AllowAny])
+def lookup_words(request):
+    """
+    Look up the words of a subtitle line, or a list of words, in one request
+    GET ?words=a,b,c or ?subtitle_id=N, POST {"words": [...]} or {"subtitle_id": N}
+    Every word gets what lookup-word returns for it plus its status, saved (the user has the word) and
+    has_audio, resolved with set-based queries instead of one request per word, see lookup_service.lookup_many
+    Up to LOOKUP_BATCH_MAX_WORDS distinct words, subtitles are only looked up for their owners
+    """
+    params = request.data if request.method == 'POST' else request.GET
+    subtitle_id = params.get('subtitle_id')
+    words = params.get('words')
+    max_words = getattr(settings, 'LOOKUP_BATCH_MAX_WORDS', DEFAULT_BATCH_MAX_WORDS)
+
+    if subtitle_id:
+        if not request.user.is_authenticated:
+            return Response({'error': 'Authentication required to look up a subtitle'},
+                            status=status.HTTP_401_UNAUTHORIZED)
+        # Own subtitles and subtitles of shared transcripts the user has a video of
+        subtitle = Subtitle.objects.filter(
+            Q(video__user=request.user) | Q(transcript__videos__user=request.user), id=subtitle_id
+        ).first() if str(subtitle_id).isdigit() else None
+        if subtitle is None:
+            return Response({'error': 'Subtitle not found'}, status=status.HTTP_404_NOT_FOUND)
+        words = WORD_PATTERN.findall(subtitle.text or '')
+    elif isinstance(words, str):
+        words = words.split(',')
+    elif not isinstance(words, list):
+        return Response({'error': 'Please provide words or a subtitle_id'}, status=status.HTTP_400_BAD_REQUEST)
+
+    # Same normalization as lookup-word, words that wouldn't pass it are left out
+    words = list(dict.fromkeys(
+        word for word in (str(word).strip().lower() for word in words)
+        if word and len(word) <= MAX_WORD_LENGTH and WORD_PATTERN.fullmatch(word)
+    ))
+    if not words:
+        return Response({'error': 'Please provide a word'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(words) > max_words:
+        return Response({'error': f'At most {max_words} words per request'}, status=status.HTTP_400_BAD_REQUEST)
+
+    user = request.user if request.user.is_authenticated else None
+    return Response({
+        'count': len(words),
+        'results': lookup_many(words, user)
+    }, status=status.HTTP_200_OK)
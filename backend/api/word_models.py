@@ -21,6 +21,24 @@ class WordDefinition(models.Model):
         return self.text
 
 
+class WordInflection(models.Model):
+    """Maps an inflected form to its lemma, so "ran" and "runs" share the definition of "run"
+
+    Built from the dictionary data, see api/lemmatizer.py. Words are stored and looked up by lemma.
+    """
+    form = models.CharField(max_length=100)  # Inflected form, lowercase
+    lemma = models.CharField(max_length=100)  # Base form the definition is stored under
+    language = models.CharField(max_length=20, default='en')
+    inflection = models.CharField(max_length=20, blank=True)  # past, plural, third_person, ...
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        unique_together = ('form', 'language')
+    
+    def __str__(self):
+        return f"{self.form} -> {self.lemma}"
+
+
 class UserWord(models.Model):
     """Model to store user-specific word information and relation to shared definition"""
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='user_words')
@@ -67,20 +85,34 @@ class UserWord(models.Model):
         return self.word_definition.has_audio
 
 
+
+class VocabularyPreference(models.Model):
+    """Per-user vocabulary extraction preferences"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='vocabulary_preference')
+    # Skip the N most frequent words (see api/word_frequency.py), None uses EXTRACTION_SKIP_COMMON_WORDS
+    skip_common_words = models.PositiveIntegerField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.user.username} - skip top {self.skip_common_words}"
+
 # Add new WordReference model, connecting UserWord and Subtitle
 class WordReference(models.Model):
     """Associates user words with subtitles, recording word occurrences in videos"""
     user_word = models.ForeignKey(UserWord, on_delete=models.CASCADE, related_name='references')
     subtitle = models.ForeignKey('api.Subtitle', on_delete=models.CASCADE, related_name='word_references') 
+    # The user's video the reference was found in, subtitles of shared transcripts have no video of their own
+    video = models.ForeignKey('api.Video', on_delete=models.CASCADE, related_name='word_references', null=True, blank=True)
     context_start = models.IntegerField(default=0)  # Starting position of the word in the subtitle
     context_end = models.IntegerField(default=0)    # Ending position of the word in the subtitle
+    surface_form = models.CharField(max_length=100, blank=True)  # The word as written in the subtitle, e.g. "ran" for "run"
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         unique_together = ('user_word', 'subtitle')  # A word is recorded only once per subtitle
     
     def __str__(self):
-        return f"{self.user_word.word_definition.text} in {self.subtitle.video.title}"
+        return f"{self.user_word.word_definition.text} in {self.video.title if self.video else self.subtitle}"
     
     def get_context(self):
         """Get the context where the word appears"""
@@ -3,9 +3,11 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status, viewsets
 from django.shortcuts import get_object_or_404
-from .models import Subtitle
-from .word_models import WordDefinition, UserWord, WordReference
+from .models import Subtitle, Video
+from .word_models import WordDefinition, UserWord, WordReference, WordInflection
 from .serializers import WordReferenceSerializer
+from .lemmatizer import get_lemma
+from .token_index import ensure_indexed, find_term_tokens
 
 
 class WordReferenceViewSet(viewsets.ModelViewSet):
@@ -18,7 +20,7 @@ class WordReferenceViewSet(viewsets.ModelViewSet):
         user = self.request.user
         return WordReference.objects.filter(
             user_word__user=user
-        ).select_related('user_word', 'user_word__word_definition', 'subtitle', 'subtitle__video')
+        ).select_related('user_word', 'user_word__word_definition', 'subtitle', 'video')
     
     def perform_create(self, serializer):
         """Save the word reference with the user_word linked to the current user"""
@@ -33,8 +35,8 @@ def create_word_reference(request):
         data = request.data
         word_text = data.get('word_text')
         subtitle_id = data.get('subtitle_id')
-        context_start = data.get('context_start', 0)
-        context_end = data.get('context_end', 0)
+        context_start = data.get('context_start')
+        context_end = data.get('context_end')
         
         if not word_text or not subtitle_id:
             return Response({
@@ -44,10 +46,17 @@ def create_word_reference(request):
         
         # 获取字幕
         subtitle = get_object_or_404(Subtitle, id=subtitle_id)
+        video = subtitle.get_video_for(request.user)
         
-        # Find or create word definitions
+        # Without a position, use the first occurrence of the word in the token index
+        if context_start is None or context_end is None:
+            ensure_indexed([subtitle])
+            tokens = find_term_tokens([word_text.strip().lower()], Subtitle.objects.filter(id=subtitle.id))
+            context_start, context_end = (tokens[0].start, tokens[0].end) if tokens else (0, 0)
+        
+        # Find or create word definitions, inflected forms share the definition of their lemma
         word_def, created = WordDefinition.objects.get_or_create(
-            text=word_text,
+            text=get_lemma(word_text.strip().lower()),
             defaults={
                 'language': 'en',  # Default English
                 'translation': data.get('translation', '')
@@ -66,7 +75,9 @@ def create_word_reference(request):
             subtitle=subtitle,
             defaults={
                 'context_start': context_start,
-                'context_end': context_end
+                'context_end': context_end,
+                'surface_form': word_text,
+                'video': video
             }
         )
         
@@ -74,6 +85,7 @@ def create_word_reference(request):
         if not created:
             word_ref.context_start = context_start
             word_ref.context_end = context_end
+            word_ref.surface_form = word_text
             word_ref.save()
         
         serializer = WordReferenceSerializer
@@ -102,12 +114,12 @@ def get_word_references(request, word_text=None):
             user_word = get_object_or_404(UserWord, user=request.user, word_definition=word_def)
             references = WordReference.objects.filter(
                 user_word=user_word
-            ).select_related('subtitle', 'subtitle__video')
+            ).select_related('subtitle', 'video')
         else:
             # Otherwise, get all word references
             references = WordReference.objects.filter(
                 user_word__user=request.user
-            ).select_related('user_word', 'user_word__word_definition', 'subtitle', 'subtitle__video')
+            ).select_related('user_word', 'user_word__word_definition', 'subtitle', 'video')
         
         serializer = WordReferenceSerializer(references, many=True)
         
@@ -148,45 +160,44 @@ def delete_word_reference(request, reference_id):
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def process_existing_words(request):
-    """Process existing words, create references for them"""
+    """Process existing words, create references for them
+    
+    Occurrences are looked up in the token index, so a word matches whole words and its
+    inflected forms ("runs", "ran" for "run"), not any subtitle that merely contains the letters.
+    """
     try:
         processed = 0
         errors = 0
         
-        # Get user's all words
-        user_words = UserWord.objects.filter(user=request.user)
-        
-        for user_word in user_words:
-            word_text = user_word.word_definition.text
-            
-            # Find subtitles containing the word
-            subtitles = Subtitle.objects.filter(
-                video__user=request.user,
-                text__icontains=word_text
-            )
-            
-            for subtitle in subtitles:
-                text = subtitle.text.lower()
-                word_lower = word_text.lower()
-                
-                # Find word position in subtitle
-                start_index = text.find(word_lower)
-                if start_index >= 0:
-                    end_index = start_index + len(word_lower)
-                    
-                    # Create or update word reference
-                    try:
-                        word_ref, created = WordReference.objects.get_or_create(
-                            user_word=user_word,
-                            subtitle=subtitle,
-                            defaults={
-                                'context_start': start_index,
-                                'context_end': end_index
-                            }
-                        )
-                        processed += 1
-                    except Exception:
-                        errors += 1
+        # Get user's all words, keyed on every term that counts as an occurrence
+        user_words = {
+            user_word.word_definition.text: user_word
+            for user_word in UserWord.objects.filter(user=request.user).select_related('word_definition')
+        }
+        term_words = dict(user_words)
+        for form, lemma in WordInflection.objects.filter(language='en').values_list('form', 'lemma'):
+            if lemma in user_words:
+                term_words.setdefault(form, user_words[lemma])
+        
+        # One reference per user word and subtitle, at the first occurrence
+        wanted_refs = {}
+        for video in Video.objects.filter(user=request.user):
+            subtitles = video.get_subtitles()
+            ensure_indexed(subtitles.filter(indexed=False))
+            for token in find_term_tokens(term_words, subtitles):
+                ref_key = (term_words[token.term].id, token.subtitle_id)
+                if ref_key not in wanted_refs:
+                    wanted_refs[ref_key] = WordReference(
+                        user_word_id=ref_key[0],
+                        subtitle_id=token.subtitle_id,
+                        video_id=video.id,
+                        context_start=token.start,
+                        context_end=token.end
+                    )
+        
+        # Existing references are kept as they are
+        WordReference.objects.bulk_create(wanted_refs.values(), batch_size=500, ignore_conflicts=True)
+        processed = len(wanted_refs)
         
         return Response({
             'success': True,
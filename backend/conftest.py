@@ -0,0 +1,16 @@
+import pytest
+from django.core.cache import caches
+
+
+@pytest.fixture(autouse=True)
+def local_caches(settings, tmp_path):
+    """Keep the caches shared between processes out of the tests"""
+    settings.CACHES = {
+        alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': f'test-{alias}'}
+        for alias in settings.CACHES
+    }
+    settings.SPELLING_INDEX_PATH = str(tmp_path / 'spelling_index.bin')
+    yield
+    # Local memory caches outlive the test, the database rows they describe don't
+    for alias in settings.CACHES:
+        caches[alias].clear()
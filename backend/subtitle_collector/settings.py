@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
 from pathlib import Path
+import tempfile
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -374,3 +375,74 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Increase the request field limit to handle large subtitles
 DATA_UPLOAD_MAX_NUMBER_FIELDS = 10000
+
+# Background word extraction queue (python manage.py run_extraction_worker)
+EXTRACTION_WORKER_CONCURRENCY = int(os.environ.get('EXTRACTION_WORKER_CONCURRENCY', '2'))
+EXTRACTION_WORKER_PROCESSES = int(os.environ.get('EXTRACTION_WORKER_PROCESSES', '0'))  # >0 extracts on a process pool
+EXTRACTION_JOB_MAX_ATTEMPTS = 3
+EXTRACTION_JOB_RETRY_DELAY = 30  # Seconds before the first retry, doubled on every further retry
+EXTRACTION_JOB_LEASE_SECONDS = 600  # Running jobs are reclaimed once their lease expires
+EXTRACTION_DEBOUNCE_SECONDS = 5  # Subtitles saved within this window share one job
+EXTRACTION_DEBOUNCE_MAX_SECONDS = 60  # A debounced job is never postponed past this age
+# Bump to re-extract every video on its next job, e.g. after changing the extractor or dictionary
+EXTRACTION_DICTIONARY_VERSION = 1
+# Tokenizer used for word extraction: 'spacy' (spaCy English model) or 'regex' (pure Python, no model
+# in memory). Check both agree on your subtitles first: python manage.py check_tokenizer_parity
+WORD_TOKENIZER_ENGINE = os.environ.get('WORD_TOKENIZER_ENGINE', 'spacy')
+# Skip the N most frequent English words during extraction, for users who haven't set their own
+# threshold (0 keeps every word). Measure a value with: python manage.py benchmark_common_words
+EXTRACTION_SKIP_COMMON_WORDS = int(os.environ.get('EXTRACTION_SKIP_COMMON_WORDS', '0'))
+
+# Pronunciation prefetch queue (python manage.py run_pronunciation_worker), extraction only
+# queues the words without a pronunciation file instead of downloading them
+PRONUNCIATION_WORKER_CONCURRENCY = int(os.environ.get('PRONUNCIATION_WORKER_CONCURRENCY', '4'))
+PRONUNCIATION_JOB_MAX_ATTEMPTS = 3
+PRONUNCIATION_JOB_RETRY_DELAY = 60  # Seconds before the first retry, doubled on every further retry
+PRONUNCIATION_JOB_LEASE_SECONDS = 300  # Claimed downloads are claimed again once their lease expires
+
+# Pronunciation files are sent by nginx when this is set to an internal location that maps
+# onto youdao/data/voice, e.g. location /protected-voice/ { internal; alias .../youdao/data/voice/; }
+# Empty streams them from Django
+PRONUNCIATION_ACCEL_REDIRECT_PREFIX = os.environ.get('PRONUNCIATION_ACCEL_REDIRECT_PREFIX', '')
+
+# Caches, known_words and word_lookup are file based so that invalidations made by one process
+# reach the others. Processes only share them when they see the same directory: on one host
+# the temp directory default does, separate containers must mount one volume and set
+# KNOWN_WORDS_CACHE_DIR / WORD_LOOKUP_CACHE_DIR to it (see docker-compose.yml)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'known_words': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('KNOWN_WORDS_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'deja_vocab_known_words')),
+        'TIMEOUT': 3600,
+    },
+    'word_lookup': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('WORD_LOOKUP_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'deja_vocab_word_lookup')),
+        'TIMEOUT': 3600,
+        'OPTIONS': {'MAX_ENTRIES': 50000},
+    },
+}
+# lookup-word responses (api/lookup_service.py): WordDefinition payloads are invalidated when the
+# definition changes and expire after LOOKUP_DEFINITION_TIMEOUT in case an invalidation is missed,
+# payloads that don't come from a WordDefinition and the per-user overlays (notes, frequency,
+# favorite) expire sooner
+LOOKUP_DEFINITION_TIMEOUT = 900
+LOOKUP_FALLBACK_TIMEOUT = 300
+LOOKUP_OVERLAY_TIMEOUT = 120
+# Distinct words per lookup-words request
+LOOKUP_BATCH_MAX_WORDS = 200
+# Per-user known-word set (api/known_words.py), users whose set would be larger are looked up in the database
+KNOWN_WORDS_MAX_BYTES = 256 * 1024
+# Known-word sets every process keeps a copy of, checked against the set's version in the cache
+KNOWN_WORDS_LOCAL_USERS = 256
+# Spelling suggestions for words no dictionary has (api/spelling_index.py),
+# built with python manage.py build_spelling_index
+SPELLING_INDEX_PATH = os.environ.get('SPELLING_INDEX_PATH', str(BASE_DIR / 'spelling_index.bin'))
+SPELLING_MAX_EDIT_DISTANCE = 2
+SPELLING_PREFIX_LENGTH = 7
+SPELLING_SUGGESTIONS = 5
+# Seconds between checks for a rebuilt index file and new definitions
+SPELLING_INDEX_REFRESH_INTERVAL = 60
@@ -0,0 +1,392 @@
+# coding: utf-8
+"""
+有道查询结果的缓存层
+
+查询先经过进程内的 LRU（已解码的结果 dict），未命中再读 youdao.db 的 entries 表。
+每个线程保留一个长连接（WAL 模式，读写互不阻塞），不再每次查询都重新打开数据库。
+YoudaoSpider 和 api.word_lookup.lookup_word 都通过这里读写缓存。
+
+entries 表（SCHEMA_VERSION 2，记录在 PRAGMA user_version）按列保存音标，释义、翻译和
+网络释义保存为用控制字符分隔的文本，可以直接用 SQL 查询。旧版本的 words 表保存的是
+pickle 数据，迁移前仍然可以读取，用 python manage.py migrate_youdao_cache 转换。
+
+查不到的单词（错别字、人名、字幕里的杂音）记录在 misses 表（负缓存），在
+NEGATIVE_CACHE_TTL 之内不再联网查询，最多保留 NEGATIVE_CACHE_SIZE 个，超出时删除最早的。
+"""
+
+import copy
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from youdao.config import DB_DIR, CACHE_SIZE, NEGATIVE_CACHE_TTL, NEGATIVE_CACHE_SIZE
+
+# 1: words(word, data) 保存 pickle 数据，2: entries 表，3: misses 表
+SCHEMA_VERSION = 3
+CREATE_ENTRIES = (
+    'CREATE TABLE IF NOT EXISTS entries ('
+    'word TEXT PRIMARY KEY, '
+    'query TEXT NOT NULL, '
+    'error_code INTEGER NOT NULL DEFAULT 0, '
+    'has_basic INTEGER NOT NULL DEFAULT 0, '
+    'phonetic TEXT, '
+    'uk_phonetic TEXT, '
+    'us_phonetic TEXT, '
+    'explains TEXT, '     # 列表，见 LIST_SEPARATOR
+    'translation TEXT, '
+    'web TEXT'            # 短语之间用 ITEM_SEPARATOR 分隔，每个短语是 key 和 value 组成的列表
+    ') WITHOUT ROWID'
+)
+CREATE_MISSES = (
+    'CREATE TABLE IF NOT EXISTS misses ('
+    'word TEXT PRIMARY KEY, '
+    'error_code INTEGER NOT NULL, '
+    'created_at REAL NOT NULL'
+    ') WITHOUT ROWID'
+)
+CREATE_MISSES_INDEX = 'CREATE INDEX IF NOT EXISTS misses_created_at ON misses (created_at)'
+# 每写入这么多个负缓存检查一次数量上限
+MISS_TRIM_INTERVAL = 100
+ENTRY_COLUMNS = 'word, query, error_code, has_basic, phonetic, uk_phonetic, us_phonetic, explains, translation, web'
+# 列表保存为用控制字符连接的文本，解码只需要 split，比 JSON 和 pickle 都快
+LIST_SEPARATOR = '\x1f'
+ITEM_SEPARATOR = '\x1e'
+NO_VALUE = '\x1d'  # 没有 value 的网络释义
+# 音标列和结果 dict 中 basic 的键
+PHONETIC_KEYS = (('phonetic', 'phonetic'), ('uk_phonetic', 'uk-phonetic'), ('us_phonetic', 'us-phonetic'))
+
+
+class LRUCache:
+    """线程安全的有界 LRU，记录命中统计"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key):
+        with self._lock:
+            return self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+_lru = LRUCache(CACHE_SIZE)
+# word -> (错误码, 过期时间)
+_miss_lru = LRUCache(min(CACHE_SIZE, NEGATIVE_CACHE_SIZE))
+_local = threading.local()
+_stats = {
+    'db_hits': 0,    # LRU 未命中，从 youdao.db 读到
+    'db_misses': 0,  # youdao.db 里也没有
+    'writes': 0,
+    'errors': 0,
+    'negative_hits': 0,  # 命中负缓存，每次都省下一个联网请求
+    'negative_writes': 0,
+}
+_stats_lock = threading.Lock()
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def get_connection():
+    """当前线程的 youdao.db 长连接，fork 之后的子进程会重新打开"""
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and _local.pid == os.getpid():
+        return conn
+
+    os.makedirs(os.path.dirname(DB_DIR), exist_ok=True)
+    conn = sqlite3.connect(DB_DIR, timeout=10)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute(CREATE_ENTRIES)
+    conn.execute(CREATE_MISSES)
+    conn.execute(CREATE_MISSES_INDEX)
+    if conn.execute('PRAGMA user_version').fetchone()[0] < SCHEMA_VERSION:
+        conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+    conn.commit()
+    _local.conn = conn
+    _local.legacy = has_legacy_table(conn)
+    _local.pid = os.getpid()
+    return conn
+
+
+def close_connection():
+    """关闭当前线程的连接"""
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and _local.pid == os.getpid():
+        conn.close()
+    _local.conn = None
+
+
+def _join(values):
+    return LIST_SEPARATOR.join(values)
+
+
+def _split(value):
+    return value.split(LIST_SEPARATOR) if value else []
+
+
+def encode_entry(word, result):
+    """结果 dict -> entries 表的一行（列顺序同 ENTRY_COLUMNS）"""
+    basic = result.get('basic')
+    row = [word, str(result.get('query', '')), int(result.get('errorCode', 0)), int(basic is not None)]
+    basic = basic or {}
+    row.extend(basic.get(key) for _, key in PHONETIC_KEYS)
+    row.append(_join(basic['explains']) if 'explains' in basic else None)
+    row.append(_join(result['translation']) if 'translation' in result else None)
+    if 'web' in result:
+        row.append(ITEM_SEPARATOR.join(
+            item.get('key', '') + NO_VALUE if item.get('value') is None
+            else _join([item.get('key', '')] + list(item['value']))
+            for item in result['web']
+        ))
+    else:
+        row.append(None)
+    return tuple(row)
+
+
+def decode_entry(row):
+    """entries 表的一行 -> 与有道 API 返回的 json 数据结构一致的 dict"""
+    _, query, error_code, has_basic, phonetic, uk_phonetic, us_phonetic, explains, translation, web = row
+    result = {'query': query, 'errorCode': error_code}
+    if has_basic:
+        basic = result['basic'] = {}
+        if phonetic is not None:
+            basic['phonetic'] = phonetic
+        if uk_phonetic is not None:
+            basic['uk-phonetic'] = uk_phonetic
+        if us_phonetic is not None:
+            basic['us-phonetic'] = us_phonetic
+        if explains is not None:
+            basic['explains'] = _split(explains)
+    if translation is not None:
+        result['translation'] = _split(translation)
+    if web is not None:
+        result['web'] = []
+        for item in (web.split(ITEM_SEPARATOR) if web else []):
+            if item.endswith(NO_VALUE):
+                result['web'].append({'key': item[:-1]})
+            else:
+                key, *value = item.split(LIST_SEPARATOR)
+                result['web'].append({'key': key, 'value': value})
+    return result
+
+
+def has_legacy_table(conn):
+    """是否还有未迁移的旧版 words 表"""
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'words'").fetchone() is not None
+
+
+def _load(conn, word):
+    """从 entries 表读取，没有时再读旧版 words 表"""
+    row = conn.execute(f'SELECT {ENTRY_COLUMNS} FROM entries WHERE word = ?', (word,)).fetchone()
+    if row is not None:
+        return decode_entry(row)
+    if _local.legacy:
+        try:
+            row = conn.execute('SELECT data FROM words WHERE word = ?', (word,)).fetchone()
+        except sqlite3.OperationalError:
+            # 旧版表在迁移后被删除了
+            _local.legacy = False
+            return None
+        if row is not None:
+            return pickle.loads(row[0])
+    return None
+
+
+def get(word):
+    """
+    读取缓存的查询结果
+    :param word: 单词
+    :return: 结果 dict 的副本，没有缓存时返回 None
+    """
+    result = _lru.get(word)
+    if result is None:
+        try:
+            result = _load(get_connection(), word)
+        except sqlite3.Error as e:
+            _count('errors')
+            print(f"从 SQLite 加载缓存失败: {str(e)}")
+            return None
+        except Exception as e:
+            _count('errors')
+            print(f"解码缓存数据失败: {str(e)}")
+            return None
+        if result is None:
+            _count('db_misses')
+            return None
+        _count('db_hits')
+        _lru.put(word, result)
+    # 调用方可能修改结果，缓存里的对象保持不变
+    return copy.deepcopy(result)
+
+
+def put(word, result):
+    """
+    保存查询结果到 youdao.db 和 LRU
+    :param result: 只包含基本数据类型的结果 dict
+    :return: 是否保存成功
+    """
+    row = encode_entry(word, result)
+    try:
+        conn = get_connection()
+        conn.execute(f'INSERT OR REPLACE INTO entries ({ENTRY_COLUMNS}) VALUES ({", ".join("?" * len(row))})', row)
+        conn.execute('DELETE FROM misses WHERE word = ?', (word,))
+        conn.commit()
+    except sqlite3.Error as e:
+        _count('errors')
+        print(f"保存到 SQLite 缓存失败: {str(e)}")
+        return False
+    _count('writes')
+    _lru.put(word, copy.deepcopy(result))
+    _miss_lru.pop(word)
+    return True
+
+
+def get_miss(word):
+    """
+    负缓存：单词最近是否查不到
+    :return: 查询时的错误码，没有记录或已过期时返回 None
+    """
+    now = time.time()
+    cached = _miss_lru.get(word)
+    if cached is None:
+        try:
+            row = get_connection().execute(
+                'SELECT error_code, created_at FROM misses WHERE word = ?', (word,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            _count('errors')
+            print(f"从 SQLite 加载负缓存失败: {str(e)}")
+            return None
+        if row is None:
+            return None
+        cached = (row[0], row[1] + NEGATIVE_CACHE_TTL)
+        _miss_lru.put(word, cached)
+    error_code, expires_at = cached
+    if expires_at <= now:
+        return None
+    _count('negative_hits')
+    return error_code
+
+
+def put_miss(word, error_code):
+    """记录查不到的单词，网络错误不要记录"""
+    if NEGATIVE_CACHE_SIZE <= 0:
+        return
+    now = time.time()
+    try:
+        conn = get_connection()
+        conn.execute('INSERT OR REPLACE INTO misses VALUES (?, ?, ?)', (word, error_code, now))
+        with _stats_lock:
+            _stats['negative_writes'] += 1
+            trim = _stats['negative_writes'] % MISS_TRIM_INTERVAL == 0
+        if trim:
+            _trim_misses(conn, now)
+        conn.commit()
+    except sqlite3.Error as e:
+        _count('errors')
+        print(f"保存负缓存失败: {str(e)}")
+        return
+    _miss_lru.put(word, (error_code, now + NEGATIVE_CACHE_TTL))
+
+
+def _trim_misses(conn, now):
+    """删除过期的负缓存，以及超出 NEGATIVE_CACHE_SIZE 的最早记录"""
+    conn.execute('DELETE FROM misses WHERE created_at <= ?', (now - NEGATIVE_CACHE_TTL,))
+    conn.execute(
+        'DELETE FROM misses WHERE created_at <= ('
+        'SELECT created_at FROM misses ORDER BY created_at DESC LIMIT 1 OFFSET ?)',
+        (NEGATIVE_CACHE_SIZE,)
+    )
+
+
+def iter_entries(batch_size=1000):
+    """按批遍历 youdao.db 中的所有结果，产生 (word, 结果 dict)，包括未迁移的旧版数据"""
+    conn = get_connection()
+    last_word = ''
+    while True:
+        rows = conn.execute(
+            f'SELECT {ENTRY_COLUMNS} FROM entries WHERE word > ? ORDER BY word LIMIT ?', (last_word, batch_size)
+        ).fetchall()
+        if not rows:
+            break
+        for row in rows:
+            yield row[0], decode_entry(row)
+        last_word = rows[-1][0]
+
+    if has_legacy_table(conn):
+        last_rowid = 0
+        while True:
+            rows = conn.execute(
+                'SELECT rowid, word, data FROM words WHERE rowid > ? AND word NOT IN (SELECT word FROM entries) '
+                'ORDER BY rowid LIMIT ?', (last_rowid, batch_size)
+            ).fetchall()
+            if not rows:
+                break
+            for _, word, data in rows:
+                try:
+                    yield word, pickle.loads(data)
+                except Exception:
+                    continue
+            last_rowid = rows[-1][0]
+
+
+def clear():
+    """清空进程内的 LRU（youdao.db 不变）"""
+    _lru.clear()
+    _miss_lru.clear()
+
+
+def get_stats():
+    """本进程的缓存统计"""
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = _lru.hits + _lru.misses
+    stats.update({
+        'lru_size': len(_lru),
+        'lru_maxsize': _lru.maxsize,
+        'lru_hits': _lru.hits,
+        'lru_misses': _lru.misses,
+        'lru_evictions': _lru.evictions,
+        'lru_hit_rate': round(_lru.hits / lookups, 4) if lookups else 0.0,
+        'negative_lru_size': len(_miss_lru),
+        # 负缓存省下的联网请求
+        'avoided_requests': stats['negative_hits'],
+    })
+    return stats
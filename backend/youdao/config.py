@@ -16,6 +16,15 @@ DATABASE = 'youdao.db'
 PK_FILE = 'youdao.pk'
 DB_DIR = os.path.join(BASE_DIR, DATABASE)
 PK_DIR = os.path.join(BASE_DIR, PK_FILE)
+# 进程内缓存的查询结果数量，见 youdao/cache.py
+CACHE_SIZE = int(os.environ.get('YOUDAO_CACHE_SIZE', '10000'))
+# 查不到的单词（负缓存）保存多久（秒）和最多保存多少个
+NEGATIVE_CACHE_TTL = int(os.environ.get('YOUDAO_NEGATIVE_CACHE_TTL', str(7 * 24 * 3600)))
+NEGATIVE_CACHE_SIZE = int(os.environ.get('YOUDAO_NEGATIVE_CACHE_SIZE', '50000'))
+# 联网查询: 单次请求超时（秒）, 批量查询的并发数, 每秒最多发出的请求数（令牌桶）
+REQUEST_TIMEOUT = float(os.environ.get('YOUDAO_REQUEST_TIMEOUT', '10'))
+MAX_CONCURRENCY = int(os.environ.get('YOUDAO_MAX_CONCURRENCY', '4'))
+RATE_LIMIT = float(os.environ.get('YOUDAO_RATE_LIMIT', '5'))
 
 config = {'version': '0'}
 
@@ -28,6 +37,15 @@ def silent_remove(filename):
             raise
 
 
+def load_config():
+    """读取 youdao.pk 中的配置（不写入，Web 进程也可以调用），返回 config"""
+    global config
+    if os.path.isfile(PK_DIR):
+        with open(PK_DIR, 'rb') as f:
+            config = pickle.load(f)
+    return config
+
+
 def save_config():
     with open(PK_DIR, 'wb') as f:
         pickle.dump(config, f)
@@ -52,10 +70,7 @@ def prepare():
     if not os.path.exists(VOICE_DIR):
         os.mkdir(VOICE_DIR)
 
-    if os.path.isfile(PK_DIR):
-        with open(PK_DIR, 'rb') as f:
-            global config
-            config = pickle.load(f)
+    load_config()
     # update
     update()
     if config.get('version', '0') < VERSION:
@@ -0,0 +1,177 @@
+# coding: utf-8
+"""
+解析网页版有道（dict.youdao.com/w/eng/<word>）的查询结果
+
+parse 用 lxml 解析网页，然后只用预编译的 XPath 取出需要的几个节点（关键词、phrsListTab、
+phonetic、webPhrase），不再为整个网页构建 BeautifulSoup 树。文本的取法与 BeautifulSoup 的
+Tag.string / stripped_strings / next_sibling 保持一致，所以两者写入 result 的内容完全相同，
+包括网页结构异常、解析到一半抛出异常时已经写入的部分。
+
+parse_soup 是原来的 BeautifulSoup 实现，只用于对照：
+python manage.py benchmark_youdao_parser 用 youdao/fixtures/pages 下保存的网页比较两者的结果、耗时和内存分配。
+"""
+
+from lxml import etree
+
+
+def _class_xpath(name):
+    """与 BeautifulSoup 的 class_=name 一致：class 属性中的任意一个类名等于 name"""
+    return etree.XPath(".//*[contains(concat(' ', normalize-space(@class), ' '), ' %s ')]" % name)
+
+
+RESULTS = etree.XPath('//*[@id="results-contents"]')
+PHRS_LIST = etree.XPath('.//*[@id="phrsListTab"]')
+WEB_PHRASE = etree.XPath('.//*[@id="webPhrase"]')
+KEYWORD = _class_xpath('keyword')
+TRANS_CONTAINER = _class_xpath('trans-container')
+WORD_GROUP = _class_xpath('wordGroup')
+PHONETIC = _class_xpath('phonetic')
+SEARCH_JS = _class_xpath('search-js')
+LI = etree.XPath('.//li')
+SPAN = etree.XPath('.//span')
+# BeautifulSoup 不把这些标签里的文本算作 stripped_strings
+SCRIPT_TAGS = ('script', 'style', 'template')
+
+
+def _first(xpath, element):
+    """第一个匹配的节点，没有时返回 None"""
+    found = xpath(element)
+    return found[0] if found else None
+
+
+def _string(element):
+    """
+    与 BeautifulSoup 的 Tag.string 一致：节点只有一个子节点时返回其中的文本
+    （子节点是标签时递归），否则返回 None
+    """
+    while True:
+        children = len(element)
+        if element.text:
+            if not children:
+                return element.text
+            return None
+        if children != 1 or element[0].tail:
+            return None
+        element = element[0]
+        if not isinstance(element.tag, str):
+            # 注释节点
+            return element.text
+
+
+def _stripped_strings(element):
+    """与 BeautifulSoup 的 stripped_strings 一致：按顺序产生去掉首尾空白后非空的文本，跳过注释和脚本、样式"""
+    if element.text:
+        text = element.text.strip()
+        if text:
+            yield text
+    for child in element:
+        if isinstance(child.tag, str) and child.tag not in SCRIPT_TAGS:
+            yield from _stripped_strings(child)
+        if child.tail:
+            text = child.tail.strip()
+            if text:
+                yield text
+
+
+def parse(html, result, word):
+    """
+    解析网页，把结果写入 result（与有道 API 返回的 json 数据结构一致）
+    :param html: 网页内容
+    :param result: YoudaoSpider.result
+    :param word: 查询的单词，网页没有关键词时作为 query
+    """
+    document = etree.HTML(html)
+    root = _first(RESULTS, document) if document is not None else None
+    if root is None:
+        raise ValueError('网页中没有查询结果（results-contents）')
+
+    # query 搜索的关键字
+    keyword = _first(KEYWORD, root)
+    if keyword is None:
+        # 可能是无效的搜索词，没有找到对应的关键词
+        result['query'] = word
+        # 设置错误码，表示无词典结果
+        result['errorCode'] = 60
+        return result
+    result['query'] = _string(keyword)
+
+    # 基本解释
+    basic = _first(PHRS_LIST, root)
+    if basic is not None:
+        trans = _first(TRANS_CONTAINER, basic)
+        if trans is not None:
+            result['basic'] = {}
+            result['basic']['explains'] = [_string(tran) for tran in LI(trans)]
+            # 中文
+            if len(result['basic']['explains']) == 0:
+                exp = _stripped_strings(_first(WORD_GROUP, trans))
+                result['basic']['explains'].append(' '.join(exp))
+
+            # 音标
+            phons = PHONETIC(basic)[:2]
+            if len(phons) == 2:
+                result['basic']['uk-phonetic'], result['basic']['us-phonetic'] = \
+                    [_string(p)[1:-1] for p in phons]
+            elif len(phons) == 1:
+                result['basic']['phonetic'] = _string(phons[0])[1:-1]
+
+    # 网络释义(短语)
+    web = _first(WEB_PHRASE, root)
+    if web is not None:
+        result['web'] = [
+            {
+                'key': _string(_first(SEARCH_JS, wordgroup)).strip(),
+                'value': [v.strip() for v in _first(SPAN, wordgroup).tail.split(';')]
+            } for wordgroup in WORD_GROUP(web)[:4]
+        ]
+    return result
+
+
+def parse_soup(html, result, word):
+    """原来的 BeautifulSoup 实现，参数与 parse 相同"""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "lxml")
+    root = soup.find(id='results-contents')
+
+    # query 搜索的关键字
+    keyword = root.find(class_='keyword')
+    if not keyword:
+        # 可能是无效的搜索词，没有找到对应的关键词
+        result['query'] = word
+        # 设置错误码，表示无词典结果
+        result['errorCode'] = 60
+        return result
+    else:
+        result['query'] = keyword.string
+
+    # 基本解释
+    basic = root.find(id='phrsListTab')
+    if basic:
+        trans = basic.find(class_='trans-container')
+        if trans:
+            result['basic'] = {}
+            result['basic']['explains'] = [tran.string for tran in trans.find_all('li')]
+            # 中文
+            if len(result['basic']['explains']) == 0:
+                exp = trans.find(class_='wordGroup').stripped_strings
+                result['basic']['explains'].append(' '.join(exp))
+
+            # 音标
+            phons = basic(class_='phonetic', limit=2)
+            if len(phons) == 2:
+                result['basic']['uk-phonetic'], result['basic']['us-phonetic'] = \
+                    [p.string[1:-1] for p in phons]
+            elif len(phons) == 1:
+                result['basic']['phonetic'] = phons[0].string[1:-1]
+
+    # 网络释义(短语)
+    web = root.find(id='webPhrase')
+    if web:
+        result['web'] = [
+            {
+                'key': wordgroup.find(class_='search-js').string.strip(),
+                'value': [v.strip() for v in wordgroup.find('span').next_sibling.split(';')]
+            } for wordgroup in web.find_all(class_='wordGroup', limit=4)
+        ]
+    return result
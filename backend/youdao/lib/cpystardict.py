@@ -19,11 +19,9 @@ along with PyStarDict.  If not, see <http://www.gnu.org/licenses/>.
 
 @author: Serge Matveenko <s@matveenko.ru>
 """
-import gzip
 import warnings
-from . import CPyStarDictIndex
-# import cppimport
-# CPyStarDictIndex = cppimport.imp("youdao.lib.CPyStarDictIndex")
+from .stardict_index import MmapStarDictIndex
+from .dictzip import DictzipFile, open_dictzip
 
 
 class _StarDictIfo(object):
@@ -143,29 +141,25 @@ class _StarDictIdx(object):
 
         self.idx_offset_bytes_size = int(container.ifo.idxoffsetbits / 8)
 
+        # mmap-ed word list with a binary search over a cached offsets array, see stardict_index.py
+        try:
+            self._idx = MmapStarDictIndex(self.idx_filename, container.ifo.idxoffsetbits)
+        except (IOError, OSError):
+            raise Exception('.idx file does not exists')
+
     def __getitem__(self, word):
         """
         returns tuple (word_data_offset, word_data_size,) for word in .dict
         
         @note: here may be placed flexible search realization
         """
-        # word = word.encode("utf-8")
-        idx = CPyStarDictIndex.getIndex(word, self.idx_offset_bytes_size,
-                                        self.idx_filename)
-        if idx[2]:
-            import socket
-            return socket.htonl(idx[1]
-                                & 0xffffffff), socket.htonl(idx[2]
-                                                            & 0xffffffff)
-        else:
-            raise KeyError('%s not found' % word)
+        return self._idx[word]
 
     def __contains__(self, k):
         """
         returns True if index has a word k, else False
         """
-        idx = self.__getitem__(k)
-        return idx[1] != 0
+        return k in self._idx
 
     def __eq__(self, y):
         """
@@ -179,6 +173,12 @@ class _StarDictIdx(object):
         """
         raise NotImplementedError()
 
+    def words(self):
+        """
+        yields the words (utf-8 bytes) in StarDict order, reads the mapped .idx only
+        """
+        return iter(self._idx)
+
     def iterkeys(self):
         """
         returns iterkeys
@@ -187,7 +187,7 @@ class _StarDictIdx(object):
             warnings.warn(
                 'Iter dict items with in_memory=False may cause serious performance problem'
             )
-        return self._idx.iterkeys()
+        return iter(self._idx)
 
     def keys(self):
         """
@@ -197,7 +197,7 @@ class _StarDictIdx(object):
             warnings.warn(
                 'Iter dict items with in_memory=False may cause serious performance problem'
             )
-        return self._idx.keys()
+        return list(self._idx)
 
 
 class _StarDictDict(object):
@@ -346,18 +346,20 @@ class _StarDictDict(object):
         dict_filename = '%s.dict' % dict_prefix
         dict_filename_dz = '%s.dz' % dict_filename
 
-        if in_memory:
-            try:
-                f = open_file(dict_filename, dict_filename_dz)
-                self._file = f.read()
-                f.close()
-            except:
-                raise Exception('.dict file does not exists')
+        try:
+            f = open_file(dict_filename, dict_filename_dz, in_memory)
+        except:
+            raise Exception('.dict file does not exists')
+
+        if isinstance(f, DictzipFile):
+            # dictzip keeps its (compressed) data in memory itself and inflates only the chunks it reads
+            self._in_memory = False
+            self._file = f
+        elif in_memory:
+            self._file = f.read()
+            f.close()
         else:
-            try:
-                self._file = open_file(dict_filename, dict_filename_dz)
-            except:
-                raise Exception('.dict file does not exists')
+            self._file = f
 
     def __getitem__(self, word):
         """
@@ -369,6 +371,8 @@ class _StarDictDict(object):
 
         if self._in_memory:
             bytes = self._file[cords[0]:cords[0] + cords[1]]
+        elif isinstance(self._file, DictzipFile):
+            bytes = self._file.read_range(cords[0], cords[1])
         else:
             # seeking in file for data
             self._file.seek(cords[0])
@@ -554,6 +558,12 @@ class Dictionary(dict):
             )
         return [(key, self[key]) for key in self.iterkeys()]
 
+    def iterkeys(self):
+        """
+        returns iterkeys
+        """
+        return self.idx.iterkeys()
+
     def iteritems(self):
         """
         returns iteritems
@@ -608,16 +618,18 @@ class Dictionary(dict):
         raise NotImplementedError()
 
 
-def open_file(regular, gz):
+def open_file(regular, gz, in_memory=False):
     """
     Open regular file if it exists, gz file otherwise.
+    A dictzip gz file is opened for random access (DictzipFile), in_memory then
+    keeps its compressed data in memory.
     If no file exists, rise ValueError.
     """
     try:
         return open(regular, 'rb')
     except IOError:
         try:
-            return gzip.open(gz, 'rb')
+            return open_dictzip(gz, in_memory)
         except IOError:
             raise ValueError('Neither regular nor gz file exists')
 
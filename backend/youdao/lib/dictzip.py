@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+Random-access reader for dictzip (.dict.dz) files
+
+dictzip is gzip compressed in independently flushed chunks, the gzip header's extra
+field holds an 'RA' subfield with the chunk length and the compressed size of every
+chunk. A read of [offset, offset + size) inflates only the chunks covering that
+range instead of everything before it, as seeking a gzip.GzipFile would. Inflated
+chunks are kept in a bounded LRU.
+"""
+import gzip
+import io
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+
+FTEXT, FHCRC, FEXTRA, FNAME, FCOMMENT = 1, 2, 4, 8, 16
+# Inflated chunks kept per file, dictzip chunks are at most 64KB
+DEFAULT_CACHE_CHUNKS = 64
+
+
+class NotDictzipError(Exception):
+    """The file is gzip but has no RA chunk table"""
+
+
+def read_chunk_table(fileobj):
+    """
+    Parse the gzip header of a dictzip file
+
+    :return: (uncompressed chunk length, list of compressed chunk sizes, offset of the first chunk)
+    :raises NotDictzipError: when the file has no RA extra subfield
+    """
+    fileobj.seek(0)
+    header = fileobj.read(10)
+    if len(header) < 10 or header[:2] != b'\x1f\x8b' or header[2] != 8:
+        raise NotDictzipError('not a gzip file')
+    flags = header[3]
+    if not flags & FEXTRA:
+        raise NotDictzipError('gzip header has no extra field')
+
+    extra_length, = struct.unpack('<H', fileobj.read(2))
+    extra = fileobj.read(extra_length)
+    chunk_length = None
+    sizes = None
+    position = 0
+    while position + 4 <= len(extra):
+        subfield_id = extra[position:position + 2]
+        subfield_length, = struct.unpack('<H', extra[position + 2:position + 4])
+        data = extra[position + 4:position + 4 + subfield_length]
+        if subfield_id == b'RA':
+            version, chunk_length, chunk_count = struct.unpack('<HHH', data[:6])
+            if version != 1:
+                raise NotDictzipError('unsupported dictzip version %d' % version)
+            sizes = list(struct.unpack('<%dH' % chunk_count, data[6:6 + 2 * chunk_count]))
+        position += 4 + subfield_length
+    if sizes is None:
+        raise NotDictzipError('gzip header has no RA subfield')
+
+    # Skip the optional file name, comment and header CRC
+    for flag in (FNAME, FCOMMENT):
+        if flags & flag:
+            while fileobj.read(1) not in (b'\0', b''):
+                pass
+    if flags & FHCRC:
+        fileobj.read(2)
+    return chunk_length, sizes, fileobj.tell()
+
+
+class DictzipFile(object):
+    """
+    Read-only file object over a dictzip file, supports seek/read/tell like the gzip file it replaces
+    """
+
+    def __init__(self, fileobj, cache_chunks=DEFAULT_CACHE_CHUNKS):
+        self._fileobj = fileobj
+        self.chunk_length, sizes, data_start = read_chunk_table(fileobj)
+        self._chunk_offsets = []
+        offset = data_start
+        for size in sizes:
+            self._chunk_offsets.append((offset, size))
+            offset += size
+        self._cache = OrderedDict()
+        self._cache_chunks = cache_chunks
+        self._lock = threading.Lock()
+        self._position = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _chunk(self, index):
+        """Inflated chunk index, from the LRU or read and inflated"""
+        with self._lock:
+            chunk = self._cache.get(index)
+            if chunk is not None:
+                self._cache.move_to_end(index)
+                self.hits += 1
+                return chunk
+            offset, size = self._chunk_offsets[index]
+            self._fileobj.seek(offset)
+            compressed = self._fileobj.read(size)
+            self.misses += 1
+        chunk = zlib.decompressobj(-zlib.MAX_WBITS).decompress(compressed)
+        with self._lock:
+            self._cache[index] = chunk
+            while len(self._cache) > self._cache_chunks:
+                self._cache.popitem(last=False)
+        return chunk
+
+    def read_range(self, offset, size):
+        """Bytes [offset, offset + size), inflating only the chunks covering them"""
+        if size <= 0:
+            return b''
+        first = offset // self.chunk_length
+        last = min((offset + size - 1) // self.chunk_length, len(self._chunk_offsets) - 1)
+        data = b''.join(self._chunk(index) for index in range(first, last + 1))
+        start = offset - first * self.chunk_length
+        return data[start:start + size]
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            raise io.UnsupportedOperation('dictzip files do not support seeking from the end')
+        self._position = offset
+        return self._position
+
+    def tell(self):
+        return self._position
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = len(self._chunk_offsets) * self.chunk_length - self._position
+        data = self.read_range(self._position, size)
+        self._position += len(data)
+        return data
+
+    def close(self):
+        self._fileobj.close()
+        self._cache.clear()
+
+
+def open_dictzip(filename, in_memory=False, cache_chunks=DEFAULT_CACHE_CHUNKS):
+    """
+    Open a .dz file, a DictzipFile when it has a chunk table, otherwise a plain gzip file
+
+    in_memory keeps the compressed bytes in memory, chunks are still inflated on demand
+    """
+    if in_memory:
+        with open(filename, 'rb') as f:
+            fileobj = io.BytesIO(f.read())
+    else:
+        fileobj = open(filename, 'rb')
+    try:
+        return DictzipFile(fileobj, cache_chunks)
+    except NotDictzipError:
+        fileobj.close()
+        return gzip.open(filename, 'rb')
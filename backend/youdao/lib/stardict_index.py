@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+Memory-mapped StarDict .idx index
+
+The .idx file is mmap-ed and never parsed into Python objects. An array with the
+start offset of every entry, in StarDict sort order, is built once and saved next to
+the .idx file (<name>.idx.offsets), later loads only read that array. Lookups are a
+binary search over the array comparing the raw bytes in the mapped file, O(log n)
+per word.
+
+StarDict sorts the word list with g_ascii_strcasecmp, ties broken with strcmp, so
+entries compare on (ascii-lowercased bytes, bytes). .idx files that are not in that
+order are sorted while the array is built.
+"""
+import gzip
+import mmap
+import os
+import struct
+from array import array
+
+SIDECAR_SUFFIX = '.offsets'
+SIDECAR_MAGIC = b'SDIDXOF1'
+# magic, .idx size, .idx mtime in ns, entry count
+SIDECAR_HEADER = struct.Struct('<8sQQQ')
+
+
+def _sort_key(word):
+    return word.lower(), word
+
+
+class MmapStarDictIndex(object):
+    """
+    word (utf-8 bytes) -> (word_data_offset, word_data_size) over a StarDict .idx file
+    """
+
+    def __init__(self, idx_filename, offset_bits=32, use_sidecar=True):
+        self.idx_filename = idx_filename
+        self._cords = struct.Struct('>%sL' % {32: 'L', 64: 'Q'}[offset_bits])
+
+        if os.path.exists(idx_filename):
+            self._fp = open(idx_filename, 'rb')
+            stat = os.fstat(self._fp.fileno())
+            self._data = mmap.mmap(self._fp.fileno(), 0, access=mmap.ACCESS_READ) if stat.st_size else b''
+        else:
+            # .idx.gz can't be mapped, it is inflated into memory once
+            self._fp = None
+            with gzip.open('%s.gz' % idx_filename, 'rb') as f:
+                self._data = f.read()
+            stat = os.stat('%s.gz' % idx_filename)
+            use_sidecar = False
+
+        self.sidecar_filename = idx_filename + SIDECAR_SUFFIX
+        self._signature = (len(self._data), stat.st_mtime_ns)
+        self.offsets = self._load_sidecar() if use_sidecar else None
+        self.loaded_from_sidecar = self.offsets is not None
+        if self.offsets is None:
+            self.offsets = self._build_offsets()
+            if use_sidecar:
+                self._save_sidecar()
+
+    def _build_offsets(self):
+        """Start offset of every entry, in StarDict sort order"""
+        data = self._data
+        entry_tail = self._cords.size
+        offsets = array('Q')
+        position = 0
+        end = len(data)
+        while position < end:
+            terminator = data.find(b'\0', position)
+            if terminator < 0:
+                break
+            offsets.append(position)
+            position = terminator + 1 + entry_tail
+
+        # Verify the order and sort only when the file isn't in StarDict order
+        previous = None
+        for start in offsets:
+            key = _sort_key(self._word_at(start))
+            if previous is not None and key < previous:
+                offsets = array('Q', sorted(offsets, key=lambda start: _sort_key(self._word_at(start))))
+                break
+            previous = key
+        return offsets
+
+    def _load_sidecar(self):
+        try:
+            with open(self.sidecar_filename, 'rb') as f:
+                header = f.read(SIDECAR_HEADER.size)
+                if len(header) != SIDECAR_HEADER.size:
+                    return None
+                magic, size, mtime_ns, count = SIDECAR_HEADER.unpack(header)
+                if magic != SIDECAR_MAGIC or (size, mtime_ns) != self._signature:
+                    return None
+                offsets = array('Q')
+                offsets.fromfile(f, count)
+                return offsets
+        except (OSError, EOFError):
+            return None
+
+    def _save_sidecar(self):
+        """Write the offsets array, silently skipped when the directory is read-only"""
+        temp_filename = '%s.%d.tmp' % (self.sidecar_filename, os.getpid())
+        try:
+            with open(temp_filename, 'wb') as f:
+                f.write(SIDECAR_HEADER.pack(SIDECAR_MAGIC, self._signature[0], self._signature[1], len(self.offsets)))
+                self.offsets.tofile(f)
+            os.replace(temp_filename, self.sidecar_filename)
+        except OSError:
+            try:
+                os.remove(temp_filename)
+            except OSError:
+                pass
+
+    def _word_at(self, start):
+        return self._data[start:self._data.find(b'\0', start)]
+
+    def find(self, word):
+        """
+        returns the position of word in the offsets array, -1 if the index doesn't have it
+        """
+        if isinstance(word, str):
+            word = word.encode('utf-8')
+        target = _sort_key(word)
+        offsets = self.offsets
+        low, high = 0, len(offsets)
+        while low < high:
+            middle = (low + high) // 2
+            if _sort_key(self._word_at(offsets[middle])) < target:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(offsets) and self._word_at(offsets[low]) == word:
+            return low
+        return -1
+
+    def __getitem__(self, word):
+        """
+        returns tuple (word_data_offset, word_data_size,) for word in .dict
+        """
+        position = self.find(word)
+        if position < 0:
+            raise KeyError('%s not found' % word)
+        start = self.offsets[position]
+        cords_start = self._data.find(b'\0', start) + 1
+        return self._cords.unpack(self._data[cords_start:cords_start + self._cords.size])
+
+    def __contains__(self, word):
+        return self.find(word) >= 0
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __iter__(self):
+        """
+        yields the words (utf-8 bytes) in StarDict order
+        """
+        for start in self.offsets:
+            yield self._word_at(start)
+
+    def close(self):
+        if self._fp is not None:
+            if isinstance(self._data, mmap.mmap):
+                self._data.close()
+            self._fp.close()
+            self._fp = None
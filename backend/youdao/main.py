@@ -11,7 +11,7 @@ from collections import deque
 from termcolor import colored
 from youdao.spider import YoudaoSpider
 from youdao.model import Word
-from youdao import config
+from youdao import config, voice_store
 from youdao.lib.cpystardict import Dictionary
 
 
@@ -132,7 +132,7 @@ def del_word(keyword):
             print(colored(u'已删除{0}'.format(keyword), 'blue'))
         except Word.DoesNotExist:
             print(colored(u'没有找到{0}'.format(keyword), 'red'))
-        config.silent_remove(os.path.join(config.VOICE_DIR, keyword+'.mp3'))
+        voice_store.remove(keyword)
     else:
         count = Word.delete().execute()
         shutil.rmtree(config.VOICE_DIR, ignore_errors=True)
@@ -3,13 +3,62 @@
 import sys
 import os
 import errno
-import pickle
-import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import requests
+from requests.adapters import HTTPAdapter
 from requests.exceptions import RequestException
 from termcolor import colored
-from bs4 import BeautifulSoup
-from youdao.config import VOICE_DIR, DB_DIR, PK_DIR
+from youdao import cache, html_parser, voice_store
+from youdao.config import REQUEST_TIMEOUT, MAX_CONCURRENCY, RATE_LIMIT
+
+
+class TokenBucket:
+    """
+    令牌桶限速，每秒补充 rate 个令牌，最多积攒 capacity 个
+    rate <= 0 表示不限速
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """取一个令牌，没有令牌时等待"""
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+_session = None
+_session_lock = threading.Lock()
+# 所有联网查询共用的限速
+rate_limiter = TokenBucket(RATE_LIMIT)
+
+
+def get_session():
+    """进程共用的 requests Session，保持连接（keep-alive）"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(MAX_CONCURRENCY, 10))
+            _session.mount('http://', adapter)
+            _session.mount('https://', adapter)
+        return _session
 
 
 class YoudaoSpider:
@@ -49,33 +98,18 @@ class YoudaoSpider:
     # __init__ 已经移到上面重新定义
 
     def load_from_cache(self):
-        """从缓存中加载单词数据"""
-        # 先尝试从 Pickle 文件加载
-        if os.path.exists(PK_DIR):
-            try:
-                with open(PK_DIR, 'rb') as f:
-                    data = pickle.load(f)
-                    if self.word in data:
-                        self.result = data[self.word]
-                        return True
-            except Exception as e:
-                print(f"从 Pickle 文件加载缓存失败: {str(e)}")
-        
-        # 然后尝试从 SQLite 加载
-        if os.path.exists(DB_DIR):
-            try:
-                conn = sqlite3.connect(DB_DIR)
-                cursor = conn.cursor()
-                cursor.execute('SELECT data FROM words WHERE word = ?', (self.word,))
-                row = cursor.fetchone()
-                conn.close()
-                if row:
-                    self.result = pickle.loads(row[0])
-                    return True
-            except Exception as e:
-                print(f"从 SQLite 加载缓存失败: {str(e)}")
-        
-        return False
+        """
+        从缓存中加载单词数据（进程内 LRU，然后是 youdao.db），见 youdao/cache.py
+        最近查不到的单词（负缓存）也算命中，结果只有 query 和错误码
+        """
+        result = cache.get(self.word)
+        if result is None:
+            error_code = cache.get_miss(self.word)
+            if error_code is None:
+                return False
+            result = {'query': self.word, 'errorCode': error_code}
+        self.result = result
+        return True
         
     def save_to_cache(self):
         """将单词数据保存到缓存"""
@@ -85,38 +119,8 @@ class YoudaoSpider:
         # 创建一个安全的副本，只包含必要的基本数据类型
         safe_result = self._create_safe_result_copy()
             
-        # SQLite 缓存
         try:
-            # 确保目录存在
-            os.makedirs(os.path.dirname(DB_DIR), exist_ok=True)
-            
-            conn = sqlite3.connect(DB_DIR)
-            cursor = conn.cursor()
-            cursor.execute('CREATE TABLE IF NOT EXISTS words (word TEXT PRIMARY KEY, data BLOB)')
-            
-            try:
-                serialized_data = pickle.dumps(safe_result, protocol=4)
-                cursor.execute('INSERT OR REPLACE INTO words VALUES (?, ?)', 
-                              (self.word, serialized_data))
-                conn.commit()
-            except RecursionError as e:
-                print(f"序列化数据时出现递归错误: {str(e)}")
-                # 尝试使用更简单的结构保存
-                try:
-                    minimal_data = {
-                        'query': safe_result.get('query', ''),
-                        'errorCode': safe_result.get('errorCode', 0),
-                        'basic': {
-                            'explains': safe_result.get('basic', {}).get('explains', [])
-                        }
-                    }
-                    cursor.execute('INSERT OR REPLACE INTO words VALUES (?, ?)', 
-                                (self.word, pickle.dumps(minimal_data, protocol=2)))
-                    conn.commit()
-                except Exception as inner_e:
-                    print(f"尝试保存简化数据也失败: {str(inner_e)}")
-            
-            conn.close()
+            cache.put(self.word, safe_result)
         except Exception as e:
             print(f"保存到 SQLite 缓存失败: {str(e)}")
     
@@ -170,19 +174,23 @@ class YoudaoSpider:
             return self.result
             
         try:
+            rate_limiter.acquire()
             if use_api:
-                self.params['q'] = self.word
-                r = requests.get(self.api_url, params=self.params)
+                params = dict(self.params, q=self.word)
+                r = get_session().get(self.api_url, params=params, timeout=REQUEST_TIMEOUT)
                 r.raise_for_status()  # a 4XX client error or 5XX server error response
                 self.result = r.json()
             else:
-                r = requests.get(self.web_url.format(self.word))
+                r = get_session().get(self.web_url.format(self.word), timeout=REQUEST_TIMEOUT)
                 r.raise_for_status()
                 self.parse_html(r.text)
                 
-            # 如果查询成功，保存到缓存
+            # 如果查询成功，保存到缓存，明确没有词典结果（错误码 60）的单词记入负缓存
+            # 验证码页面、无法识别的网页结构等其他情况都不缓存，下次重新查询
             if self.result['errorCode'] == 0 and 'basic' in self.result:
                 self.save_to_cache()
+            elif self.result['errorCode'] == 60:
+                cache.put_miss(self.word, 60)
                 
         except RequestException as e:
             print(colored(u'网络错误: %s' % e, 'red'))
@@ -193,59 +201,44 @@ class YoudaoSpider:
             
         return self.result
 
+    @classmethod
+    def get_results_many(cls, words, use_api=False, use_cache=True, concurrency=MAX_CONCURRENCY):
+        """
+        批量获取查询结果，先返回缓存中的结果，其余的并发联网查询，查完一个返回一个
+        联网查询共用一个保持连接的 Session，并受 rate_limiter 限速
+        :param words: 单词列表，重复的单词只查询一次
+        :param concurrency: 同时进行的联网查询数
+        :return: 产生 (word, result) 的生成器，result 与 get_result 的返回值一致
+        """
+        pending = []
+        for word in dict.fromkeys(words):
+            spider = cls(word)
+            if use_cache and spider.load_from_cache():
+                yield word, spider.result
+            else:
+                pending.append(spider)
+        if not pending:
+            return
+
+        executor = ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(pending))))
+        try:
+            futures = {
+                executor.submit(spider.get_result, use_api, False): spider.word
+                for spider in pending
+            }
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+        finally:
+            # 调用方提前停止迭代时，取消还没开始的查询
+            executor.shutdown(wait=False, cancel_futures=True)
+
     def parse_html(self, html):
         """
-        解析web版有道的网页
+        解析web版有道的网页，见 youdao/html_parser.py
         :param html:网页内容
         :return:result
         """
-        soup = BeautifulSoup(html, "lxml")
-        root = soup.find(id='results-contents')
-
-        # query 搜索的关键字
-        keyword = root.find(class_='keyword')
-        if not keyword:
-            # 可能是无效的搜索词，没有找到对应的关键词
-            self.result['query'] = self.word
-            # 设置错误码，表示无词典结果
-            self.result['errorCode'] = 60
-            return self.result
-        else:
-            self.result['query'] = keyword.string
-
-        # 基本解释
-        basic = root.find(id='phrsListTab')
-        if basic:
-            trans = basic.find(class_='trans-container')
-            if trans:
-                self.result['basic'] = {}
-                self.result['basic']['explains'] = [tran.string for tran in trans.find_all('li')]
-                # 中文
-                if len(self.result['basic']['explains']) == 0:
-                    exp = trans.find(class_='wordGroup').stripped_strings
-                    self.result['basic']['explains'].append(' '.join(exp))
-
-                # 音标
-                phons = basic(class_='phonetic', limit=2)
-                if len(phons) == 2:
-                    self.result['basic']['uk-phonetic'], self.result['basic']['us-phonetic'] = \
-                        [p.string[1:-1] for p in phons]
-                elif len(phons) == 1:
-                    self.result['basic']['phonetic'] = phons[0].string[1:-1]
-
-        # # 翻译
-        # if 'basic' not in self.result:
-        #     self.result['translation'] = self.get_translation(self.word)
-
-        # 网络释义(短语)
-        web = root.find(id='webPhrase')
-        if web:
-            self.result['web'] = [
-                {
-                    'key': wordgroup.find(class_='search-js').string.strip(),
-                    'value': [v.strip() for v in wordgroup.find('span').next_sibling.split(';')]
-                } for wordgroup in web.find_all(class_='wordGroup', limit=4)
-            ]
+        return html_parser.parse(html, self.result, self.word)
 
     @classmethod
     def get_voice(cls, word, download=True):
@@ -255,27 +248,15 @@ class YoudaoSpider:
         :param download: 如果文件不存在是否下载
         :return: 返回音频文件路径或者None如果不存在且不下载
         """
-        # 确保音频目录存在
-        if not os.path.exists(VOICE_DIR):
-            try:
-                os.makedirs(VOICE_DIR)
-            except OSError as e:
-                if e.errno != errno.EEXIST:
-                    raise
-        
-        voice_file = os.path.join(VOICE_DIR, word + '.mp3')
-        
         # 如果文件已经存在，直接返回
-        if os.path.isfile(voice_file):
+        voice_file = voice_store.find(word)
+        if voice_file:
             return voice_file
             
         # 如果不存在但需要下载
         if download:
             try:
-                r = requests.get(cls.voice_url.format(word=word))
-                with open(voice_file, 'wb') as f:
-                    f.write(r.content)
-                return voice_file
+                return cls.download_voice(word)
             except Exception as e:
                 print(f"下载单词 '{word}' 发音出错: {str(e)}")
                 return None
@@ -283,6 +264,18 @@ class YoudaoSpider:
         # 如果不存在且不需要下载
         return None
 
+    @classmethod
+    def download_voice(cls, word):
+        """
+        下载并保存单词发音文件，网络错误直接抛出（由调用方决定是否重试）
+        :return: 音频文件路径，有道没有这个词的发音时返回 None
+        """
+        r = get_session().get(cls.voice_url.format(word=word), timeout=REQUEST_TIMEOUT)
+        r.raise_for_status()
+        if not r.content:
+            return None
+        return voice_store.save(word, r.content)
+
 
 if __name__ == '__main__':
     test = YoudaoSpider('application')
@@ -0,0 +1,179 @@
+# coding: utf-8
+"""
+本地 StarDict 词典
+
+config.config['stardict'] 指向的目录下，每个子目录放一部词典（.ifo/.idx/.dict[.dz]）。
+词典在每个进程里只加载一次，查询结果转换成与有道 API 返回的 json 数据结构一致的 dict，
+所以 api.word_lookup.lookup_word 可以在联网查询之前先查本地词典，不发出任何请求。
+"""
+
+import os
+import re
+import threading
+
+from youdao import config
+from youdao.lib.cpystardict import Dictionary
+
+# 不使用 sametypesequence 时，大写类型的数据以 4 字节长度开头，小写类型以 '\0' 结尾
+TEXT_TYPES = 'mlgtxykwh'
+MARKUP_TYPES = 'gxkwh'
+TAG_PATTERN = re.compile(r'<[^>]+>')
+# 朗道等词典把音标放在释义的第一行: *[ə'plikeiʃən]
+PHONETIC_LINE = re.compile(r'^\s*\*?\s*[\[/](.+?)[\]/]\s*$')
+
+_dictionaries = None
+_lock = threading.Lock()
+
+
+class LocalDictionary:
+    """一部 StarDict 词典，加锁保证多线程读取 .dict 文件时 seek/read 不会交错"""
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self.dictionary = Dictionary(prefix)
+        self.name = self.dictionary.ifo.bookname
+        self.sametypesequence = self.dictionary.ifo.sametypesequence
+        self._lock = threading.Lock()
+
+    def lookup(self, word):
+        """返回词条的原始数据，没有这个词时返回 None"""
+        word = word.encode('utf-8')
+        with self._lock:
+            if word not in self.dictionary.idx:
+                return None
+            # 不经过 Dictionary.__getitem__，它的缓存没有大小限制
+            return self.dictionary.dict[word]
+
+    def headwords(self):
+        """按 StarDict 的顺序产生所有词条（str），只遍历 .idx，不读取释义"""
+        for word in self.dictionary.idx.words():
+            yield word.decode('utf-8', errors='replace')
+
+
+def find_dictionaries(base_dir):
+    """目录下所有词典的路径前缀（不带扩展名），按目录名排序"""
+    prefixes = []
+    for dic_dir in sorted(os.listdir(base_dir)):
+        dic_path = os.path.join(base_dir, dic_dir)
+        if not os.path.isdir(dic_path):
+            continue
+        for filename in sorted(os.listdir(dic_path)):
+            if filename.endswith('.ifo'):
+                prefixes.append(os.path.join(dic_path, filename[:-len('.ifo')]))
+    return prefixes
+
+
+def get_dictionaries():
+    """本进程加载的词典列表，第一次调用时加载 config.config['stardict'] 下的词典"""
+    global _dictionaries
+    with _lock:
+        if _dictionaries is None:
+            _dictionaries = []
+            base_dir = config.load_config().get('stardict')
+            if base_dir and os.path.isdir(base_dir):
+                for prefix in find_dictionaries(base_dir):
+                    try:
+                        _dictionaries.append(LocalDictionary(prefix))
+                    except Exception as e:
+                        print(f"加载 StarDict 词典 {prefix} 失败: {str(e)}")
+        return _dictionaries
+
+
+def reset():
+    """重新加载词典（修改了 stardict 配置之后）"""
+    global _dictionaries
+    with _lock:
+        _dictionaries = None
+
+
+def split_fields(data, sametypesequence):
+    """把词条数据拆成 (类型, bytes) 列表"""
+    fields = []
+    position = 0
+    if sametypesequence:
+        for i, field_type in enumerate(sametypesequence):
+            last = i == len(sametypesequence) - 1
+            if field_type.isupper():
+                if last:
+                    size = len(data) - position
+                else:
+                    size = int.from_bytes(data[position:position + 4], 'big')
+                    position += 4
+                fields.append((field_type, data[position:position + size]))
+                position += size
+            else:
+                end = len(data) if last else data.find(b'\0', position)
+                if end < 0:
+                    end = len(data)
+                fields.append((field_type, data[position:end]))
+                position = end + 1
+        return fields
+
+    while position < len(data):
+        field_type = chr(data[position])
+        position += 1
+        if field_type.isupper():
+            size = int.from_bytes(data[position:position + 4], 'big')
+            position += 4
+            fields.append((field_type, data[position:position + size]))
+            position += size
+        else:
+            end = data.find(b'\0', position)
+            if end < 0:
+                end = len(data)
+            fields.append((field_type, data[position:end]))
+            position = end + 1
+    return fields
+
+
+def to_result(word, data, sametypesequence):
+    """
+    把词条数据转换成与有道 API 返回的 json 数据结构一致的 dict
+    :return: result，没有可用的文本释义时返回 None
+    """
+    phonetic = ''
+    explains = []
+    for field_type, value in split_fields(data, sametypesequence):
+        if field_type not in TEXT_TYPES:
+            continue
+        text = value.decode('utf-8', errors='replace')
+        if field_type == 't':
+            phonetic = phonetic or text.strip()
+            continue
+        if field_type in MARKUP_TYPES:
+            text = TAG_PATTERN.sub('', text.replace('<br>', '\n'))
+        for line in text.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            match = PHONETIC_LINE.match(line)
+            if match and not phonetic and not explains:
+                phonetic = match.group(1)
+            else:
+                explains.append(line)
+
+    if not explains:
+        return None
+    basic = {'explains': explains}
+    if phonetic:
+        basic['phonetic'] = phonetic
+    return {'query': word, 'errorCode': 0, 'basic': basic}
+
+
+def lookup(word):
+    """
+    按顺序在本地词典中查询单词
+    :return: (词典名, result)，所有词典都没有时返回 None
+    """
+    for dictionary in get_dictionaries():
+        try:
+            data = dictionary.lookup(word)
+        except Exception as e:
+            print(f"查询 StarDict 词典 {dictionary.name} 失败: {str(e)}")
+            continue
+        if data is None:
+            continue
+        result = to_result(word, data, dictionary.sametypesequence)
+        if result is not None:
+            return dictionary.name, result
+    return None
@@ -0,0 +1,45 @@
+# coding: utf-8
+"""html_parser.parse 与原来的 BeautifulSoup 实现 parse_soup 的对照测试，网页来自 youdao/fixtures/pages"""
+
+import glob
+import os
+
+import pytest
+
+from youdao import html_parser
+from youdao.tests.test_spider import INLINE_PAGES, PAGES_DIR
+
+PAGES = sorted(glob.glob(os.path.join(PAGES_DIR, '*.html')))
+
+
+def run_parser(parser, html, word):
+    """与 YoudaoSpider.parse_html 一样解析网页，返回 (result, 是否抛出异常)
+
+    YoudaoSpider.get_result 捕获所有异常，异常的类型不影响结果，只比较是否抛出
+    """
+    result = {'query': '', 'errorCode': 0}
+    try:
+        parser(html, result, word)
+    except Exception:
+        return result, True
+    return result, False
+
+
+def test_fixture_pages_exist():
+    assert PAGES
+
+
+@pytest.mark.parametrize('path', PAGES, ids=lambda path: os.path.basename(path))
+def test_parse_matches_parse_soup(path):
+    word = os.path.splitext(os.path.basename(path))[0]
+    with open(path, encoding='utf-8') as f:
+        html = f.read()
+
+    # 包括抛出异常前已经写入 result 的部分
+    assert run_parser(html_parser.parse, html, word) == run_parser(html_parser.parse_soup, html, word)
+
+
+@pytest.mark.parametrize('word', sorted(INLINE_PAGES))
+def test_parse_matches_parse_soup_on_unusual_pages(word):
+    html = INLINE_PAGES[word]
+    assert run_parser(html_parser.parse, html, word) == run_parser(html_parser.parse_soup, html, word)
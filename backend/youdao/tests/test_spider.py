@@ -0,0 +1,141 @@
+# coding: utf-8
+"""YoudaoSpider.get_results_many 对本地 http.server 的测试，网页来自 youdao/fixtures/pages"""
+
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+
+import pytest
+
+from youdao import cache, spider
+from youdao.spider import TokenBucket, YoudaoSpider
+
+PAGES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'fixtures', 'pages')
+WORDS = ['application', 'cafe', 'colour', 'nasa', 'run']
+# 这些单词的网页延迟返回（秒）
+DELAYS = {'slow': 1.0}
+# 不是正常结果页的网页：验证码页面，以及有关键词但认不出释义结构的网页
+INLINE_PAGES = {
+    'captcha': '<html><body><form id="captcha"><img src="/captcha.jpg"></form></body></html>',
+    'unknownlayout': '<html><body><div id="results-contents"><h2><span class="keyword">unknownlayout</span>'
+                     '</h2><div class="new-layout">...</div></div></body></html>',
+}
+
+
+class PageHandler(BaseHTTPRequestHandler):
+    """/w/eng/<word>/ 返回 <word>.html，没有保存的单词返回查不到结果的网页"""
+
+    def do_GET(self):
+        word = unquote(self.path.split('/')[3])
+        self.server.requests.append((word, time.monotonic()))
+        time.sleep(DELAYS.get(word, 0))
+        if word in INLINE_PAGES:
+            body = INLINE_PAGES[word].encode('utf-8')
+        else:
+            path = os.path.join(PAGES_DIR, f'{word}.html')
+            if not os.path.exists(path):
+                path = os.path.join(PAGES_DIR, 'qwertyuiopzx.html')
+            with open(path, 'rb') as f:
+                body = f.read()
+        try:
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # 客户端已经超时断开
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def youdao_cache(tmp_path, monkeypatch):
+    """youdao.db 换成临时文件"""
+    monkeypatch.setattr(cache, 'DB_DIR', str(tmp_path / 'youdao.db'))
+    cache.close_connection()
+    cache.clear()
+    yield cache
+    cache.close_connection()
+    cache.clear()
+
+
+@pytest.fixture
+def server(monkeypatch, youdao_cache):
+    """本地网页服务器，YoudaoSpider.web_url 指向它，默认不限速"""
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), PageHandler)
+    httpd.requests = []
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(YoudaoSpider, 'web_url', f'http://127.0.0.1:{httpd.server_port}/w/eng/{{0}}/')
+    monkeypatch.setattr(spider, 'rate_limiter', TokenBucket(0))
+    monkeypatch.setattr(spider, '_session', None)
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_results_are_streamed_as_they_complete(server):
+    start = time.monotonic()
+    arrivals = []
+    for word, result in YoudaoSpider.get_results_many(['slow'] + WORDS, concurrency=len(WORDS) + 1):
+        arrivals.append((word, time.monotonic() - start, result))
+
+    assert [word for word, _, _ in arrivals][-1] == 'slow'
+    assert {word for word, _, _ in arrivals} == set(WORDS) | {'slow'}
+    # 快的单词不等慢的单词，而且是并发查询的
+    assert all(elapsed < DELAYS['slow'] for word, elapsed, _ in arrivals if word != 'slow')
+    for word, _, result in arrivals:
+        if word != 'slow':
+            assert 'basic' in result
+            assert cache.get(word) is not None
+
+
+def test_cached_and_repeated_words_are_not_requested(server):
+    list(YoudaoSpider.get_results_many(['cafe']))
+    server.requests.clear()
+
+    results = list(YoudaoSpider.get_results_many(['cafe', 'run', 'run', 'cafe']))
+
+    assert [word for word, _ in results] == ['cafe', 'run']
+    assert [word for word, _ in server.requests] == ['run']
+
+
+def test_token_bucket_limits_throughput(server, monkeypatch):
+    rate = 10
+    monkeypatch.setattr(spider, 'rate_limiter', TokenBucket(rate, capacity=1))
+
+    results = list(YoudaoSpider.get_results_many(WORDS, concurrency=len(WORDS)))
+
+    assert len(results) == len(WORDS)
+    times = sorted(requested_at for _, requested_at in server.requests)
+    # 桶里只有一个令牌，之后每 1/rate 秒发出一个请求
+    assert times[-1] - times[0] >= (len(WORDS) - 1) / rate * 0.9
+    assert all(later - earlier >= 1 / rate * 0.5 for earlier, later in zip(times, times[1:]))
+
+
+def test_timeout_is_reported_per_request(server, monkeypatch):
+    monkeypatch.setattr(spider, 'REQUEST_TIMEOUT', 0.3)
+
+    results = dict(YoudaoSpider.get_results_many(['slow'] + WORDS, concurrency=2))
+
+    assert set(results) == set(WORDS) | {'slow'}
+    # 超时的单词只返回默认结果，不影响其他单词，也不记入缓存或负缓存
+    assert 'basic' not in results['slow']
+    assert cache.get('slow') is None
+    assert cache.get_miss('slow') is None
+    assert all('basic' in results[word] for word in WORDS)
+
+
+def test_only_words_without_dictionary_results_are_negative_cached(server):
+    results = dict(YoudaoSpider.get_results_many(['qwertyuiopzx', 'captcha', 'unknownlayout']))
+
+    assert results['qwertyuiopzx']['errorCode'] == 60
+    assert cache.get_miss('qwertyuiopzx') == 60
+    # 验证码和认不出的网页下次重新查询
+    assert cache.get_miss('captcha') is None
+    assert cache.get_miss('unknownlayout') is None
+    assert cache.get('unknownlayout') is None
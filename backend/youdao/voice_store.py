@@ -0,0 +1,78 @@
+# coding: utf-8
+"""
+分目录保存的单词发音文件
+
+文件名是单词的 sha1，按前两级十六进制前缀分目录: VOICE_DIR/ab/cd/abcd....mp3，
+每个目录里最多几百个文件，10 万以上的单词也不会拖慢 stat。用户输入的单词不会出现在
+路径里，也就不会被用来访问 VOICE_DIR 以外的文件。
+
+旧版本直接保存为 VOICE_DIR/<word>.mp3，读取时会被移动到新位置，
+也可以用 python manage.py migrate_voice_store 一次性迁移。
+"""
+
+import hashlib
+import os
+
+from youdao.config import VOICE_DIR
+
+SUFFIX = '.mp3'
+
+
+def relative_path(word):
+    """发音文件相对于 VOICE_DIR 的路径"""
+    digest = hashlib.sha1(word.encode('utf-8')).hexdigest()
+    return os.path.join(digest[:2], digest[2:4], digest + SUFFIX)
+
+
+def voice_path(word):
+    """发音文件的绝对路径（不检查是否存在）"""
+    return os.path.join(VOICE_DIR, relative_path(word))
+
+
+def legacy_path(word):
+    """旧版本的发音文件路径，单词不能作为文件名时返回 None"""
+    if not word or os.sep in word or (os.altsep and os.altsep in word) or word.startswith('.'):
+        return None
+    return os.path.join(VOICE_DIR, word + SUFFIX)
+
+
+def migrate_legacy(word):
+    """把旧版本的发音文件移动到新位置，返回新路径，没有旧文件时返回 None"""
+    old_path = legacy_path(word)
+    if old_path is None or not os.path.isfile(old_path):
+        return None
+    new_path = voice_path(word)
+    os.makedirs(os.path.dirname(new_path), exist_ok=True)
+    try:
+        os.replace(old_path, new_path)
+    except OSError:
+        # 别的进程已经移走了
+        if not os.path.isfile(new_path):
+            return None
+    return new_path
+
+
+def find(word):
+    """已保存的发音文件路径，没有时返回 None"""
+    path = voice_path(word)
+    if os.path.isfile(path):
+        return path
+    return migrate_legacy(word)
+
+
+def save(word, content):
+    """保存发音文件（先写临时文件再替换，读取时不会看到写了一半的文件），返回路径"""
+    path = voice_path(word)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = '%s.%d.tmp' % (path, os.getpid())
+    with open(temp_path, 'wb') as f:
+        f.write(content)
+    os.replace(temp_path, path)
+    return path
+
+
+def remove(word):
+    """删除单词的发音文件（包括旧版本的文件）"""
+    for path in (voice_path(word), legacy_path(word)):
+        if path and os.path.isfile(path):
+            os.remove(path)